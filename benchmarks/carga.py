@@ -0,0 +1,321 @@
+"""
+Prueba de carga concurrente del CRM ZARITA!
+
+A diferencia de benchmarks.ejecutar (una petición a la vez, en proceso), aquí
+se lanza tráfico real por HTTP contra una aplicación ya arrancada, para ver la
+contención en sesiones, pool de conexiones y event loop. Simula:
+
+- N agentes: inician sesión, listan sus prospectos, abren el seguimiento,
+  registran interacciones y suben cotizaciones, con una pausa entre pasos.
+  Mientras tanto mantienen abierto el canal SSE de notificaciones y consultan
+  el contador, como hace el navegador.
+- M administradores: abren el dashboard con distintos periodos y piden
+  exportaciones, esperando en "Mis descargas" a que terminen.
+
+Usa los usuarios de benchmarks.datos_sinteticos (agente_bench_NNN /
+bench_admin). Al terminar informa, por paso: peticiones, errores,
+throughput y percentiles de latencia.
+
+Uso (con la app corriendo contra la base de datos sembrada):
+    uvicorn main:app --workers 4 --port 8000
+    python -m benchmarks.carga --base http://localhost:8000 --agentes 50 --admins 3 --duracion 300 --salida carga.json
+
+IMPORTANTE: modifica datos (interacciones, documentos, estados); usar solo
+contra una base de datos de benchmark.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+
+from benchmarks.datos_sinteticos import ADMIN_USERNAME, AGENTE_PASSWORD
+
+
+PATRON_SEGUIMIENTO = re.compile(r'/prospectos/(\d+)/seguimiento')
+ESPERA_MAXIMA_EXPORTACION = 300  # segundos
+# PDF mínimo válido para las cotizaciones subidas
+PDF_COTIZACION = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+class Registro:
+    """Latencias y errores por paso de toda la prueba"""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)  # paso -> [ms]
+        self.errores = defaultdict(int)
+        self.ejemplos_error = defaultdict(list)
+        self.inicio = time.perf_counter()
+        self.fin = None
+
+    def anotar(self, paso: str, duracion_ms: float, error: str = None):
+        self.latencias[paso].append(duracion_ms)
+        if error:
+            self.errores[paso] += 1
+            if len(self.ejemplos_error[paso]) < 3:
+                self.ejemplos_error[paso].append(error)
+
+    def resumen(self) -> dict:
+        duracion = (self.fin or time.perf_counter()) - self.inicio
+        pasos = {}
+        for paso, tiempos in sorted(self.latencias.items()):
+            ordenados = sorted(tiempos)
+            percentil = lambda p: round(ordenados[min(int(p / 100 * len(ordenados)), len(ordenados) - 1)], 1)
+            pasos[paso] = {
+                "peticiones": len(tiempos),
+                "errores": self.errores[paso],
+                "tasa_error": round(self.errores[paso] / len(tiempos), 4),
+                "por_segundo": round(len(tiempos) / duracion, 2),
+                "p50_ms": percentil(50),
+                "p90_ms": percentil(90),
+                "p95_ms": percentil(95),
+                "p99_ms": percentil(99),
+                "max_ms": round(ordenados[-1], 1),
+                "ejemplos_error": self.ejemplos_error[paso],
+            }
+        total = sum(len(t) for t in self.latencias.values())
+        return {
+            "duracion_s": round(duracion, 1),
+            "peticiones": total,
+            "por_segundo": round(total / duracion, 2) if duracion else 0,
+            "errores": sum(self.errores.values()),
+            "pasos": pasos,
+        }
+
+
+def _error_respuesta(respuesta: httpx.Response) -> str:
+    """Las rutas HTML informan los errores redirigiendo con ?error= o al login"""
+    if respuesta.status_code >= 400:
+        return f"HTTP {respuesta.status_code}"
+    if respuesta.is_redirect:
+        destino = respuesta.headers.get("location", "")
+        if "error=" in destino:
+            return destino
+        if destino in ("/", "/login"):
+            return "sesión perdida"
+    return None
+
+
+class UsuarioVirtual:
+    def __init__(self, base: str, username: str, registro: Registro, pausa: float, fin: float):
+        self.username = username
+        self.registro = registro
+        self.pausa = pausa
+        self.fin = fin
+        self.rnd = random.Random(username)
+        self.cliente = httpx.AsyncClient(base_url=base, timeout=httpx.Timeout(120.0), follow_redirects=False)
+
+    def activo(self) -> bool:
+        return time.perf_counter() < self.fin
+
+    async def pensar(self):
+        """Pausa entre acciones (tiempo de lectura del usuario)"""
+        await asyncio.sleep(self.rnd.uniform(0.5, 1.5) * self.pausa)
+
+    async def peticion(self, paso: str, metodo: str, url: str, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.cliente.request(metodo, url, **kwargs)
+            error = _error_respuesta(respuesta)
+        except httpx.HTTPError as e:
+            respuesta, error = None, f"{type(e).__name__}: {e}"
+        self.registro.anotar(paso, (time.perf_counter() - inicio) * 1000, error)
+        return respuesta if not error else None
+
+    async def iniciar_sesion(self) -> bool:
+        await self.peticion("login", "POST", "/login", data={"username": self.username, "password": AGENTE_PASSWORD})
+        if "session_token" not in self.cliente.cookies:
+            self.registro.anotar("login_rechazado", 0, self.username)
+            return False
+        return True
+
+    async def cerrar(self):
+        await self.cliente.aclose()
+
+
+class Agente(UsuarioVirtual):
+    def __init__(self, *args, intervalo_notificaciones: float, sse: bool, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.intervalo_notificaciones = intervalo_notificaciones
+        self.sse = sse
+        self.prospectos = []
+
+    async def sondear_notificaciones(self):
+        while self.activo():
+            await self.peticion("notificaciones_contador", "GET", "/api/notificaciones/contador")
+            await self.peticion("notificaciones_pendientes", "GET", "/api/notificaciones/pendientes")
+            await asyncio.sleep(self.intervalo_notificaciones * self.rnd.uniform(0.8, 1.2))
+
+    async def mantener_sse(self):
+        """Conexión SSE abierta toda la prueba, como una pestaña del navegador"""
+        while self.activo():
+            inicio = time.perf_counter()
+            try:
+                async with self.cliente.stream("GET", "/api/notificaciones/stream",
+                                               timeout=httpx.Timeout(None, connect=30.0)) as respuesta:
+                    error = _error_respuesta(respuesta)
+                    self.registro.anotar("sse_conexion", (time.perf_counter() - inicio) * 1000, error)
+                    if error:
+                        await asyncio.sleep(5)
+                        continue
+                    async for _ in respuesta.aiter_lines():
+                        if not self.activo():
+                            return
+            except httpx.HTTPError as e:
+                self.registro.anotar("sse_conexion", (time.perf_counter() - inicio) * 1000, type(e).__name__)
+                await asyncio.sleep(5)
+
+    async def listar(self):
+        respuesta = await self.peticion("listar_prospectos", "GET", "/prospectos", params={"page": self.rnd.randint(1, 3)})
+        if respuesta is not None:
+            encontrados = list(dict.fromkeys(int(i) for i in PATRON_SEGUIMIENTO.findall(respuesta.text)))
+            if encontrados:
+                self.prospectos = encontrados
+
+    async def flujo(self):
+        await self.listar()
+        if not self.prospectos:
+            await self.pensar()
+            return
+        prospecto_id = self.rnd.choice(self.prospectos)
+        await self.pensar()
+        await self.peticion("abrir_seguimiento", "GET", f"/prospectos/{prospecto_id}/seguimiento")
+        await self.pensar()
+        await self.peticion("registrar_interaccion", "POST", f"/prospectos/{prospecto_id}/interaccion", data={
+            "descripcion": "Llamada de seguimiento (prueba de carga)",
+            "tipo_interaccion": self.rnd.choice(["llamada", "whatsapp", "correo"]),
+        })
+        if self.rnd.random() < 0.3:
+            await self.pensar()
+            await self.peticion("subir_cotizacion", "POST", f"/prospectos/{prospecto_id}/documento",
+                                data={"tipo_documento": "cotizacion", "descripcion": "Cotización de prueba"},
+                                files={"archivo": ("cotizacion_carga.pdf", PDF_COTIZACION, "application/pdf")})
+        await self.pensar()
+
+    async def ejecutar(self):
+        if not await self.iniciar_sesion():
+            return
+        fondo = [asyncio.create_task(self.sondear_notificaciones())]
+        if self.sse:
+            fondo.append(asyncio.create_task(self.mantener_sse()))
+        try:
+            while self.activo():
+                await self.flujo()
+        finally:
+            for tarea in fondo:
+                tarea.cancel()
+            await asyncio.gather(*fondo, return_exceptions=True)
+
+
+class Administrador(UsuarioVirtual):
+    EXPORTACIONES = [
+        ("/exportar/dashboard", {"periodo": "mes"}),
+        ("/exportar/prospectos", {"estado": "en_seguimiento"}),
+        ("/exportar/clientes-ganados", {}),
+    ]
+
+    async def esperar_exportacion(self, inicio: float):
+        """Consulta Mis descargas hasta que no queden exportaciones en proceso"""
+        while self.activo() and time.perf_counter() - inicio < ESPERA_MAXIMA_EXPORTACION:
+            respuesta = await self.peticion("mis_descargas", "GET", "/descargas")
+            if respuesta is not None and "Recargar mientras haya exportaciones" not in respuesta.text:
+                self.registro.anotar("exportacion_completa", (time.perf_counter() - inicio) * 1000)
+                return
+            await asyncio.sleep(2)
+        motivo = "tiempo agotado" if self.activo() else "sin terminar al acabar la prueba"
+        self.registro.anotar("exportacion_completa", (time.perf_counter() - inicio) * 1000, motivo)
+
+    async def flujo(self):
+        await self.peticion("dashboard", "GET", "/dashboard",
+                            params={"periodo": self.rnd.choice(["dia", "semana", "mes", "año"])})
+        await self.pensar()
+        if self.rnd.random() < 0.3:
+            ruta, parametros = self.rnd.choice(self.EXPORTACIONES)
+            inicio = time.perf_counter()
+            if await self.peticion("solicitar_exportacion", "GET", ruta, params=parametros) is not None:
+                await self.esperar_exportacion(inicio)
+            await self.pensar()
+
+    async def ejecutar(self):
+        if not await self.iniciar_sesion():
+            return
+        while self.activo():
+            await self.flujo()
+
+
+async def ejecutar_carga(base: str, agentes: int, admins: int, duracion: float, rampa: float,
+                         pausa: float, intervalo_notificaciones: float, sse: bool) -> dict:
+    registro = Registro()
+    fin = time.perf_counter() + rampa + duracion
+    usuarios = [
+        Agente(base, f"agente_bench_{i + 1:03d}", registro, pausa, fin,
+               intervalo_notificaciones=intervalo_notificaciones, sse=sse)
+        for i in range(agentes)
+    ]
+    # Todos los administradores comparten la cuenta sembrada (una sesión cada uno)
+    usuarios += [Administrador(base, ADMIN_USERNAME, registro, pausa, fin) for _ in range(admins)]
+
+    async def arrancar(usuario, retraso):
+        await asyncio.sleep(retraso)
+        try:
+            await usuario.ejecutar()
+        finally:
+            await usuario.cerrar()
+
+    total = len(usuarios)
+    await asyncio.gather(*(arrancar(u, rampa * i / max(total, 1)) for i, u in enumerate(usuarios)))
+    registro.fin = time.perf_counter()
+    return registro.resumen()
+
+
+def imprimir_resumen(resumen: dict):
+    print(f"\n📊 {resumen['peticiones']} peticiones en {resumen['duracion_s']} s "
+          f"({resumen['por_segundo']} req/s), {resumen['errores']} errores")
+    print(f"{'paso':28} {'n':>7} {'req/s':>7} {'err%':>6} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'máx':>8}")
+    for paso, m in resumen["pasos"].items():
+        print(f"{paso:28} {m['peticiones']:>7} {m['por_segundo']:>7} {m['tasa_error'] * 100:>5.1f}% "
+              f"{m['p50_ms']:>8} {m['p90_ms']:>8} {m['p95_ms']:>8} {m['p99_ms']:>8} {m['max_ms']:>8}")
+        for ejemplo in m["ejemplos_error"]:
+            print(f"    ⚠️ {ejemplo}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga concurrente contra una app en ejecución")
+    parser.add_argument("--base", default="http://localhost:8000", help="URL base de la aplicación")
+    parser.add_argument("--agentes", type=int, default=20, help="Agentes concurrentes (máx. los sembrados)")
+    parser.add_argument("--admins", type=int, default=2, help="Administradores concurrentes")
+    parser.add_argument("--duracion", type=float, default=120, help="Segundos de carga tras la rampa")
+    parser.add_argument("--rampa", type=float, default=10, help="Segundos para arrancar a todos los usuarios")
+    parser.add_argument("--pausa", type=float, default=1.0, help="Pausa media entre acciones (s)")
+    parser.add_argument("--intervalo-notificaciones", type=float, default=15, help="Segundos entre consultas al contador")
+    parser.add_argument("--sin-sse", action="store_true", help="No mantener abierto el canal SSE de cada agente")
+    parser.add_argument("--salida", help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    print(f"🚀 {args.agentes} agentes y {args.admins} administradores contra {args.base} durante {args.duracion:.0f} s...")
+    resumen = asyncio.run(ejecutar_carga(
+        args.base, args.agentes, args.admins, args.duracion, args.rampa,
+        args.pausa, args.intervalo_notificaciones, not args.sin_sse
+    ))
+    imprimir_resumen(resumen)
+
+    if args.salida:
+        resumen.update(fecha=datetime.now().isoformat(timespec="seconds"), base=args.base,
+                       agentes=args.agentes, admins=args.admins)
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=2)
+        print(f"✅ Resultados guardados en {args.salida}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Benchmark de endpoints del CRM ZARITA!
+
+Ejecuta los endpoints más usados contra una base de datos ya sembrada
+(benchmarks.datos_sinteticos) con un cliente ASGI en proceso, sin red ni
+servidor. Para cada escenario mide p50/p95 de latencia y el número de
+consultas SQL (leído de la cabecera Server-Timing del middleware de perfilado).
+Las exportaciones se ejecutan en proceso con ejecutar_trabajo_exportacion, que
+es lo que hace el pool de exportación en producción.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.ejecutar --url sqlite:///bench.db --iteraciones 20 --salida base.json
+    python -m benchmarks.ejecutar --url sqlite:///bench.db --salida cambio.json --comparar base.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# Las exportaciones del benchmark no deben mezclarse con las reales
+os.environ.setdefault("EXPORT_DIR", tempfile.mkdtemp(prefix="crm_bench_export_"))
+# Las peticiones lentas se miden aquí; el log del perfilado solo ensuciaría la salida
+os.environ.setdefault("PERFIL_SQL_PETICION_LENTA_MS", "1000000")
+os.environ.setdefault("PERFIL_SQL_MAX_CONSULTAS", "1000000")
+os.environ.setdefault("PERFIL_SQL_SENTENCIA_LENTA_MS", "1000000")
+
+import httpx
+import pandas as pd
+from sqlalchemy import create_engine
+
+import database
+import models
+from benchmarks.datos_sinteticos import ADMIN_USERNAME, AGENTE_PASSWORD, DESTINOS, contar_filas
+
+
+PATRON_CONSULTAS = re.compile(r'desc="(\d+) consultas"')
+
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    indice = min(int(round(p / 100 * (len(ordenados) - 1))), len(ordenados) - 1)
+    return ordenados[indice]
+
+
+def _resumir(tiempos: list, consultas: list, errores: int) -> dict:
+    if not tiempos:
+        return {"n": 0, "errores": errores}
+    return {
+        "n": len(tiempos),
+        "errores": errores,
+        "p50_ms": round(_percentil(tiempos, 50), 1),
+        "p95_ms": round(_percentil(tiempos, 95), 1),
+        "media_ms": round(statistics.mean(tiempos), 1),
+        "consultas_p50": _percentil(consultas, 50) if consultas else None,
+        "consultas_max": max(consultas) if consultas else None,
+    }
+
+
+def _configurar_base_datos(url: str):
+    """Apunta la aplicación a la base de datos de benchmark"""
+    argumentos = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    database.engine = create_engine(url, connect_args=argumentos)
+    database.SessionLocal.configure(bind=database.engine)
+    return database.engine
+
+
+async def _iniciar_sesion(cliente: httpx.AsyncClient, username: str):
+    respuesta = await cliente.post("/login", data={"username": username, "password": AGENTE_PASSWORD})
+    if "session_token" not in cliente.cookies:
+        raise RuntimeError(f"No se pudo iniciar sesión como {username} (HTTP {respuesta.status_code})")
+
+
+def escenarios_http(hoy: date, telefono: str, agente_id: int) -> list:
+    """(nombre, rol, método, ruta, parámetros) de cada escenario HTTP"""
+    hace_90 = (hoy - timedelta(days=90)).isoformat()
+    return [
+        ("dashboard_mes", "admin", "GET", "/dashboard", {}),
+        ("dashboard_año", "admin", "GET", "/dashboard", {"periodo": "año"}),
+        ("dashboard_agente", "agente", "GET", "/dashboard", {}),
+        ("prospectos", "admin", "GET", "/prospectos", {}),
+        ("prospectos_estado", "admin", "GET", "/prospectos", {"estado": "en_seguimiento"}),
+        ("prospectos_destino", "admin", "GET", "/prospectos", {"destino": DESTINOS[0]}),
+        ("prospectos_agente", "admin", "GET", "/prospectos", {"agente_asignado_id": agente_id}),
+        ("prospectos_medio", "admin", "GET", "/prospectos", {"medio_ingreso_id": 1}),
+        ("prospectos_telefono", "admin", "GET", "/prospectos", {"telefono": telefono}),
+        ("prospectos_busqueda_global", "admin", "GET", "/prospectos", {"busqueda_global": "GARCIA"}),
+        ("prospectos_rango_fechas", "admin", "GET", "/prospectos", {"fecha_inicio": hace_90, "fecha_fin": hoy.isoformat()}),
+        ("prospectos_pagina_10", "admin", "GET", "/prospectos", {"fecha_inicio": hace_90, "page": 10}),
+        ("prospectos_vista_agente", "agente", "GET", "/prospectos", {}),
+        ("filtro_nuevos", "admin", "GET", "/prospectos/filtro", {"tipo_filtro": "estado", "valor_filtro": "nuevo"}),
+        ("filtro_cotizados", "admin", "GET", "/prospectos/filtro", {"tipo_filtro": "estado", "valor_filtro": "cotizado"}),
+        ("filtro_ventas", "admin", "GET", "/prospectos/filtro", {"tipo_filtro": "ventas", "valor_filtro": "ganado"}),
+        ("filtro_sin_asignar", "admin", "GET", "/prospectos/filtro", {"tipo_filtro": "asignacion", "valor_filtro": "sin_asignar"}),
+        ("filtro_destino", "admin", "GET", "/prospectos/filtro", {"tipo_filtro": "destino", "valor_filtro": DESTINOS[1]}),
+        ("filtro_con_datos", "admin", "GET", "/prospectos/filtro", {"tipo_filtro": "datos", "valor_filtro": "con_datos"}),
+        ("filtro_total_año", "admin", "GET", "/prospectos/filtro", {"tipo_filtro": "total", "valor_filtro": "all", "periodo": "año"}),
+        ("historial_telefono", "admin", "GET", "/clientes/historial", {"telefono": telefono}),
+        ("historial_busqueda", "admin", "GET", "/clientes/historial", {"busqueda": "RODRIGUEZ"}),
+        ("notificaciones", "admin", "GET", "/notificaciones", {}),
+        ("notificaciones_leidas", "admin", "GET", "/notificaciones", {"filtro_estado": "leidas"}),
+        ("notificaciones_agente", "agente", "GET", "/notificaciones", {}),
+        ("notificaciones_contador", "agente", "GET", "/api/notificaciones/contador", {}),
+    ]
+
+
+async def medir_http(cliente, metodo, ruta, parametros, iteraciones, archivos=None) -> dict:
+    tiempos, consultas, errores = [], [], 0
+    for i in range(iteraciones + 1):  # La primera iteración calienta cachés y no se mide
+        inicio = time.perf_counter()
+        respuesta = await cliente.request(metodo, ruta, params=parametros, files=archivos() if archivos else None)
+        duracion = (time.perf_counter() - inicio) * 1000
+        if i == 0:
+            continue
+        if respuesta.status_code >= 400:
+            errores += 1
+            continue
+        tiempos.append(duracion)
+        coincidencia = PATRON_CONSULTAS.search(respuesta.headers.get("server-timing", ""))
+        if coincidencia:
+            consultas.append(int(coincidencia.group(1)))
+    return _resumir(tiempos, consultas, errores)
+
+
+def medir_exportacion(tipo: str, parametros: dict, usuario_id: int, iteraciones: int) -> dict:
+    """Crea trabajos de exportación sin caché y los ejecuta en este proceso"""
+    from services.perfilado_sql import iniciar_perfil, terminar_perfil
+    from services.trabajos_exportacion import ejecutar_trabajo_exportacion
+
+    tiempos, consultas, errores = [], [], 0
+    for i in range(iteraciones + 1):
+        db = database.SessionLocal()
+        try:
+            trabajo = models.TrabajoExportacion(
+                usuario_id=usuario_id, tipo=tipo, parametros=json.dumps(parametros), estado="pendiente"
+            )
+            db.add(trabajo)
+            db.commit()
+            trabajo_id = trabajo.id
+        finally:
+            db.close()
+
+        perfil, token = iniciar_perfil()
+        inicio = time.perf_counter()
+        try:
+            ejecutar_trabajo_exportacion(trabajo_id)
+        finally:
+            terminar_perfil(token)
+        duracion = (time.perf_counter() - inicio) * 1000
+
+        db = database.SessionLocal()
+        try:
+            trabajo = db.get(models.TrabajoExportacion, trabajo_id)
+            exito = trabajo.estado == "completado"
+            if trabajo.ruta_archivo and os.path.exists(trabajo.ruta_archivo):
+                os.remove(trabajo.ruta_archivo)
+        finally:
+            db.close()
+
+        if i == 0:
+            continue
+        if not exito:
+            errores += 1
+            continue
+        tiempos.append(duracion)
+        consultas.append(perfil.consultas)
+    return _resumir(tiempos, consultas, errores)
+
+
+def _excel_importacion(filas: int, semilla: int, agentes: list):
+    """Excel de prospectos nuevos con teléfonos que no existen en la siembra, repartidos entre `agentes`"""
+    rnd = random.Random(semilla)
+    df = pd.DataFrame({
+        "telefono": [f"60{rnd.randrange(10**8):08d}" for _ in range(filas)],
+        "nombre": [rnd.choice(["ANA", "LUIS", "MARTA"]) for _ in range(filas)],
+        "apellido": [rnd.choice(["PEREZ", "ROJAS", "DIAZ"]) for _ in range(filas)],
+        "destino": [rnd.choice(DESTINOS + ["PUNTA KANA", "CANCUN MX"]) for _ in range(filas)],
+        "medio_ingreso": ["REDES"] * filas,
+        "agente_asignado": [rnd.choice(agentes) for _ in range(filas)],
+    })
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+async def ejecutar(url: str, iteraciones: int, filas_importacion: int, iteraciones_importacion: int) -> dict:
+    engine = _configurar_base_datos(url)
+    import main  # Después de configurar la base de datos
+
+    db = database.SessionLocal()
+    try:
+        admin = db.query(models.Usuario).filter(models.Usuario.username == ADMIN_USERNAME).first()
+        agente = db.query(models.Usuario).filter(models.Usuario.username == "agente_bench_001").first()
+        if not admin or not agente:
+            raise RuntimeError("La base de datos no está sembrada: ejecute benchmarks.datos_sinteticos primero")
+        # Los agentes sembrados (--agentes) reciben las filas importadas
+        agentes = [fila.username for fila in db.query(models.Usuario.username).filter(
+            models.Usuario.username.like("agente_bench_%"),
+            models.Usuario.activo == 1
+        ).all()]
+        telefono = db.query(models.Prospecto.telefono).filter(
+            models.Prospecto.cliente_recurrente == True
+        ).limit(1).scalar()
+    finally:
+        db.close()
+
+    resultados = {}
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente_admin, \
+            httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente_agente:
+        await _iniciar_sesion(cliente_admin, ADMIN_USERNAME)
+        await _iniciar_sesion(cliente_agente, agente.username)
+        clientes = {"admin": cliente_admin, "agente": cliente_agente}
+
+        for nombre, rol, metodo, ruta, parametros in escenarios_http(date.today(), telefono, agente.id):
+            resultados[nombre] = await medir_http(clientes[rol], metodo, ruta, parametros, iteraciones)
+            print(f"⏱️  {nombre}: {resultados[nombre]}")
+
+        for nombre, tipo, parametros in [
+            ("exportar_prospectos", "prospectos", {"estado": "en_seguimiento"}),
+            ("exportar_dashboard", "dashboard", {"periodo": "mes"}),
+            ("exportar_clientes_ganados", "clientes_ganados", {}),
+        ]:
+            resultados[nombre] = medir_exportacion(tipo, parametros, admin.id, max(iteraciones // 4, 1))
+            print(f"⏱️  {nombre}: {resultados[nombre]}")
+
+        # Cada importación usa teléfonos nuevos para no medir solo recurrentes
+        semillas = iter(range(10**6))
+        excel = lambda: {"archivo": (
+            "bench.xlsx", _excel_importacion(filas_importacion, next(semillas), agentes),
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )}
+        resultados["importar_prospectos"] = await medir_http(
+            cliente_admin, "POST", "/importar-prospectos", None, iteraciones_importacion, archivos=excel
+        )
+        print(f"⏱️  importar_prospectos: {resultados['importar_prospectos']}")
+
+    return {
+        "commit": _commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "base_datos": engine.dialect.name,
+        "volumenes": contar_filas(engine),
+        "iteraciones": iteraciones,
+        "filas_importacion": filas_importacion,
+        "escenarios": resultados,
+    }
+
+
+def _commit_actual():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def comparar(actual: dict, base: dict):
+    """Imprime la variación de p50/p95 y consultas respecto a un resultado anterior"""
+    print(f"\n📊 {base.get('commit')} → {actual.get('commit')}")
+    print(f"{'escenario':32} {'p50 base':>10} {'p50':>10} {'Δ%':>7} {'p95 base':>10} {'p95':>10} {'consultas':>11}")
+    for nombre, medida in actual["escenarios"].items():
+        anterior = base.get("escenarios", {}).get(nombre)
+        if not anterior or "p50_ms" not in anterior or "p50_ms" not in medida:
+            continue
+        delta = (medida["p50_ms"] - anterior["p50_ms"]) / anterior["p50_ms"] * 100 if anterior["p50_ms"] else 0
+        print(f"{nombre:32} {anterior['p50_ms']:>10} {medida['p50_ms']:>10} {delta:>+6.0f}% "
+              f"{anterior['p95_ms']:>10} {medida['p95_ms']:>10} "
+              f"{str(anterior['consultas_p50']) + '→' + str(medida['consultas_p50']):>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de endpoints con cliente ASGI en proceso")
+    parser.add_argument("--url", required=True, help="URL de SQLAlchemy de la base de datos sembrada")
+    parser.add_argument("--iteraciones", type=int, default=20)
+    parser.add_argument("--filas-importacion", type=int, default=500)
+    parser.add_argument("--iteraciones-importacion", type=int, default=3)
+    parser.add_argument("--salida", help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", help="Archivo JSON de un resultado anterior")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(ejecutar(args.url, args.iteraciones, args.filas_importacion, args.iteraciones_importacion))
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"✅ Resultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
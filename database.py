@@ -1,9 +1,15 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
-from models import Base
+import models
+from models import Base, version_datos_seq
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+log = logging.getLogger("crm.database")
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -27,6 +33,161 @@ def get_db():
     finally:
         db.close()
 
+# ========== RÉPLICA DE LECTURA (opcional) ==========
+# Los informes (dashboard, estadísticas, historial, exportaciones) solo leen:
+# con DB_REPLICA_URL se ejecutan en la réplica y no compiten con las escrituras
+# de los agentes en el primario. Si la réplica no responde o va más de
+# DB_REPLICA_RETRASO_MAXIMO segundos por detrás, se usa el primario.
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL")
+REPLICA_RETRASO_MAXIMO = float(os.getenv("DB_REPLICA_RETRASO_MAXIMO", "30"))
+REPLICA_INTERVALO_COMPROBACION = 5  # Segundos entre mediciones del retraso
+
+replica_engine = create_engine(DB_REPLICA_URL, pool_pre_ping=True) if DB_REPLICA_URL else None
+
+SessionLectura = sessionmaker(autocommit=False, autoflush=False)
+
+# Sin WAL pendiente de aplicar el retraso es 0 aunque el primario lleve tiempo sin escribir
+_SQL_RETRASO_REPLICA = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_estado_replica = {"disponible": None, "retraso": None, "comprobado": None}
+_lock_replica = threading.Lock()
+
+def _comprobar_replica() -> bool:
+    error = None
+    try:
+        with replica_engine.connect() as conn:
+            retraso = float(conn.execute(_SQL_RETRASO_REPLICA).scalar())
+        disponible = retraso <= REPLICA_RETRASO_MAXIMO
+    except Exception as e:
+        retraso, disponible, error = None, False, str(e)
+
+    # Solo se registran los cambios de estado
+    if disponible != _estado_replica["disponible"]:
+        if disponible:
+            log.info("Informes enrutados a la réplica", extra={"retraso_segundos": retraso})
+        elif error:
+            log.warning("Réplica de lectura no disponible: informes enrutados al primario", extra={"error": error})
+        else:
+            log.warning("Réplica retrasada: informes enrutados al primario",
+                        extra={"retraso_segundos": retraso, "maximo_segundos": REPLICA_RETRASO_MAXIMO})
+    _estado_replica.update(disponible=disponible, retraso=retraso)
+    return disponible
+
+def replica_disponible() -> bool:
+    """Si las lecturas de informes deben ir a la réplica (medición cacheada unos segundos)"""
+    if replica_engine is None:
+        return False
+    ahora = time.monotonic()
+    with _lock_replica:
+        comprobado = _estado_replica["comprobado"]
+        if comprobado is not None and ahora - comprobado < REPLICA_INTERVALO_COMPROBACION:
+            return bool(_estado_replica["disponible"])
+        # Solo un hilo mide; el resto usa el último resultado mientras tanto
+        _estado_replica["comprobado"] = ahora
+    return _comprobar_replica()
+
+def obtener_retraso_replica():
+    """Último retraso medido de la réplica en segundos (None si no hay réplica o no responde)"""
+    return _estado_replica["retraso"]
+
+def crear_sesion_lectura():
+    """
+    Sesión para consultas de solo lectura (informes y exportaciones): en la
+    réplica si está configurada y al día, si no en el primario
+    """
+    return SessionLectura(bind=replica_engine if replica_disponible() else engine)
+
+def get_read_db():
+    db = crear_sesion_lectura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# ========== VERSIÓN DE DATOS (caché de exportaciones) ==========
+# Cualquier commit que modifique estas tablas incrementa version_datos_seq,
+# lo que invalida los archivos de exportación cacheados.
+TABLAS_VERSIONADAS = {
+    modelo.__tablename__ for modelo in (
+        models.Prospecto, models.Interaccion, models.HistorialEstado,
+        models.EstadisticaCotizacion, models.Usuario, models.MedioIngreso
+    )
+}
+
+# El incremento se hace tras el commit, cuando la sesión aún tiene su conexión:
+# usa un pool propio y pequeño para no esperar por las conexiones de las peticiones
+_engine_version = None
+# Si un incremento falla, las exportaciones no usan la caché hasta recuperarlo
+_version_pendiente = False
+
+def _motor_version():
+    global _engine_version
+    if _engine_version is None or _engine_version.url != engine.url:
+        _engine_version = create_engine(engine.url, pool_size=1, max_overflow=4, pool_timeout=5)
+    return _engine_version
+
+def _incrementar_version() -> bool:
+    global _version_pendiente
+    try:
+        with _motor_version().connect() as conn:
+            conn.execute(version_datos_seq.next_value())
+            conn.commit()
+        _version_pendiente = False
+        return True
+    except Exception as e:
+        _version_pendiente = True
+        log.warning("Error incrementando versión de datos: exportaciones sin caché", extra={"error": str(e)})
+        return False
+
+def _marcar_tablas_modificadas(session, tablas):
+    if tablas & TABLAS_VERSIONADAS and engine.dialect.supports_sequences:
+        session.info["version_datos_sucia"] = True
+
+@event.listens_for(SessionLocal, "after_flush")
+def _registrar_cambios_flush(session, flush_context):
+    tablas = {
+        obj.__table__.name
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if hasattr(obj, "__table__")
+    }
+    _marcar_tablas_modificadas(session, tablas)
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _registrar_cambios_masivos(orm_execute_state):
+    # query.update() / query.delete() no pasan por el flush
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper:
+        _marcar_tablas_modificadas(
+            orm_execute_state.session,
+            {orm_execute_state.bind_mapper.local_table.name}
+        )
+
+@event.listens_for(SessionLocal, "after_commit")
+def _incrementar_version_datos(session):
+    # Se incrementa después del commit para que la nueva versión nunca
+    # apunte a datos que aún no son visibles para otras conexiones
+    if session.info.pop("version_datos_sucia", False):
+        _incrementar_version()
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_cambios(session):
+    session.info.pop("version_datos_sucia", None)
+
+def obtener_version_datos(db) -> int:
+    """
+    Versión actual de los datos que leen las exportaciones. Lanza una
+    excepción si hay un incremento pendiente que no se pudo recuperar (la
+    versión no reflejaría el último commit)
+    """
+    if _version_pendiente and not _incrementar_version():
+        raise RuntimeError("Versión de datos desactualizada")
+    return db.execute(text("SELECT last_value FROM version_datos_seq")).scalar()
+
 def create_tables():
     """Crear todas las tablas en la base de datos"""
     Base.metadata.create_all(bind=engine)
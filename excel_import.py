@@ -12,6 +12,12 @@ from typing import Dict, List, Tuple
 from sqlalchemy.orm import Session
 from models import Usuario, Prospecto, MedioIngreso, TipoUsuario, EstadoProspecto, Cliente, Destino
 from auth import get_password_hash
+from services import obtener_alias_destinos, obtener_destinos, obtener_medios_ingreso, obtener_usuarios, resolver_destino_texto
+from services import obtener_logger
+
+log = obtener_logger("importacion")
+# Mensajes por fila: muestreados (LOG_MUESTREO_FILAS) para no inundar el log en importaciones grandes
+log_filas = obtener_logger("importacion.filas")
 
 
 def validar_archivo_excel(archivo) -> Tuple[bool, str]:
@@ -183,7 +189,7 @@ def buscar_destino_similar(nombre: str, db: Session, umbral: float = 0.7, lista_
     if lista_destinos is not None:
         destinos = lista_destinos
     else:
-        destinos = db.query(Destino).filter(Destino.activo == 1).all()
+        destinos = obtener_destinos(db)
     
     mejor_destino = None
     mejor_similitud = 0.0
@@ -198,6 +204,18 @@ def buscar_destino_similar(nombre: str, db: Session, umbral: float = 0.7, lista_
     return mejor_destino, mejor_similitud
 
 
+def _registrar_resultado_importacion(tipo: str, resultado: Dict):
+    """Resumen de la importación y, muestreados, los errores por fila"""
+    for error in resultado['errores']:
+        log_filas.warning("Fila rechazada", extra={"tipo": tipo, "fila": error['fila'], "error": error['error']})
+    log.info("Importación finalizada", extra={
+        "tipo": tipo,
+        "exitosos": resultado['exitosos'],
+        "errores": len(resultado['errores']),
+        "recurrentes": resultado.get('recurrentes', 0)
+    })
+
+
 def importar_usuarios_desde_excel(archivo_path: str, db: Session) -> Dict:
     """
     Importa usuarios desde un archivo Excel.
@@ -370,6 +388,7 @@ def importar_usuarios_desde_excel(archivo_path: str, db: Session) -> Dict:
                 
                 resultado['usuarios_creados'].append(nuevo_usuario)
                 resultado['exitosos'] += 1
+                log_filas.debug("Usuario importado", extra={"fila": fila_num, "usuario_id": nuevo_usuario.id})
                 
             except Exception as e:
                 db.rollback()
@@ -384,6 +403,7 @@ def importar_usuarios_desde_excel(archivo_path: str, db: Session) -> Dict:
             'error': f'Error al leer archivo: {str(e)}'
         })
     
+    _registrar_resultado_importacion('usuarios', resultado)
     return resultado
 
 
@@ -441,16 +461,14 @@ def importar_prospectos_desde_excel(archivo_path: str, db: Session) -> Dict:
             })
             return resultado
         
-        # Obtener todos los destinos activos una sola vez para mejorar rendimiento
-        destinos_activos = db.query(Destino).filter(Destino.activo == 1).all()
+        # Datos de referencia desde la caché en memoria (una sola vez por importación)
+        alias_destinos = dict(obtener_alias_destinos(db))
 
-        # Pre-cargar Medios de Ingreso para evitar consultas repetitivas (Optimización)
-        medios_db = db.query(MedioIngreso).all()
-        medios_map = {m.nombre.upper(): m.id for m in medios_db if m.nombre}
+        medios_map = {m.nombre.upper(): m.id for m in obtener_medios_ingreso(db) if m.nombre}
 
-        # Pre-cargar Usuarios para evitar consultas repetitivas (Optimización)
-        usuarios_db = db.query(Usuario).all()
-        usuarios_map = {u.username: u.id for u in usuarios_db if u.username}
+        usuarios_map = {u.username: u.id for u in obtener_usuarios(db) if u.username}
+
+        ganados_con_viaje = []
 
         # Procesar cada fila
         for index, row in df.iterrows():
@@ -543,43 +561,11 @@ def importar_prospectos_desde_excel(archivo_path: str, db: Session) -> Dict:
                 destino_nombre = None
                 
                 if not pd.isna(destino_texto):
-                    destino_nombre = str(destino_texto).strip().upper()
-                    
-                    # 1. Buscar coincidencia exacta
-                    destino_obj = db.query(Destino).filter(
-                        Destino.nombre == destino_nombre
-                    ).first()
-                    
-                    if destino_obj:
-                        # Destino encontrado exacto
-                        destino_id = destino_obj.id
-                        print(f"   ✓ Destino exacto: {destino_nombre}")
-                    else:
-                        # 2. Buscar por similitud (umbral 70%)
-                        destino_similar, similitud = buscar_destino_similar(
-                            destino_nombre,
-                            db,
-                            umbral=0.7,
-                            lista_destinos=destinos_activos
-                        )
-                        
-                        if destino_similar:
-                            # Destino similar encontrado - usar el existente
-                            destino_id = destino_similar.id
-                            destino_nombre = destino_similar.nombre  # Usar nombre estandarizado
-                            print(f"   ≈ Destino similar encontrado: '{destino_texto}' → '{destino_similar.nombre}' ({similitud*100:.0f}% similar)")
-                        else:
-                            # 3. Crear nuevo destino
-                            nuevo_destino = Destino(
-                                nombre=destino_nombre,
-                                pais=None,  # Se puede agregar manualmente después
-                                continente=None,
-                                activo=1
-                            )
-                            db.add(nuevo_destino)
-                            db.flush()  # Para obtener el ID
-                            destino_id = nuevo_destino.id
-                            print(f"   + Nuevo destino creado: {destino_nombre}")
+                    # Alias conocido → coincidencia exacta → similitud (70%) → nuevo destino;
+                    # las escrituras nuevas quedan como alias para las próximas importaciones
+                    destino_id, destino_nombre = resolver_destino_texto(
+                        db, destino_texto, crear_faltantes=True, alias=alias_destinos
+                    )
                 
                 # Fechas
                 fecha_ida = parsear_fecha(row.get('fecha_ida'))
@@ -787,13 +773,15 @@ def importar_prospectos_desde_excel(archivo_path: str, db: Session) -> Dict:
                     estadistica.generar_id_cotizacion()
                     db.commit()
                     
-                    # ✅ NUEVO: Crear notificaciones automáticas de viaje
+                    # ✅ Los recordatorios de viaje se materializan al final en un solo paso
                     if fecha_ida:
-                        from main import crear_notificaciones_viaje
-                        crear_notificaciones_viaje(nuevo_prospecto, db)
+                        ganados_con_viaje.append(nuevo_prospecto.id)
                 
                 resultado['prospectos_creados'].append(nuevo_prospecto)
                 resultado['exitosos'] += 1
+                log_filas.debug("Prospecto importado", extra={
+                    "fila": fila_num, "prospecto_id": nuevo_prospecto.id, "recurrente": es_recurrente
+                })
                 
                 if es_recurrente:
                     resultado['recurrentes'] += 1
@@ -805,12 +793,18 @@ def importar_prospectos_desde_excel(archivo_path: str, db: Session) -> Dict:
                     'error': f'Error al procesar: {str(e)}'
                 })
         
+        # ✅ Recordatorios de viaje ya vencidos de los ganados importados (un solo INSERT)
+        if ganados_con_viaje:
+            from services import materializar_recordatorios_viaje
+            materializar_recordatorios_viaje(db, prospecto_ids=ganados_con_viaje)
+        
     except Exception as e:
         resultado['errores'].append({
             'fila': 0,
             'error': f'Error al leer archivo: {str(e)}'
         })
     
+    _registrar_resultado_importacion('prospectos', resultado)
     return resultado
 
 
@@ -858,9 +852,8 @@ def importar_clientes_desde_excel(archivo_path: str, db: Session) -> Dict:
             })
             return resultado
         
-        # Pre-cargar Usuarios para evitar consultas repetitivas (Optimización)
-        usuarios_db = db.query(Usuario).all()
-        usuarios_map = {u.username: u.id for u in usuarios_db if u.username}
+        # Usuarios desde la caché de datos de referencia
+        usuarios_map = {u.username: u.id for u in obtener_usuarios(db) if u.username}
 
         # Procesar cada fila
         for index, row in df.iterrows():
@@ -1019,6 +1012,7 @@ def importar_clientes_desde_excel(archivo_path: str, db: Session) -> Dict:
                     
                     resultado['clientes_creados'].append(nuevo_cliente)
                     resultado['exitosos'] += 1
+                    log_filas.debug("Cliente importado", extra={"fila": fila_num, "cliente_id": nuevo_cliente.id})
                 
             except Exception as e:
                 db.rollback()
@@ -1033,4 +1027,5 @@ def importar_clientes_desde_excel(archivo_path: str, db: Session) -> Dict:
             'error': f'Error al leer archivo: {str(e)}'
         })
     
+    _registrar_resultado_importacion('clientes', resultado)
     return resultado
@@ -1,14 +1,16 @@
 # Imports estándar de Python
 import os
 import io
+import asyncio
 import shutil
 import secrets
-from datetime import datetime, date, timedelta
+import time
+from datetime import datetime, date
 import calendar  # ✅ NUEVO: Para calcular último día del mes
 from typing import Optional
 # Imports de librerías de terceros (pypi)
 from fastapi import FastAPI, Depends, HTTPException, Request, Form, Query, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
@@ -30,10 +32,66 @@ from utils import (
     normalizar_fecha_input,
     normalizar_texto_mayusculas,
     normalizar_numero,
-    normalizar_email,
-    enviar_notificacion_email
+    normalizar_email
 )
 
+# Imports de servicios locales
+from services import (
+    consultar_conteos_prospectos_por_agente,
+    generar_excel_interacciones,
+    generar_excel_usuarios,
+    TIPOS_EXPORTACION,
+    encolar_trabajo_exportacion,
+    listar_trabajos_usuario,
+    limpiar_exportaciones_expiradas,
+    marcar_trabajos_interrumpidos,
+    cerrar_pool,
+    generar_alertas_inactividad,
+    consultar_recordatorios_vencidos,
+    despachar_recordatorios_vencidos,
+    materializar_recordatorios_viaje,
+    descartar_recordatorios_viaje,
+    consultar_proximos_recordatorios_viaje,
+    archivar_notificaciones,
+    paginar_notificaciones_con_archivo,
+    buscar_prospectos_rapido,
+    buscar_prospectos_por_id,
+    detectar_tipo_id,
+    obtener_agentes,
+    obtener_medios_ingreso,
+    buscar_destinos_autocompletado,
+    obtener_indice_destinos,
+    normalizar_destinos_prospectos,
+    fusionar_destinos_catalogo,
+    resolver_destino_texto,
+    canal_notificaciones,
+    formatear_evento_sse,
+    obtener_contador,
+    encolar_correo,
+    entregar_correos_pendientes,
+    planificador,
+    iniciar_perfil,
+    terminar_perfil,
+    cabecera_server_timing,
+    registrar_peticion,
+    obtener_estadisticas_rutas,
+    reiniciar_estadisticas_rutas,
+    SENTENCIA_LENTA_MS,
+    PETICION_LENTA_MS,
+    MAX_CONSULTAS,
+    obtener_logger,
+    iniciar_id_peticion,
+    terminar_id_peticion,
+    detener_registro,
+    registrar_peticion_http,
+    registrar_importacion,
+    medir_retraso_event_loop,
+    generar_metricas,
+    marcar_proceso_terminado,
+    crear_particiones_mensuales
+)
+
+log = obtener_logger("app")
 
 app = FastAPI(title="Sistema de Prospectos")
 
@@ -44,10 +102,51 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 templates = Jinja2Templates(directory="templates")
+# ✅ Contador de notificaciones en caché para el badge de la campana (base.html)
+templates.env.globals["contador_notificaciones"] = obtener_contador
+
+
+# ✅ Perfilado de SQL por petición: cabecera Server-Timing, log de peticiones lentas,
+# estadísticas por ruta en /admin/rendimiento y latencias para /metrics
+@app.middleware("http")
+async def perfilar_sql(request: Request, call_next):
+    perfil, token = iniciar_perfil()
+    inicio = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        terminar_perfil(token)
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+
+    response.headers["Server-Timing"] = cabecera_server_timing(perfil, duracion_ms)
+    ruta = request.scope.get("route")
+    ruta = ruta.path if ruta else "(sin ruta)"
+    registrar_peticion(request.method, ruta, response.status_code, perfil, duracion_ms)
+    registrar_peticion_http(request.method, ruta, response.status_code, duracion_ms, perfil.consultas)
+    return response
+
+
+# ✅ Id de correlación: todas las líneas de log de la petición lo llevan y se devuelve al cliente
+# (se declara después de perfilar_sql para envolverlo y cubrir también su log de peticiones lentas)
+@app.middleware("http")
+async def asignar_id_peticion(request: Request, call_next):
+    id_peticion, token = iniciar_id_peticion(request.headers.get("x-request-id"))
+    try:
+        response = await call_next(request)
+    except Exception:
+        log.exception("Excepción no controlada", extra={"metodo": request.method, "url": str(request.url.path)})
+        raise
+    finally:
+        terminar_id_peticion(token)
+    response.headers["X-Request-ID"] = id_peticion
+    return response
 
 # Almacenamiento simple de sesiones en memoria
 active_sessions = {}
 
+# Token opcional para proteger /metrics (Authorization: Bearer <token>)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 # Crear tablas al inicio
 @app.on_event("startup")
 def startup():
@@ -92,19 +191,46 @@ def startup():
             db.add(servicio_user)
         
         db.commit()
-        print("Datos iniciales creados correctamente")
-        print("Usuario admin: admin / admin123")
-        print("Usuario agente: agente1 / agente123")
-        print("Usuario servicio_cliente: servicio_cliente / servicio123")
-        print("No se crearon prospectos de prueba. Puedes crearlos manualmente.")
         
-    except Exception as e:
+        # ✅ Particiones mensuales de interacciones/historial del mes actual y siguientes
+        crear_particiones_mensuales(db)
+        
+        # ✅ Exportaciones en segundo plano: limpiar trabajos huérfanos y archivos expirados
+        marcar_trabajos_interrumpidos(db)
+        limpiar_exportaciones_expiradas(db)
+        
+        log.info("Datos iniciales verificados", extra={"usuarios_por_defecto": ["admin", "agente1", "servicio_cliente"]})
+        
+    except Exception:
         db.rollback()
-        print(f"❌ Error inicializando datos: {e}")
+        log.exception("Error inicializando datos")
     finally:
         db.close()
 
 
+# ✅ Tareas periódicas en segundo plano (fuera de las peticiones)
+@app.on_event("startup")
+async def iniciar_tareas_programadas():
+    planificador.agregar_tarea("alertas_inactividad", 15 * 60, generar_alertas_inactividad)
+    planificador.agregar_tarea("limpieza_exportaciones", 60 * 60, limpiar_exportaciones_expiradas)
+    planificador.agregar_tarea("archivo_notificaciones", 60 * 60, archivar_notificaciones)
+    planificador.agregar_tarea("recordatorios_viaje", 15 * 60, materializar_recordatorios_viaje)
+    planificador.agregar_tarea("recordatorios_vencidos", 15, despachar_recordatorios_vencidos)
+    planificador.agregar_tarea("correos_salientes", 10, entregar_correos_pendientes)
+    planificador.agregar_tarea("particiones_mensuales", 24 * 60 * 60, crear_particiones_mensuales)
+    planificador.iniciar()
+    canal_notificaciones.iniciar_puente()
+    app.state.tarea_event_loop = asyncio.create_task(medir_retraso_event_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await planificador.detener()
+    await asyncio.to_thread(canal_notificaciones.detener_puente)
+    cerrar_pool()
+    app.state.tarea_event_loop.cancel()
+    marcar_proceso_terminado()
+    detener_registro()
 
 
 # Función simple para obtener usuario actual
@@ -121,8 +247,8 @@ async def get_current_user(request: Request, db: Session = Depends(database.get_
         
         user = db.query(models.Usuario).filter(models.Usuario.id == user_id).first()
         return user
-    except Exception as e:
-        print(f"❌ Error in get_current_user: {e}")
+    except Exception:
+        log.exception("Error obteniendo el usuario actual")
         return None
 
 # Verificar si usuario es admin
@@ -131,72 +257,6 @@ async def require_admin(user: models.Usuario = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="No tiene permisos de administrador")
     return user
 
-# ========== FUNCIÓN PARA NOTIFICACIONES AUTOMÁTICAS DE VIAJE ==========
-
-def crear_notificaciones_viaje(prospecto: models.Prospecto, db: Session):
-    """
-    Crea notificaciones automáticas para seguimiento de viaje.
-    
-    Genera 3 notificaciones:
-    - 45 días antes: Confirmar pagos y estado de reserva
-    - 10 días antes: Validar gestiones pre-viaje
-    - 2 días antes: Validar pre-viaje, formularios y gestiones finales
-    
-    Args:
-        prospecto: Objeto Prospecto con estado ganado
-        db: Sesión de base de datos
-    """
-    # Validar que tenga fecha_ida
-    if not prospecto.fecha_ida:
-        return
-    
-    # Validar que sea estado ganado
-    if prospecto.estado != EstadoProspecto.GANADO.value:
-        return
-    
-    hoy = datetime.now().date()
-    
-    # Eliminar notificaciones automáticas anteriores de este prospecto
-    db.query(models.Notificacion).filter(
-        models.Notificacion.prospecto_id == prospecto.id,
-        models.Notificacion.tipo == 'seguimiento_viaje'
-    ).delete()
-    
-    # Definir notificaciones
-    notificaciones_config = [
-        {
-            'dias_antes': 45,
-            'mensaje': f'Confirmar pagos y estado de reserva - Viaje a {prospecto.destino or "destino"}'
-        },
-        {
-            'dias_antes': 10,
-            'mensaje': f'Validar con cliente gestiones pre-viaje - Viaje a {prospecto.destino or "destino"}'
-        },
-        {
-            'dias_antes': 2,
-            'mensaje': f'Validar pre-viaje, formularios y gestiones finales - Viaje a {prospecto.destino or "destino"}'
-        }
-    ]
-    
-    # Crear notificaciones
-    for config in notificaciones_config:
-        fecha_notificacion = prospecto.fecha_ida - timedelta(days=config['dias_antes'])
-        
-        # Solo crear si la fecha es futura
-        if fecha_notificacion >= hoy:
-            nueva_notificacion = models.Notificacion(
-                prospecto_id=prospecto.id,
-                usuario_id=prospecto.agente_asignado_id,
-                tipo='seguimiento_viaje',
-                mensaje=config['mensaje'],
-                fecha_programada=datetime.combine(fecha_notificacion, datetime.min.time()),
-                leida=False,
-                email_enviado=False
-            )
-            db.add(nueva_notificacion)
-    
-    db.commit()
-
 # ========== FUNCIÓN PARA ORGANIZAR UPLOADS POR FECHA ==========
 
 def obtener_ruta_upload_por_fecha(fecha: datetime = None) -> str:
@@ -320,7 +380,9 @@ async def importar_usuarios(
             shutil.copyfileobj(archivo.file, buffer)
         
         # Importar usuarios
+        inicio_importacion = time.perf_counter()
         resultado = excel_import.importar_usuarios_desde_excel(temp_path, db)
+        registrar_importacion("usuarios", time.perf_counter() - inicio_importacion, resultado)
         
         # Eliminar archivo temporal
         os.remove(temp_path)
@@ -370,7 +432,9 @@ async def importar_prospectos(
             shutil.copyfileobj(archivo.file, buffer)
         
         # Importar prospectos
+        inicio_importacion = time.perf_counter()
         resultado = excel_import.importar_prospectos_desde_excel(temp_path, db)
+        registrar_importacion("prospectos", time.perf_counter() - inicio_importacion, resultado)
         
         # Eliminar archivo temporal
         os.remove(temp_path)
@@ -449,7 +513,9 @@ async def importar_clientes(
             shutil.copyfileobj(archivo.file, buffer)
         
         # Importar clientes
+        inicio_importacion = time.perf_counter()
         resultado = excel_import.importar_clientes_desde_excel(temp_path, db)
+        registrar_importacion("clientes", time.perf_counter() - inicio_importacion, resultado)
         
         # Eliminar archivo temporal
         os.remove(temp_path)
@@ -474,22 +540,50 @@ async def importar_clientes(
 
 # ========== API DE AUTOCOMPLETADO DE DESTINOS ==========
 
+def respuesta_autocompletado_destinos(request: Request, contenido, db: Session):
+    """Respuesta JSON cacheable: ETag por generación del índice de destinos"""
+    etag = f'W/"destinos-{obtener_indice_destinos(db).generacion}"'
+    cabeceras = {"Cache-Control": "private, max-age=300", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cabeceras)
+    return JSONResponse(content=contenido, headers=cabeceras)
+
+
 @app.get("/api/destinos/buscar")
 async def buscar_destinos(
+    request: Request,
     q: str = Query(..., min_length=2),
     db: Session = Depends(database.get_db),
     user: models.Usuario = Depends(get_current_user)
 ):
-    """Buscar destinos para autocompletado"""
+    """Buscar destinos para autocompletado (índice en memoria)"""
     if not user:
         raise HTTPException(status_code=401, detail="No autenticado")
     
-    destinos = db.query(models.Destino).filter(
-        models.Destino.nombre.ilike(f"%{q}%"),
-        models.Destino.activo == 1
-    ).limit(10).all()
+    destinos = buscar_destinos_autocompletado(q, limite=10, db=db)
     
-    return [{"id": d.id, "nombre": d.nombre, "pais": d.pais} for d in destinos]
+    return respuesta_autocompletado_destinos(
+        request, [{"id": d.id, "nombre": d.nombre, "pais": d.pais} for d in destinos], db
+    )
+
+
+# ========== API DE AUTOCOMPLETADO DE PROSPECTOS ==========
+
+@app.get("/api/prospectos/buscar")
+async def buscar_prospectos_autocompletado(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=50),
+    db: Session = Depends(database.get_db)
+):
+    """Buscar prospectos del usuario por nombre, teléfono o ID (selector con autocompletado)"""
+    user = await get_current_user(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    
+    resultados = buscar_prospectos_rapido(db, user, q)
+    
+    # ✅ El navegador reutiliza la respuesta si se repite la misma búsqueda
+    return JSONResponse(content=resultados, headers={"Cache-Control": "private, max-age=30"})
 
 
 # ========== PANEL DE GESTIÓN DE DESTINOS ==========
@@ -597,16 +691,9 @@ async def fusionar_destinos(
     if destino_principal_id == destino_secundario_id:
         return RedirectResponse(url="/destinos?error=same", status_code=303)
     
-    # Mover todos los prospectos del secundario al principal
-    prospectos_afectados = db.query(models.Prospecto).filter(
-        models.Prospecto.destino_id == destino_secundario_id
-    ).update({"destino_id": destino_principal_id, "destino": destino_principal.nombre})
-    
-    # Desactivar el destino secundario
-    destino_secundario.activo = 0
-    
-    db.commit()
-    
+    # ✅ Mover los prospectos al principal y desactivar el secundario (misma lógica que el agrupador)
+    prospectos_afectados = fusionar_destinos_catalogo(db, destino_principal_id, [destino_secundario_id])
+
     return RedirectResponse(
         url=f"/destinos?success=merged&count={prospectos_afectados}",
         status_code=303
@@ -649,7 +736,7 @@ async def dashboard(
     periodo: str = Query("mes"),  # dia, semana, mes, año, personalizado
     fecha_inicio: str = Query(None),
     fecha_fin: str = Query(None),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_read_db)
 ):
     user = await get_current_user(request, db)
     
@@ -660,9 +747,6 @@ async def dashboard(
         # Determinar el rango de fechas según el periodo seleccionado
         fecha_inicio_obj, fecha_fin_obj = calcular_rango_fechas(periodo, fecha_inicio, fecha_fin)
         
-        print(f"📊 Calculando estadísticas para periodo: {periodo}")
-        print(f"📅 Rango: {fecha_inicio_obj} a {fecha_fin_obj}")
-        
         # Convertir a datetime para consultas
         fecha_inicio_dt = datetime.combine(fecha_inicio_obj, datetime.min.time())
         fecha_fin_dt = datetime.combine(fecha_fin_obj, datetime.max.time())
@@ -676,14 +760,12 @@ async def dashboard(
         
         # Estadísticas básicas
         if user.tipo_usuario in [TipoUsuario.ADMINISTRADOR.value, TipoUsuario.SUPERVISOR.value]:
-            print("👨‍💼 Usuario es Admin/Supervisor - mostrando estadísticas generales")
             
             # ✅ CORREGIDO: Total de prospectos en el periodo (NO filtrado por estado)
             total_prospectos = db.query(models.Prospecto).filter(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"📈 Total prospectos: {total_prospectos}")
             
             # ✅ NUEVO: Prospectos con datos completos
             prospectos_con_datos = db.query(models.Prospecto).filter(
@@ -691,7 +773,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"📝 Prospectos con datos: {prospectos_con_datos}")
             
             # ✅ NUEVO: Prospectos sin datos (solo teléfono)
             prospectos_sin_datos = db.query(models.Prospecto).filter(
@@ -699,7 +780,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"📱 Prospectos sin datos: {prospectos_sin_datos}")
             
             # Clientes nuevos sin asignar en el periodo
             clientes_sin_asignar = db.query(models.Prospecto).filter(
@@ -708,7 +788,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"🆕 Clientes sin asignar: {clientes_sin_asignar}")
             
             # Clientes asignados en el periodo (cualquier estado)
             clientes_asignados = db.query(models.Prospecto).filter(
@@ -716,7 +795,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"📅 Clientes asignados: {clientes_asignados}")
             
             # Destinos registrados en el periodo
             destinos_query = db.query(models.Prospecto.destino).filter(
@@ -726,7 +804,6 @@ async def dashboard(
                 models.Prospecto.destino != ''
             ).distinct().all()
             destinos_count = len(destinos_query)
-            print(f"🌍 Destinos registrados: {destinos_count}")
             
             # Ventas registradas en el periodo
             ventas_count = db.query(models.Prospecto).filter(
@@ -734,7 +811,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"💰 Ventas: {ventas_count}")
             
             # Destinos más solicitados en el periodo
             destinos_populares = db.query(
@@ -746,7 +822,6 @@ async def dashboard(
                 models.Prospecto.destino.isnot(None),
                 models.Prospecto.destino != ''
             ).group_by(models.Prospecto.destino).order_by(func.count(models.Prospecto.id).desc()).limit(5).all()
-            print(f"🏆 Destinos populares: {len(destinos_populares)}")
             
             # Estadísticas por estado en el periodo
             prospectos_nuevos = db.query(models.Prospecto).filter(
@@ -787,17 +862,9 @@ async def dashboard(
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
             
-            print(f"📊 Estados - Nuevos: {prospectos_nuevos}, Seguimiento: {prospectos_seguimiento}, Cotizados: {prospectos_cotizados}, Ganados: {prospectos_ganados}, Perdidos: {prospectos_perdidos}, Canceladas: {ventas_canceladas}")
-            
             # Conversión por agente en el periodo
             conversion_agentes = []
-            agentes_con_prospectos = db.query(
-                models.Usuario.id,
-                models.Usuario.username
-            ).filter(
-                models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value,
-                models.Usuario.activo == 1  # ✅ Solo agentes activos
-            ).all()
+            agentes_con_prospectos = obtener_agentes(db)  # ✅ Solo agentes activos (caché de referencia)
             
             for agente in agentes_con_prospectos:
                 total_agente = db.query(models.Prospecto).filter(
@@ -827,10 +894,7 @@ async def dashboard(
                     'ganados': ganados_agente
                 })
             
-            print(f"👥 Conversión agentes: {len(conversion_agentes)} agentes")
-            
         else:
-            print("👤 Usuario es Agente - mostrando estadísticas personales")
             
             # Estadísticas para agente (solo sus datos) en el periodo
             total_prospectos = db.query(models.Prospecto).filter(
@@ -838,7 +902,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"📈 Total prospectos agente: {total_prospectos}")
             
             # ✅ AGREGADO: Prospectos con datos completos para agente
             prospectos_con_datos = db.query(models.Prospecto).filter(
@@ -847,7 +910,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"📝 Prospectos con datos agente: {prospectos_con_datos}")
             
             # ✅ AGREGADO: Prospectos sin datos para agente
             prospectos_sin_datos = db.query(models.Prospecto).filter(
@@ -856,7 +918,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"📱 Prospectos sin datos agente: {prospectos_sin_datos}")
             
             # Clientes asignados al agente en el periodo
             clientes_asignados = db.query(models.Prospecto).filter(
@@ -864,7 +925,6 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            print(f"📅 Clientes asignados agente: {clientes_asignados}")
             
             # Destinos registrados por el agente en el periodo
             destinos_query = db.query(models.Prospecto.destino).filter(
@@ -875,7 +935,6 @@ async def dashboard(
                 models.Prospecto.destino != ''
             ).distinct().all()
             destinos_count = len(destinos_query)
-            print(f"🌍 Destinos registrados agente: {destinos_count}")
             
             # Ventas del agente en el periodo
             # Ventas del agente en el periodo (Basado en historial de cambios)
@@ -885,7 +944,6 @@ async def dashboard(
                 models.HistorialEstado.fecha_cambio >= fecha_inicio_dt,
                 models.HistorialEstado.fecha_cambio <= fecha_fin_dt
             ).count()
-            print(f"💰 Ventas agente: {ventas_count}")
             
             # Destinos más solicitados por el agente en el periodo
             destinos_populares = db.query(
@@ -898,7 +956,6 @@ async def dashboard(
                 models.Prospecto.destino.isnot(None),
                 models.Prospecto.destino != ''
             ).group_by(models.Prospecto.destino).order_by(func.count(models.Prospecto.id).desc()).limit(5).all()
-            print(f"🏆 Destinos populares agente: {len(destinos_populares)}")
             
             # Para agente, no mostrar estos datos generales
             clientes_sin_asignar = 0
@@ -941,15 +998,18 @@ async def dashboard(
                 models.Prospecto.fecha_registro >= fecha_inicio_dt,
                 models.Prospecto.fecha_registro <= fecha_fin_dt
             ).count()
-            
-            print(f"📊 Estados agente - Nuevos: {prospectos_nuevos}, Seguimiento: {prospectos_seguimiento}, Cotizados: {prospectos_cotizados}, Ganados: {prospectos_ganados}, Perdidos: {prospectos_perdidos}")
-            
+
             conversion_agentes = []
-        
-    except Exception as e:
-        print(f"❌ Error grave calculando estadísticas: {e}")
-        import traceback
-        traceback.print_exc()
+
+        log.debug("Estadísticas del dashboard calculadas", extra={
+            "periodo": periodo, "desde": fecha_inicio_obj, "hasta": fecha_fin_obj,
+            "usuario_id": user.id, "total_prospectos": total_prospectos, "ventas": ventas_count,
+            "nuevos": prospectos_nuevos, "seguimiento": prospectos_seguimiento, "cotizados": prospectos_cotizados,
+            "ganados": prospectos_ganados, "perdidos": prospectos_perdidos, "agentes": len(conversion_agentes)
+        })
+
+    except Exception:
+        log.exception("Error grave calculando estadísticas")
         # Inicializar todas las variables con valores por defecto
         total_prospectos = prospectos_con_datos = prospectos_sin_datos = 0
         clientes_sin_asignar = clientes_asignados = destinos_count = ventas_count = 0
@@ -1099,7 +1159,7 @@ async def listar_prospectos(
                 models.Prospecto.observaciones.ilike(search_term)
             )
         )
-        print(f"🔍 Aplicando búsqueda global: {busqueda_global}")
+        log.debug("Aplicando búsqueda global", extra={"busqueda_global": busqueda_global})
     
     # ✅ FILTRO POR TELÉFONO
     if telefono:
@@ -1133,13 +1193,10 @@ async def listar_prospectos(
     offset = (page - 1) * limit
     prospectos = query.offset(offset).limit(limit).all()
     
-    # Obtener datos para filtros
-    agentes = db.query(models.Usuario).filter(
-        models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value,
-        models.Usuario.activo == 1  # ✅ Solo agentes activos
-    ).all()
+    # Obtener datos para filtros (caché de datos de referencia)
+    agentes = obtener_agentes(db)  # ✅ Solo agentes activos
     
-    medios_ingreso = db.query(models.MedioIngreso).all()
+    medios_ingreso = obtener_medios_ingreso(db)
     
     return templates.TemplateResponse("prospectos.html", {
         "request": request,
@@ -1281,9 +1338,7 @@ async def crear_prospecto(
             }
             
             # ✅ AGREGAR: Obtener lista de agentes para el select
-            agentes = db.query(models.Usuario).filter(
-                models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value
-            ).all()
+            agentes = obtener_agentes(db, solo_activos=False)
             
             # Renderizar template de confirmación
             return templates.TemplateResponse("confirmar_cliente_existente.html", {
@@ -1363,6 +1418,8 @@ async def crear_prospecto(
         apellido_normalizado = normalizar_texto_mayusculas(apellido_final)
         ciudad_origen_normalizada = normalizar_texto_mayusculas(ciudad_origen)
         destino_normalizado = normalizar_texto_mayusculas(destino)
+        # ✅ Resolver al catálogo solo por alias confirmado o nombre exacto; si no, se guarda lo escrito
+        destino_id, destino_normalizado = resolver_destino_texto(db, destino_normalizado, permitir_similares=False) if destino_normalizado else (None, destino_normalizado)
         email_normalizado = normalizar_email(email_final)
         empresa_segundo_titular_normalizado = normalizar_texto_mayusculas(empresa_segundo_titular)  # ✅ NUEVO
         # observaciones NO se normalizan (mantener formato original)
@@ -1380,6 +1437,7 @@ async def crear_prospecto(
             indicativo_telefono_secundario=indicativo_telefono_secundario,
             ciudad_origen=ciudad_origen_normalizada,  # ✅ NORMALIZADO A MAYÚSCULAS
             destino=destino_normalizado,  # ✅ NORMALIZADO A MAYÚSCULAS
+            destino_id=destino_id,
             fecha_ida=fecha_ida_date,
             fecha_vuelta=fecha_vuelta_date,
             pasajeros_adultos=pasajeros_adultos,
@@ -1407,14 +1465,14 @@ async def crear_prospecto(
         # 1. Reutilizar id_cliente si es cliente recurrente, sino generar nuevo
         if todos_clientes_existentes and todos_clientes_existentes[0].id_cliente:
             prospecto.id_cliente = todos_clientes_existentes[0].id_cliente
-            print(f"♻️ Reutilizando id_cliente: {prospecto.id_cliente}")
+            log.debug("Reutilizando id_cliente", extra={"id_cliente": prospecto.id_cliente})
         else:
             prospecto.generar_id_cliente()
-            print(f"✅ Nuevo id_cliente generado: {prospecto.id_cliente}")
+            log.debug("Nuevo id_cliente generado", extra={"id_cliente": prospecto.id_cliente})
         
         # 2. Siempre generar nuevo id_solicitud (único por caso/viaje)
         prospecto.generar_id_solicitud()
-        print(f"✅ Nuevo id_solicitud generado: {prospecto.id_solicitud}")
+        log.info("Prospecto creado", extra={"prospecto_id": prospecto.id, "id_cliente": prospecto.id_cliente, "id_solicitud": prospecto.id_solicitud})
         
         db.commit()
 
@@ -1435,9 +1493,9 @@ async def crear_prospecto(
         mensaje = "Prospecto creado correctamente" + (" (Cliente recurrente)" if cliente_recurrente else "")
         return RedirectResponse(url=f"/prospectos?success={mensaje}", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error creating prospect: {e}")
+        log.exception("Error creando prospecto")
         return RedirectResponse(url="/prospectos?error=Error al crear prospecto", status_code=303)
 
 
@@ -1463,7 +1521,7 @@ async def mostrar_editar_prospecto(
         return RedirectResponse(url="/prospectos?error=No tiene permisos para editar este prospecto", status_code=303)
     
     # Obtener medios de ingreso para el dropdown
-    medios_ingreso = db.query(models.MedioIngreso).all()
+    medios_ingreso = obtener_medios_ingreso(db)
     
     return templates.TemplateResponse("editar_prospecto.html", {
         "request": request,
@@ -1539,6 +1597,8 @@ async def editar_prospecto(
         apellido_normalizado = normalizar_texto_mayusculas(apellido)
         ciudad_origen_normalizada = normalizar_texto_mayusculas(ciudad_origen)
         destino_normalizado = normalizar_texto_mayusculas(destino)
+        # ✅ Resolver al catálogo solo por alias confirmado o nombre exacto; si no, se guarda lo escrito
+        destino_id, destino_normalizado = resolver_destino_texto(db, destino_normalizado, permitir_similares=False) if destino_normalizado else (None, destino_normalizado)
         email_normalizado = normalizar_email(correo_electronico)
         numero_identificacion_normalizado = normalizar_numero(numero_identificacion) if numero_identificacion else None
         direccion_normalizada = normalizar_texto_mayusculas(direccion)  # ✅ NUEVO
@@ -1574,6 +1634,7 @@ async def editar_prospecto(
         prospecto.indicativo_telefono_secundario = indicativo_telefono_secundario
         prospecto.ciudad_origen = ciudad_origen_normalizada  # ✅ NORMALIZADO A MAYÚSCULAS
         prospecto.destino = destino_normalizado  # ✅ NORMALIZADO A MAYÚSCULAS
+        prospecto.destino_id = destino_id
         prospecto.fecha_ida = fecha_ida_date
         prospecto.fecha_vuelta = fecha_vuelta_date
         prospecto.pasajeros_adultos = pasajeros_adultos
@@ -1591,10 +1652,12 @@ async def editar_prospecto(
         
         db.commit()
         
-        # ✅ NUEVO: Crear notificaciones automáticas de viaje
-        # Si cambió a ganado O si es ganado y cambió la fecha_ida
-        if estado_cambio_a_ganado or (prospecto.estado == EstadoProspecto.GANADO.value and fecha_ida_cambio and fecha_ida_date):
-            crear_notificaciones_viaje(prospecto, db)
+        # ✅ Recordatorios de viaje: se derivan de fecha_ida y el planificador
+        # materializa los vencidos. Si cambió la fecha se descartan los pendientes
+        # y se crean al momento los que ya vencieron con la nueva fecha.
+        if estado_cambio_a_ganado or (prospecto.estado == EstadoProspecto.GANADO.value and fecha_ida_cambio):
+            descartar_recordatorios_viaje(db, prospecto.id)
+            materializar_recordatorios_viaje(db, prospecto_ids=[prospecto.id])
         
         # Redirigir según origen
         if origen_solicitud == "seguimiento":
@@ -1602,9 +1665,9 @@ async def editar_prospecto(
         else:
             return RedirectResponse(url="/prospectos?success=Prospecto actualizado correctamente", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error updating prospect: {e}")
+        log.exception("Error actualizando prospecto")
         redirect_url = f"/prospectos/{prospecto_id}/seguimiento?error=Error al actualizar" if origen_solicitud == "seguimiento" else "/prospectos?error=Error al actualizar prospecto"
         return RedirectResponse(url=redirect_url, status_code=303)
 
@@ -1653,9 +1716,9 @@ async def eliminar_prospecto(
         
         return RedirectResponse(url="/prospectos?success=Prospecto eliminado correctamente", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error eliminando prospecto: {e}")
+        log.exception("Error eliminando prospecto")
         return RedirectResponse(url="/prospectos?error=Error al eliminar prospecto", status_code=303)
 
 @app.post("/prospectos/{prospecto_id}/asignar")
@@ -1714,12 +1777,11 @@ async def asignar_agente(
             )
             db.add(notificacion)
             
-            # ✅ ENVIAR EMAIL AL AGENTE
+            # ✅ ENVIAR EMAIL AL AGENTE (bandeja de salida, se entrega en segundo plano)
             if agente.email:
                 asunto = "Nuevo Prospecto Asignado 🚀"
                 cuerpo = f"Hola {agente.username},\n\nSe te ha asignado el prospecto {prospecto.nombre} {prospecto.apellido}.\n\nIngresa al sistema para gestionarlo."
-                enviado = enviar_notificacion_email(agente.email, asunto, cuerpo)
-                notificacion.email_enviado = enviado
+                encolar_correo(db, agente.email, asunto, cuerpo, notificacion=notificacion)
         
         db.commit()
         
@@ -1771,9 +1833,9 @@ async def asignar_agente(
     
     except HTTPException:
         raise
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error asignando agente: {e}")
+        log.exception("Error asignando agente")
         return RedirectResponse(url="/prospectos?error=Error al asignar agente", status_code=303)
 
 # ========== GESTIÓN DE INTERACCIONES ==========
@@ -1900,13 +1962,14 @@ async def registrar_interaccion(
                 
                 # Feedback visual en el log/email
                 if user.email:
-                    enviar_notificacion_email(
+                    encolar_correo(
+                        db,
                         user.email, 
                         "Recordatorio Programado 📅", 
                         f"Has programado un seguimiento para el prospecto {prospecto.nombre} el {fecha_prog}."
                     )
             except ValueError:
-                print(f"❌ Error formato fecha recordatorio: {fecha_proximo_contacto}")
+                log.warning("Formato de fecha de recordatorio inválido", extra={"fecha": fecha_proximo_contacto})
         
         # ✅ REGISTRAR ESTADÍSTICA DE COTIZACIÓN (SIEMPRE CREAR NUEVA)
         if (cambio_estado == EstadoProspecto.COTIZADO.value and 
@@ -1927,7 +1990,7 @@ async def registrar_interaccion(
             
             # ✅ ASIGNAR ID DE COTIZACIÓN AL PROSPECTO (última cotización)
             prospecto.id_cotizacion = estadistica.id_cotizacion
-            print(f"✅ Nueva cotización generada al cambiar estado: {estadistica.id_cotizacion}")
+            log.info("Nueva cotización generada al cambiar estado", extra={"id_cotizacion": estadistica.id_cotizacion, "prospecto_id": prospecto_id})
 
         
         # Actualizar estado del prospecto si hay cambio
@@ -1945,9 +2008,9 @@ async def registrar_interaccion(
             status_code=303
         )
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error registrando interacción: {e}")
+        log.exception("Error registrando interacción")
         return RedirectResponse(
             url=f"/prospectos/{prospecto_id}/seguimiento?error=Error al registrar interacción", 
             status_code=303
@@ -2040,7 +2103,7 @@ async def subir_documento(
             
             # ✅ ASIGNAR ID DE COTIZACIÓN AL PROSPECTO (última cotización)
             prospecto.id_cotizacion = estadistica.id_cotizacion
-            print(f"✅ Nueva cotización generada: {estadistica.id_cotizacion}")
+            log.info("Nueva cotización generada", extra={"id_cotizacion": estadistica.id_cotizacion, "prospecto_id": prospecto_id})
 
             
             # Registrar interacción automática de cambio de estado
@@ -2072,11 +2135,9 @@ async def subir_documento(
             status_code=303
         )
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error subiendo documento: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error subiendo documento")
         return RedirectResponse(
             url=f"/prospectos/{prospecto_id}/seguimiento?error=Error al subir documento", 
             status_code=303
@@ -2101,47 +2162,14 @@ async def buscar_por_id(
     if valor_id:
         valor_id = valor_id.upper().strip()
         
-        if tipo_id == "cliente":
-            # Buscar por ID de cliente (puede traer múltiples solicitudes)
-            resultados = db.query(models.Prospecto).filter(
-                models.Prospecto.id_cliente.ilike(f"%{valor_id}%")
-            ).all()
-            tipo_busqueda = f"Clientes con ID: {valor_id}"
-        
-        elif tipo_id == "solicitud":
-            # ✅ NUEVO: Buscar por ID de solicitud (único)
-            resultados = db.query(models.Prospecto).filter(
-                models.Prospecto.id_solicitud.ilike(f"%{valor_id}%")
-            ).all()
-            tipo_busqueda = f"Solicitudes con ID: {valor_id}"
-            
-        elif tipo_id == "cotizacion":
-            # Buscar por ID de cotización
-            estadisticas = db.query(models.EstadisticaCotizacion).filter(
-                models.EstadisticaCotizacion.id_cotizacion.ilike(f"%{valor_id}%")
-            ).all()
-            # Obtener prospectos relacionados
-            for stats in estadisticas:
-                prospecto = db.query(models.Prospecto).filter(
-                    models.Prospecto.id == stats.prospecto_id
-                ).first()
-                if prospecto:
-                    resultados.append(prospecto)
-            tipo_busqueda = f"Cotizaciones con ID: {valor_id}"
-            
-        elif tipo_id == "documento":
-            # Buscar por ID de documento
-            documentos = db.query(models.Documento).filter(
-                models.Documento.id_documento.ilike(f"%{valor_id}%")
-            ).all()
-            # Obtener prospectos relacionados
-            for doc in documentos:
-                prospecto = db.query(models.Prospecto).filter(
-                    models.Prospecto.id == doc.prospecto_id
-                ).first()
-                if prospecto:
-                    resultados.append(prospecto)
-            tipo_busqueda = f"Documentos con ID: {valor_id}"
+        # ✅ Igualdad o prefijo sobre índices; cotizaciones y documentos en la misma consulta
+        resultados = buscar_prospectos_por_id(db, valor_id, tipo=tipo_id)
+        tipo_busqueda = {
+            "cliente": f"Clientes con ID: {valor_id}",
+            "solicitud": f"Solicitudes con ID: {valor_id}",
+            "cotizacion": f"Cotizaciones con ID: {valor_id}",
+            "documento": f"Documentos con ID: {valor_id}",
+        }.get(tipo_id, "")
     
     return templates.TemplateResponse("busqueda_ids.html", {
         "request": request,
@@ -2232,9 +2260,9 @@ async def crear_usuario(
         
         return RedirectResponse(url="/usuarios?success=Usuario creado correctamente", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error creating user: {e}")
+        log.exception("Error creando usuario")
         return RedirectResponse(url="/usuarios?error=Error al crear usuario", status_code=303)
 
 @app.post("/usuarios/{usuario_id}/editar")
@@ -2274,9 +2302,9 @@ async def editar_usuario(
         
         return RedirectResponse(url="/usuarios?success=Usuario actualizado correctamente", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error updating user: {e}")
+        log.exception("Error actualizando usuario")
         return RedirectResponse(url="/usuarios?error=Error al actualizar usuario", status_code=303)
 
 @app.post("/usuarios/{usuario_id}/eliminar")
@@ -2300,9 +2328,9 @@ async def eliminar_usuario(
         
         return RedirectResponse(url="/usuarios?success=Usuario eliminado correctamente", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error deleting user: {e}")
+        log.exception("Error eliminando usuario")
         return RedirectResponse(url="/usuarios?error=Error al eliminar usuario", status_code=303)
 
 @app.post("/usuarios/{usuario_id}/desactivar")
@@ -2358,9 +2386,9 @@ async def desactivar_usuario(
         mensaje = f"Usuario desactivado correctamente. {prospectos_reasignados} prospectos reasignados a servicio_cliente"
         return RedirectResponse(url=f"/usuarios?success={mensaje}", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error desactivando usuario: {e}")
+        log.exception("Error desactivando usuario")
         return RedirectResponse(url="/usuarios?error=Error al desactivar usuario", status_code=303)
 
 @app.post("/usuarios/{usuario_id}/reactivar")
@@ -2398,9 +2426,9 @@ async def reactivar_usuario(
         
         return RedirectResponse(url="/usuarios?success=Usuario reactivado correctamente", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error reactivando usuario: {e}")
+        log.exception("Error reactivando usuario")
         return RedirectResponse(url="/usuarios?error=Error al reactivar usuario", status_code=303)
 
 # ========== HISTORIAL DE PROSPECTOS CERRADOS ==========
@@ -2416,7 +2444,7 @@ async def listar_prospectos_cerrados(
     agente_asignado_id: str = Query(None),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_read_db)
 ):
     user = await get_current_user(request, db)
     
@@ -2500,9 +2528,7 @@ async def listar_prospectos_cerrados(
     prospectos_cerrados = query.offset(offset).limit(limit).all()
     
     # Obtener datos para filtros
-    agentes = db.query(models.Usuario).filter(
-        models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value
-    ).all()
+    agentes = obtener_agentes(db, solo_activos=False)
     
     return templates.TemplateResponse("prospectos_cerrados.html", {
         "request": request,
@@ -2563,9 +2589,9 @@ async def reactivar_prospecto(
         
         return RedirectResponse(url="/prospectos/cerrados?success=Prospecto reactivado correctamente", status_code=303)
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error reactivando prospecto: {e}")
+        log.exception("Error reactivando prospecto")
         return RedirectResponse(url="/prospectos/cerrados?error=Error al reactivar prospecto", status_code=303)
 
 
@@ -2590,7 +2616,7 @@ async def check_auth(request: Request, db: Session = Depends(database.get_db)):
 @app.get("/prospectos/exportar/excel")
 async def exportar_prospectos_excel(
     request: Request,
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_read_db),
     user: models.Usuario = Depends(get_current_user)
 ):
     try:
@@ -2642,7 +2668,7 @@ async def historial_cliente(
     busqueda: str = Query(None),
     telefono: str = Query(None),
     fecha_busqueda: str = Query(None),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_read_db)
 ):
     user = await get_current_user(request, db)
     if not user:
@@ -2694,7 +2720,7 @@ async def historial_cliente(
         
         if prospectos:
             cliente_principal = prospectos[0]
-            print(f"🔍 Encontrados {len(prospectos)} registros en historial")
+            log.debug("Registros encontrados en historial", extra={"cantidad": len(prospectos)})
     
     return templates.TemplateResponse("historial_cliente.html", {
         "request": request,
@@ -2793,14 +2819,48 @@ async def actualizar_viaje(
             status_code=303
         )
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Error actualizando viaje: {e}")
+        log.exception("Error actualizando viaje")
         return RedirectResponse(
             url=f"/prospectos/{prospecto_id}/seguimiento?error=Error al actualizar información", 
             status_code=303
         )
 
+# ========== RENDIMIENTO (SOLO ADMIN) ==========
+
+@app.get("/admin/rendimiento", response_class=HTMLResponse)
+async def ver_rendimiento(
+    request: Request,
+    user: models.Usuario = Depends(require_admin)
+):
+    """Consultas SQL y tiempos por ruta (acumulado de este worker desde el arranque)"""
+    return templates.TemplateResponse("rendimiento.html", {
+        "request": request,
+        "current_user": user,
+        "rutas": obtener_estadisticas_rutas(),
+        "umbral_peticion_ms": PETICION_LENTA_MS,
+        "umbral_sentencia_ms": SENTENCIA_LENTA_MS,
+        "max_consultas": MAX_CONSULTAS,
+        "worker_pid": os.getpid()
+    })
+
+
+@app.post("/admin/rendimiento/reiniciar")
+async def reiniciar_rendimiento(user: models.Usuario = Depends(require_admin)):
+    reiniciar_estadisticas_rutas()
+    return RedirectResponse(url="/admin/rendimiento", status_code=303)
+
+
+# ✅ Métricas para Prometheus (ver services/metricas.py para el modo multiproceso)
+@app.get("/metrics")
+async def metricas(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    contenido, tipo_contenido = await asyncio.to_thread(generar_metricas)
+    return Response(content=contenido, headers={"Content-Type": tipo_contenido})
+
+
 # Endpoint de salud
 @app.get("/health")
 async def health_check(db: Session = Depends(database.get_db)):
@@ -2953,11 +3013,9 @@ async def prospectos_filtro_dashboard(
     total_paginas = (total_prospectos + registros_por_pagina - 1) // registros_por_pagina
     
     # Obtener datos para filtros
-    agentes = db.query(models.Usuario).filter(
-        models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value
-    ).all()
+    agentes = obtener_agentes(db, solo_activos=False)
     
-    medios_ingreso = db.query(models.MedioIngreso).all()
+    medios_ingreso = obtener_medios_ingreso(db)
     
     return templates.TemplateResponse("prospectos_filtro.html", {
         "request": request,
@@ -2984,35 +3042,21 @@ async def prospectos_filtro_dashboard(
 # ✅ ENDPOINT PARA AUTOCOMPLETADO DE DESTINOS
 @app.get("/api/destinos/sugerencias")
 async def sugerencias_destinos(
+    request: Request,
     q: str = Query("", min_length=2),
-    limit: int = Query(10),
+    limit: int = Query(10, ge=1, le=50),
     db: Session = Depends(database.get_db)
 ):
-    """Devuelve sugerencias de destinos existentes"""
+    """Devuelve sugerencias de destinos del catálogo, los más usados primero"""
     if len(q) < 2:
         return JSONResponse(content={"sugerencias": []})
     
     try:
-        # Buscar destinos que contengan el texto (case-insensitive)
-        destinos = db.query(models.Prospecto.destino).filter(
-            models.Prospecto.destino.isnot(None),
-            models.Prospecto.destino != '',
-            models.Prospecto.destino.ilike(f"%{q}%")
-        ).distinct().limit(limit).all()
-        
-        # Extraer solo los strings
-        sugerencias = [destino[0] for destino in destinos if destino[0]]
-        
-        # Ordenar por relevancia (los que empiezan con la búsqueda primero)
-        sugerencias.sort(key=lambda x: 
-            0 if x.lower().startswith(q.lower()) else 
-            1 if q.lower() in x.lower() else 2
-        )
-        
-        return JSONResponse(content={"sugerencias": sugerencias[:limit]})
+        destinos = buscar_destinos_autocompletado(q, limite=limit, db=db)
+        return respuesta_autocompletado_destinos(request, {"sugerencias": [d.nombre for d in destinos]}, db)
         
-    except Exception as e:
-        print(f"Error en sugerencias_destinos: {e}")
+    except Exception:
+        log.exception("Error en sugerencias_destinos")
         return JSONResponse(content={"sugerencias": []})
 
 # ✅ ENDPOINT PARA NORMALIZAR DESTINOS EXISTENTES
@@ -3021,38 +3065,29 @@ async def normalizar_destinos(
     destino_original: str = Form(...),
     destino_normalizado: str = Form(...),
     aplicar_a_todos: bool = Form(False),
+    simular: bool = Form(False),
     db: Session = Depends(database.get_db),
     user: models.Usuario = Depends(get_current_user)
 ):
-    """Normaliza un destino existente"""
+    """Normaliza un destino existente (texto y destino_id). Con simular=true solo cuenta."""
     if not user or user.tipo_usuario not in [TipoUsuario.ADMINISTRADOR.value, TipoUsuario.SUPERVISOR.value]:
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
     try:
-        if aplicar_a_todos:
-            # Actualizar todos los prospectos con este destino
-            prospectos = db.query(models.Prospecto).filter(
-                models.Prospecto.destino.ilike(f"%{destino_original}%")
-            ).all()
-            
-            for prospecto in prospectos:
-                prospecto.destino = destino_normalizado
-            
-            count = len(prospectos)
-            mensaje = f"Se normalizaron {count} prospectos"
-        else:
-            # Actualizar solo los exactos
-            prospectos = db.query(models.Prospecto).filter(
-                models.Prospecto.destino == destino_original
-            ).all()
-            
-            for prospecto in prospectos:
-                prospecto.destino = destino_normalizado
-            
-            count = len(prospectos)
-            mensaje = f"Se normalizaron {count} prospectos"
+        # ✅ UPDATE por lotes sobre el conjunto; aplicar_a_todos = coincidencia parcial
+        resultado = normalizar_destinos_prospectos(
+            db,
+            destino_original,
+            destino_normalizado,
+            coincidencia_parcial=aplicar_a_todos,
+            simular=simular
+        )
+        count = resultado["count"]
         
-        db.commit()
+        if simular:
+            return {"success": True, "message": f"Se normalizarían {count} prospectos", "count": count, "simulacion": True}
+        
+        mensaje = f"Se normalizaron {count} prospectos"
         
         # Registrar acción en historial
         if count > 0:
@@ -3083,7 +3118,7 @@ async def estadisticas_cotizaciones(
     fecha_inicio: str = Query(None),
     fecha_fin: str = Query(None),
     agente_id: str = Query(None),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_read_db)
 ):
     user = await get_current_user(request, db)
     if not user:
@@ -3145,10 +3180,7 @@ async def estadisticas_cotizaciones(
         resumen_agentes = resumen_agentes.group_by(models.Usuario.id, models.Usuario.username).all()
         
         # Obtener lista de agentes para filtro (solo activos)
-        agentes = db.query(models.Usuario).filter(
-            models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value,
-            models.Usuario.activo == 1
-        ).all()
+        agentes = obtener_agentes(db)
         
         return templates.TemplateResponse("estadisticas_cotizaciones.html", {
             "request": request,
@@ -3164,66 +3196,20 @@ async def estadisticas_cotizaciones(
             "fecha_fin_formateada": fecha_fin_obj.strftime("%d/%m/%Y")
         })
     
-    except Exception as e:
-        print(f"❌ Error en estadísticas: {e}")
+    except Exception:
+        log.exception("Error en estadísticas")
         return RedirectResponse(url="/dashboard?error=Error al cargar estadísticas", status_code=303)
 
 
 # ========== SISTEMA DE NOTIFICACIONES ==========
 
-def check_inactivity(db: Session):
-    """Verifica prospectos nuevos sin gestión por más de 4 horas"""
-    limite = datetime.now() - timedelta(hours=4)
-    
-    # Prospectos nuevos creados antes del limite
-    prospectos_inactivos = db.query(models.Prospecto).filter(
-        models.Prospecto.estado == EstadoProspecto.NUEVO.value,
-        models.Prospecto.fecha_registro <= limite
-    ).all()
-    
-    count = 0
-    for p in prospectos_inactivos:
-        # Verificar si ya tiene alerta de inactividad reciente (últimas 24h)
-        existe_alerta = db.query(models.Notificacion).filter(
-            models.Notificacion.prospecto_id == p.id,
-            models.Notificacion.tipo == "inactividad",
-            models.Notificacion.fecha_creacion >= datetime.now() - timedelta(hours=24)
-        ).first()
-        
-        if not existe_alerta:
-            # Buscar supervisor/admin para notificar (o al agente si está asignado, aunque nuevos suelen estar sin asignar)
-            # Si tiene agente, notificamos al agente. Si no, a todos los admins/supervisores.
-            destinatarios = []
-            if p.agente_asignado_id:
-                destinatarios.append(p.agente_asignado_id)
-            else:
-                # Notificar a admins/supervisores
-                admins = db.query(models.Usuario).filter(
-                    models.Usuario.tipo_usuario.in_([TipoUsuario.ADMINISTRADOR.value, TipoUsuario.SUPERVISOR.value])
-                ).all()
-                destinatarios = [u.id for u in admins]
-            
-            for uid in destinatarios:
-                notificacion = models.Notificacion(
-                    usuario_id=uid,
-                    prospecto_id=p.id,
-                    tipo="inactividad",
-                    mensaje=f"⚠️ Prospecto inactivo > 4h: {p.nombre} {p.apellido or ''}",
-                    email_enviado=False
-                )
-                db.add(notificacion)
-                count += 1
-    
-    db.commit()
-    return count
-
 @app.get("/api/notificaciones/check-inactivity")
 async def api_check_inactivity(
     db: Session = Depends(database.get_db)
 ):
     """Endpoint para activar la verificación manual o por cron"""
     try:
-        count = check_inactivity(db)
+        count = generar_alertas_inactividad(db)
         return {"status": "ok", "alertas_generadas": count}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -3238,86 +3224,97 @@ async def ver_notificaciones(
     filtro_estado: str = Query(None),  # NUEVO
     fecha_inicio: str = Query(None),  # NUEVO
     fecha_fin: str = Query(None),  # NUEVO
+    incluir_archivo: bool = Query(False),
     db: Session = Depends(database.get_db)
 ):
     user = await get_current_user(request, db)
     if not user:
         return RedirectResponse(url="/", status_code=303)
     
-    # Trigger inactividad check al cargar (para asegurar alertas frescas)
-    check_inactivity(db)
-    
-    # Query base
-    query = db.query(models.Notificacion)
-    
-    # Filtro por agente
-    if user.tipo_usuario == TipoUsuario.AGENTE.value:
-        query = query.filter(models.Notificacion.usuario_id == user.id)
-    elif filtro_agente_id and filtro_agente_id != "todos":
-        query = query.filter(models.Notificacion.usuario_id == int(filtro_agente_id))
-    
-    # NUEVO: Filtro por tipo
-    if filtro_tipo and filtro_tipo != "todos":
-        query = query.filter(models.Notificacion.tipo == filtro_tipo)
-    
-    # NUEVO: Filtro por estado
-    if filtro_estado:
-        if filtro_estado == "pendientes":
-            query = query.filter(models.Notificacion.leida == False)
-        elif filtro_estado == "leidas":
-            # ✅ CORREGIDO: Incluir tanto leídas como vencidas (notificaciones pasadas)
-            query = query.filter(
-                or_(
-                    models.Notificacion.leida == True,
-                    and_(
-                        models.Notificacion.leida == False,
-                        models.Notificacion.fecha_programada.isnot(None),
-                        models.Notificacion.fecha_programada < datetime.now()
+    def aplicar_filtros(M):
+        """Aplica los filtros de la vista a Notificacion o NotificacionArchivada"""
+        query = db.query(M)
+        
+        # Filtro por agente
+        if user.tipo_usuario == TipoUsuario.AGENTE.value:
+            query = query.filter(M.usuario_id == user.id)
+        elif filtro_agente_id and filtro_agente_id != "todos":
+            query = query.filter(M.usuario_id == int(filtro_agente_id))
+        
+        # NUEVO: Filtro por tipo
+        if filtro_tipo and filtro_tipo != "todos":
+            query = query.filter(M.tipo == filtro_tipo)
+        
+        # NUEVO: Filtro por estado
+        if filtro_estado:
+            if filtro_estado == "pendientes":
+                query = query.filter(M.leida == False)
+            elif filtro_estado == "leidas":
+                # ✅ CORREGIDO: Incluir tanto leídas como vencidas (notificaciones pasadas)
+                query = query.filter(
+                    or_(
+                        M.leida == True,
+                        and_(
+                            M.leida == False,
+                            M.fecha_programada.isnot(None),
+                            M.fecha_programada < datetime.now()
+                        )
                     )
                 )
-            )
-        elif filtro_estado == "vencidas":
-            query = query.filter(
-                models.Notificacion.leida == False,
-                models.Notificacion.fecha_programada.isnot(None),
-                models.Notificacion.fecha_programada < datetime.now()
-            )
-        elif filtro_estado == "proximas":
-            query = query.filter(
-                models.Notificacion.leida == False,
-                models.Notificacion.fecha_programada.isnot(None),
-                models.Notificacion.fecha_programada > datetime.now()
-            )
-    else:
-        # Por defecto, solo no leídas
-        query = query.filter(models.Notificacion.leida == False)
+            elif filtro_estado == "vencidas":
+                query = query.filter(
+                    M.leida == False,
+                    M.fecha_programada.isnot(None),
+                    M.fecha_programada < datetime.now()
+                )
+            elif filtro_estado == "proximas":
+                query = query.filter(
+                    M.leida == False,
+                    M.fecha_programada.isnot(None),
+                    M.fecha_programada > datetime.now()
+                )
+        else:
+            # Por defecto, solo no leídas
+            query = query.filter(M.leida == False)
+        
+        # NUEVO: Filtro por rango de fechas
+        if fecha_inicio:
+            try:
+                fecha_inicio_dt = datetime.strptime(fecha_inicio, "%d/%m/%Y")
+                query = query.filter(M.fecha_creacion >= fecha_inicio_dt)
+            except ValueError:
+                pass
+        
+        if fecha_fin:
+            try:
+                fecha_fin_dt = datetime.strptime(fecha_fin, "%d/%m/%Y")
+                fecha_fin_dt = fecha_fin_dt.replace(hour=23, minute=59, second=59)
+                query = query.filter(M.fecha_creacion <= fecha_fin_dt)
+            except ValueError:
+                pass
+        
+        return query
     
-    # NUEVO: Filtro por rango de fechas
-    if fecha_inicio:
-        try:
-            fecha_inicio_dt = datetime.strptime(fecha_inicio, "%d/%m/%Y")
-            query = query.filter(models.Notificacion.fecha_creacion >= fecha_inicio_dt)
-        except ValueError:
-            pass
+    query = aplicar_filtros(models.Notificacion)
+    
+    # ✅ El archivo solo se consulta si se pide explícitamente (historial de leídas)
+    consultar_archivo = incluir_archivo and filtro_estado == "leidas"
+    query_archivo = aplicar_filtros(models.NotificacionArchivada) if consultar_archivo else None
     
-    if fecha_fin:
-        try:
-            fecha_fin_dt = datetime.strptime(fecha_fin, "%d/%m/%Y")
-            fecha_fin_dt = fecha_fin_dt.replace(hour=23, minute=59, second=59)
-            query = query.filter(models.Notificacion.fecha_creacion <= fecha_fin_dt)
-        except ValueError:
-            pass
-        
     # Contar total antes de paginar
     total_notificaciones = query.count()
+    if query_archivo is not None:
+        total_notificaciones += query_archivo.count()
     
     # Calcular paginación
     total_pages = (total_notificaciones + limit - 1) // limit
     offset = (page - 1) * limit
     
     # Obtener notificaciones paginadas
-    notificaciones = query.order_by(models.Notificacion.fecha_creacion.desc()).offset(offset).limit(limit).all()
-    
+    if query_archivo is None:
+        notificaciones = query.order_by(models.Notificacion.fecha_creacion.desc()).offset(offset).limit(limit).all()
+    else:
+        notificaciones = paginar_notificaciones_con_archivo(db, query, query_archivo, offset, limit)
     # Calcular tiempos
     for n in notificaciones:
         if n.fecha_programada:
@@ -3345,23 +3342,20 @@ async def ver_notificaciones(
             
     agentes = []
     if user.tipo_usuario in [TipoUsuario.ADMINISTRADOR.value, TipoUsuario.SUPERVISOR.value]:
-        agentes = db.query(models.Usuario).filter(
-            models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value,
-            models.Usuario.activo == 1
-        ).all()
+        agentes = obtener_agentes(db)
+    
+    # ✅ Próximos recordatorios de viaje: se calculan desde fecha_ida, no existen como filas
+    recordatorios_viaje = []
+    if filtro_estado == "proximas" and (not filtro_tipo or filtro_tipo in ("todos", "seguimiento_viaje")):
+        usuario_recordatorios = None
+        if user.tipo_usuario == TipoUsuario.AGENTE.value:
+            usuario_recordatorios = user.id
+        elif filtro_agente_id and filtro_agente_id != "todos":
+            usuario_recordatorios = int(filtro_agente_id)
+        recordatorios_viaje = consultar_proximos_recordatorios_viaje(db, usuario_id=usuario_recordatorios)
+    
+    # ✅ El modal busca los prospectos bajo demanda en /api/prospectos/buscar
     
-    # NUEVO: Obtener prospectos activos para el modal
-    prospectos_activos = []
-    if user.tipo_usuario == TipoUsuario.AGENTE.value:
-        prospectos_activos = db.query(models.Prospecto).filter(
-            models.Prospecto.agente_asignado_id == user.id,
-            models.Prospecto.estado.in_(['nuevo', 'en_seguimiento', 'cotizado'])
-        ).order_by(models.Prospecto.nombre).limit(50).all()
-    else:
-        prospectos_activos = db.query(models.Prospecto).filter(
-            models.Prospecto.estado.in_(['nuevo', 'en_seguimiento', 'cotizado'])
-        ).order_by(models.Prospecto.nombre).limit(100).all()
-        
     return templates.TemplateResponse("notificaciones.html", {
         "request": request,
         "current_user": user,
@@ -3372,7 +3366,8 @@ async def ver_notificaciones(
         "filtro_estado": filtro_estado,
         "fecha_inicio": fecha_inicio,
         "fecha_fin": fecha_fin,
-        "prospectos_activos": prospectos_activos,
+        "recordatorios_viaje": recordatorios_viaje,
+        "incluir_archivo": consultar_archivo,
         "page": page,
         "limit": limit,
         "total_pages": total_pages,
@@ -3404,33 +3399,70 @@ async def obtener_notificaciones_pendientes(
     if not user:
         return JSONResponse(content={"notificaciones": []})
     
-    ahora = datetime.now()
+    # Notificaciones programadas que ya vencieron y no han sido leídas (nombre del prospecto por JOIN)
+    resultado = consultar_recordatorios_vencidos(db, usuario_id=user.id)
     
-    # Buscar notificaciones programadas que ya vencieron y no han sido leídas
-    notificaciones = db.query(models.Notificacion).filter(
-        models.Notificacion.usuario_id == user.id,
-        models.Notificacion.leida == False,
-        models.Notificacion.fecha_programada.isnot(None),
-        models.Notificacion.fecha_programada <= ahora
-    ).order_by(models.Notificacion.fecha_programada.asc()).all()
+    return JSONResponse(content={"notificaciones": resultado})
+
+
+
+@app.get("/api/notificaciones/contador")
+async def contador_notificaciones(request: Request, db: Session = Depends(database.get_db)):
+    """Contador de notificaciones del usuario (desde caché) para el badge"""
+    user = await get_current_user(request, db)
+    if not user:
+        return JSONResponse(status_code=401, content={"error": "No autenticado"})
     
-    # Convertir a JSON
-    resultado = []
-    for n in notificaciones:
-        prospecto_nombre = "N/A"
-        if n.prospecto:
-            prospecto_nombre = f"{n.prospecto.nombre} {n.prospecto.apellido or ''}".strip()
-        
-        resultado.append({
-            "id": n.id,
-            "mensaje": n.mensaje,
-            "tipo": n.tipo,
-            "prospecto_id": n.prospecto_id,
-            "fecha_programada": n.fecha_programada.strftime("%d/%m/%Y %H:%M"),
-            "prospecto_nombre": prospecto_nombre
-        })
+    return JSONResponse(content=obtener_contador(user.id))
+
+
+@app.get("/api/notificaciones/stream")
+async def stream_notificaciones(request: Request):
+    """
+    Canal Server-Sent Events: envía los recordatorios vencidos al conectar y
+    luego cada recordatorio en el momento en que vence.
+    """
+    # Sesión propia y cerrada antes de empezar a transmitir: la conexión SSE
+    # dura lo que la pestaña y no debe retener una conexión a la base de datos
+    db = database.SessionLocal()
+    try:
+        user = await get_current_user(request, db)
+        if not user:
+            return JSONResponse(status_code=401, content={"error": "No autenticado"})
+        usuario_id = user.id
+        
+        # Suscribirse antes de leer el estado inicial para no perder eventos
+        cola = canal_notificaciones.suscribir(usuario_id)
+        try:
+            pendientes = consultar_recordatorios_vencidos(db, usuario_id=usuario_id)
+        except Exception:
+            canal_notificaciones.desuscribir(usuario_id, cola)
+            raise
+    finally:
+        db.close()
     
-    return JSONResponse(content={"notificaciones": resultado})
+    async def eventos():
+        try:
+            for recordatorio in pendientes:
+                yield formatear_evento_sse(recordatorio)
+            
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=25)
+                    yield formatear_evento_sse(evento)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comentario SSE para mantener viva la conexión en proxies
+                    yield ": ping\n\n"
+        finally:
+            canal_notificaciones.desuscribir(usuario_id, cola)
+    
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # ========== ENDPOINTS PARA NOTIFICACIONES MANUALES ==========
@@ -3441,7 +3473,7 @@ async def buscar_prospecto_por_id(
     db: Session = Depends(database.get_db),
     request: Request = None
 ):
-    """Busca un prospecto por ID de Cliente o ID de Cotización"""
+    """Busca un prospecto por ID de Cliente, Solicitud, Cotización o Documento"""
     user = await get_current_user(request, db)
     if not user:
         return JSONResponse(content={"success": False, "error": "No autenticado"})
@@ -3449,21 +3481,10 @@ async def buscar_prospecto_por_id(
     try:
         prospecto = None
         
-        # Buscar por ID de Cliente (formato: CL-YYYYMMDD-XXXX)
-        if id.startswith('CL-'):
-            prospecto = db.query(models.Prospecto).filter(
-                models.Prospecto.id_cliente == id
-            ).first()
-        
-        # Buscar por ID de Cotización (formato: COT-YYYYMMDD-XXXX)
-        elif id.startswith('COT-'):
-            # Buscar en EstadisticaCotizacion
-            cotizacion = db.query(models.EstadisticaCotizacion).filter(
-                models.EstadisticaCotizacion.id_cotizacion == id
-            ).first()
-            
-            if cotizacion:
-                prospecto = cotizacion.prospecto
+        # Buscar por ID con prefijo (CL-, SOL-, COT-, DOC-) con igualdad sobre el índice
+        if detectar_tipo_id(id):
+            encontrados = buscar_prospectos_por_id(db, id, exacto=True, limite=1)
+            prospecto = encontrados[0] if encontrados else None
         
         # Si no tiene prefijo, intentar buscar como número de ID directo
         else:
@@ -3500,8 +3521,8 @@ async def buscar_prospecto_por_id(
                 "error": "Prospecto no encontrado"
             })
     
-    except Exception as e:
-        print(f"Error buscando prospecto: {e}")
+    except Exception:
+        log.exception("Error buscando prospecto")
         return JSONResponse(content={
             "success": False,
             "error": "Error en la búsqueda"
@@ -3578,308 +3599,23 @@ async def crear_notificacion_manual(
             url="/notificaciones?error=Formato de fecha inválido", 
             status_code=303
         )
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error creando notificación: {e}")
+        log.exception("Error creando notificación")
         return RedirectResponse(
             url="/notificaciones?error=Error al crear recordatorio", 
             status_code=303
         )
 
 
-# ========== EXPORTACIÓN DE DATOS A EXCEL ==========
-
-def generar_excel_prospectos(prospectos, filename="prospectos_export.xlsx"):
-    """
-    Genera archivo Excel con lista de prospectos
-    """
-    try:
-        # Preparar datos para DataFrame
-        data = []
-        for p in prospectos:
-            # Obtener última interacción
-            ultima_interaccion = ""
-            if p.interacciones:
-                ultima_int = p.interacciones[0]  # Ya está ordenado por fecha desc
-                ultima_interaccion = ultima_int.fecha_creacion.strftime("%d/%m/%Y %H:%M")
-            
-            data.append({
-                'ID Cliente': p.id_cliente or f"CL-{p.id:04d}",
-                'Nombre': p.nombre,
-                'Apellido': p.apellido,
-                'Teléfono': p.telefono or "",
-                'Teléfono Secundario': p.telefono_secundario or "",
-                'Email': p.correo_electronico or "",
-                'Ciudad Origen': p.ciudad_origen or "",
-                'Destino': p.destino or "",
-                'Fecha Ida': p.fecha_ida.strftime("%d/%m/%Y") if p.fecha_ida else "",
-                'Fecha Vuelta': p.fecha_vuelta.strftime("%d/%m/%Y") if p.fecha_vuelta else "",
-                'Adultos': p.pasajeros_adultos or 0,
-                'Niños': p.pasajeros_ninos or 0,
-                'Infantes': p.pasajeros_infantes or 0,
-                'Medio Ingreso': p.medio_ingreso.nombre if p.medio_ingreso else "",
-                'Agente Asignado': p.agente_asignado.username if p.agente_asignado else "Sin asignar",
-                'Estado': p.estado.replace("_", " ").title(),
-                'Fecha Registro': p.fecha_registro.strftime("%d/%m/%Y %H:%M"),
-                'Última Interacción': ultima_interaccion,
-                'Cliente Recurrente': "Sí" if p.cliente_recurrente else "No",
-                'Datos Completos': "Sí" if p.tiene_datos_completos else "No",
-                'Observaciones': p.observaciones or ""
-            })
-        
-        # Crear DataFrame
-        df = pd.DataFrame(data)
-        
-        # Crear archivo Excel en memoria
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Prospectos', index=False)
-            
-            # Obtener workbook y worksheet para formato
-            workbook = writer.book
-            worksheet = writer.sheets['Prospectos']
-            
-            # Formato de encabezados
-            from openpyxl.styles import Font, PatternFill, Alignment
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_font = Font(color="FFFFFF", bold=True)
-            
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Auto-ajustar columnas
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-            
-            # Agregar filtros automáticos
-            worksheet.auto_filter.ref = worksheet.dimensions
-        
-        output.seek(0)
-        return output
-        
-    except Exception as e:
-        print(f"❌ Error generando Excel de prospectos: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
-
-
-def generar_excel_estadisticas(stats, periodo, fecha_inicio, fecha_fin, filename="dashboard_export.xlsx"):
-    """
-    Genera archivo Excel con estadísticas del dashboard
-    Múltiples hojas: Resumen, Por Estado, Por Agente, Destinos
-    """
-    try:
-        output = io.BytesIO()
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Hoja 1: Resumen General
-            resumen_data = {
-                'Métrica': [
-                    'Periodo',
-                    'Fecha Inicio',
-                    'Fecha Fin',
-                    '',
-                    'Total Prospectos',
-                    'Prospectos con Datos Completos',
-                    'Prospectos sin Datos',
-                    'Clientes Sin Asignar',
-                    'Clientes Asignados',
-                    'Destinos Únicos',
-                    'Ventas Cerradas',
-                    '',
-                    'Prospectos Nuevos',
-                    'En Seguimiento',
-                    'Cotizados',
-                    'Ganados',
-                    'Perdidos',
-                    'Ventas Canceladas'
-                ],
-                'Valor': [
-                    periodo.title(),
-                    fecha_inicio.strftime("%d/%m/%Y"),
-                    fecha_fin.strftime("%d/%m/%Y"),
-                    '',
-                    stats.get('total_prospectos', 0),
-                    stats.get('prospectos_con_datos', 0),
-                    stats.get('prospectos_sin_datos', 0),
-                    stats.get('clientes_sin_asignar', 0),
-                    stats.get('clientes_asignados', 0),
-                    stats.get('destinos_count', 0),
-                    stats.get('ventas_count', 0),
-                    '',
-                    stats.get('prospectos_nuevos', 0),
-                    stats.get('prospectos_seguimiento', 0),
-                    stats.get('prospectos_cotizados', 0),
-                    stats.get('prospectos_ganados', 0),
-                    stats.get('prospectos_perdidos', 0),
-                    stats.get('ventas_canceladas', 0)
-                ]
-            }
-            df_resumen = pd.DataFrame(resumen_data)
-            df_resumen.to_excel(writer, sheet_name='Resumen General', index=False)
-            
-            # Hoja 2: Por Estado
-            estados_data = {
-                'Estado': ['Nuevo', 'En Seguimiento', 'Cotizado', 'Ganado', 'Perdido', 'Venta Cancelada'],
-                'Cantidad': [
-                    stats.get('prospectos_nuevos', 0),
-                    stats.get('prospectos_seguimiento', 0),
-                    stats.get('prospectos_cotizados', 0),
-                    stats.get('prospectos_ganados', 0),
-                    stats.get('prospectos_perdidos', 0),
-                    stats.get('ventas_canceladas', 0)
-                ]
-            }
-            df_estados = pd.DataFrame(estados_data)
-            df_estados.to_excel(writer, sheet_name='Por Estado', index=False)
-            
-            # Hoja 3: Por Agente
-            if stats.get('conversion_agentes'):
-                agentes_data = []
-                for agente in stats['conversion_agentes']:
-                    agentes_data.append({
-                        'Agente': agente['username'],
-                        'Total Prospectos': agente['total_prospectos'],
-                        'Cotizados': agente['cotizados'],
-                        'Ganados': agente['ganados'],
-                        'Tasa Conversión': f"{(agente['ganados'] / agente['total_prospectos'] * 100) if agente['total_prospectos'] > 0 else 0:.1f}%"
-                    })
-                df_agentes = pd.DataFrame(agentes_data)
-                df_agentes.to_excel(writer, sheet_name='Por Agente', index=False)
-            
-            # Hoja 4: Destinos Populares
-            if stats.get('destinos_populares'):
-                destinos_data = []
-                for destino, count in stats['destinos_populares']:
-                    destinos_data.append({
-                        'Destino': destino,
-                        'Cantidad': count
-                    })
-                df_destinos = pd.DataFrame(destinos_data)
-                df_destinos.to_excel(writer, sheet_name='Destinos Populares', index=False)
-            
-            # Aplicar formato a todas las hojas
-            from openpyxl.styles import Font, PatternFill, Alignment
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_font = Font(color="FFFFFF", bold=True)
-            
-            for sheet_name in writer.sheets:
-                worksheet = writer.sheets[sheet_name]
-                
-                # Formato de encabezados
-                for cell in worksheet[1]:
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
-                
-                # Auto-ajustar columnas
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 40)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        output.seek(0)
-        return output
-        
-    except Exception as e:
-        print(f"❌ Error generando Excel de estadísticas: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
-
-
-def generar_excel_interacciones(interacciones, prospecto, filename="interacciones_export.xlsx"):
-    """
-    Genera archivo Excel con historial de interacciones
-    """
-    try:
-        data = []
-        for interaccion in interacciones:
-            data.append({
-                'Fecha': interaccion.fecha_creacion.strftime("%d/%m/%Y %H:%M"),
-                'Usuario': interaccion.usuario.username if interaccion.usuario else "Sistema",
-                'Tipo': interaccion.tipo_interaccion.replace("_", " ").title() if interaccion.tipo_interaccion else "General",
-                'Descripción': interaccion.descripcion,
-                'Estado Anterior': interaccion.estado_anterior.replace("_", " ").title() if interaccion.estado_anterior else "",
-                'Estado Nuevo': interaccion.estado_nuevo.replace("_", " ").title() if interaccion.estado_nuevo else ""
-            })
-        
-        df = pd.DataFrame(data)
-        
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Información del prospecto
-            info_data = {
-                'Campo': ['ID Cliente', 'Nombre', 'Teléfono', 'Email', 'Estado Actual'],
-                'Valor': [
-                    prospecto.id_cliente or f"CL-{prospecto.id:04d}",
-                    f"{prospecto.nombre} {prospecto.apellido}",
-                    prospecto.telefono or "",
-                    prospecto.correo_electronico or "",
-                    prospecto.estado.replace("_", " ").title()
-                ]
-            }
-            df_info = pd.DataFrame(info_data)
-            df_info.to_excel(writer, sheet_name='Información', index=False)
-            
-            # Historial de interacciones
-            df.to_excel(writer, sheet_name='Historial', index=False)
-            
-            # Aplicar formato
-            from openpyxl.styles import Font, PatternFill, Alignment
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_font = Font(color="FFFFFF", bold=True)
-            
-            for sheet_name in writer.sheets:
-                worksheet = writer.sheets[sheet_name]
-                
-                for cell in worksheet[1]:
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
-                
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 60)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        output.seek(0)
-        return output
-        
-    except Exception as e:
-        print(f"❌ Error generando Excel de interacciones: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+# ========== ENDPOINTS DE EXPORTACIÓN ==========
 
+def redireccion_exportacion(trabajo: models.TrabajoExportacion):
+    """Descarga directa si la exportación salió de caché; si no, redirige a Mis descargas"""
+    if trabajo.estado == "completado":
+        return RedirectResponse(url=f"/descargas/{trabajo.id}", status_code=303)
+    return RedirectResponse(url="/descargas?success=encolado", status_code=303)
 
-# ========== ENDPOINTS DE EXPORTACIÓN ==========
 
 @app.get("/exportar/prospectos")
 async def exportar_prospectos(
@@ -3901,92 +3637,23 @@ async def exportar_prospectos(
         return RedirectResponse(url="/", status_code=303)
     
     try:
-        # Construir query base
-        query = db.query(models.Prospecto).filter(
-            models.Prospecto.fecha_eliminacion.is_(None)
-        )
-        
-        # Filtrar por agente si no es admin
-        if user.tipo_usuario not in [TipoUsuario.ADMINISTRADOR.value, TipoUsuario.SUPERVISOR.value]:
-            query = query.filter(models.Prospecto.agente_asignado_id == user.id)
-        
-        # Aplicar filtros
-        if destino:
-            query = query.filter(models.Prospecto.destino.ilike(f"%{destino}%"))
-        
-        if telefono:
-            telefono_normalizado = normalizar_numero(telefono)
-            query = query.filter(
-                or_(
-                    func.replace(func.replace(models.Prospecto.telefono, ' ', ''), '-', '').ilike(f"%{telefono_normalizado}%"),
-                    func.replace(func.replace(models.Prospecto.telefono_secundario, ' ', ''), '-', '').ilike(f"%{telefono_normalizado}%")
-                )
-            )
-        
-        if medio_ingreso_id and medio_ingreso_id != "todos":
-            query = query.filter(models.Prospecto.medio_ingreso_id == int(medio_ingreso_id))
-        
-        if agente_asignado_id and agente_asignado_id != "todos":
-            if agente_asignado_id == "sin_asignar":
-                query = query.filter(models.Prospecto.agente_asignado_id.is_(None))
-            else:
-                query = query.filter(models.Prospecto.agente_asignado_id == int(agente_asignado_id))
-        
-        if estado and estado != "todos":
-            query = query.filter(models.Prospecto.estado == estado)
-        
-        if busqueda_global:
-            busqueda = f"%{busqueda_global}%"
-            query = query.filter(
-                or_(
-                    models.Prospecto.nombre.ilike(busqueda),
-                    models.Prospecto.apellido.ilike(busqueda),
-                    models.Prospecto.telefono.ilike(busqueda),
-                    models.Prospecto.correo_electronico.ilike(busqueda),
-                    models.Prospecto.id_cliente.ilike(busqueda)
-                )
-            )
-        
-        # Filtros de fecha
-        if fecha_inicio:
-            try:
-                fecha_inicio_obj = datetime.strptime(fecha_inicio, "%d/%m/%Y").date()
-                fecha_inicio_dt = datetime.combine(fecha_inicio_obj, datetime.min.time())
-                query = query.filter(models.Prospecto.fecha_registro >= fecha_inicio_dt)
-            except ValueError:
-                pass
-        
-        if fecha_fin:
-            try:
-                fecha_fin_obj = datetime.strptime(fecha_fin, "%d/%m/%Y").date()
-                fecha_fin_dt = datetime.combine(fecha_fin_obj, datetime.max.time())
-                query = query.filter(models.Prospecto.fecha_registro <= fecha_fin_dt)
-            except ValueError:
-                pass
-        
-        # Ordenar y obtener resultados
-        prospectos = query.order_by(models.Prospecto.fecha_registro.desc()).limit(10000).all()
-        
-        # Generar Excel
-        excel_file = generar_excel_prospectos(prospectos)
-        
-        if not excel_file:
-            raise HTTPException(status_code=500, detail="Error generando archivo Excel")
+        filtros = {
+            'destino': destino,
+            'telefono': telefono,
+            'medio_ingreso_id': medio_ingreso_id,
+            'agente_asignado_id': agente_asignado_id,
+            'estado': estado,
+            'busqueda_global': busqueda_global,
+            'fecha_inicio': fecha_inicio,
+            'fecha_fin': fecha_fin
+        }
         
-        # Nombre del archivo con timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"prospectos_{timestamp}.xlsx"
+        # ✅ La exportación se genera en segundo plano; el archivo queda en "Mis descargas"
+        trabajo = encolar_trabajo_exportacion(db, user, 'prospectos', filtros)
+        return redireccion_exportacion(trabajo)
         
-        return StreamingResponse(
-            excel_file,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
-    except Exception as e:
-        print(f"❌ Error exportando prospectos: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error exportando prospectos")
         raise HTTPException(status_code=500, detail="Error al exportar datos")
 
 
@@ -4001,169 +3668,18 @@ async def exportar_dashboard(
 ):
     """Exporta estadísticas del dashboard a Excel (solo admins)"""
     try:
-        # Calcular rango de fechas
-        fecha_inicio_obj, fecha_fin_obj = calcular_rango_fechas(periodo, fecha_inicio, fecha_fin)
-        
-        # Convertir a datetime
-        fecha_inicio_dt = datetime.combine(fecha_inicio_obj, datetime.min.time())
-        fecha_fin_dt = datetime.combine(fecha_fin_obj, datetime.max.time())
-        
-        # Recopilar estadísticas (similar al dashboard)
-        stats = {}
-        
-        # Total de prospectos
-        stats['total_prospectos'] = db.query(models.Prospecto).filter(
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        # Prospectos con/sin datos
-        stats['prospectos_con_datos'] = db.query(models.Prospecto).filter(
-            models.Prospecto.tiene_datos_completos == True,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        stats['prospectos_sin_datos'] = db.query(models.Prospecto).filter(
-            models.Prospecto.tiene_datos_completos == False,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        # Clientes sin asignar
-        stats['clientes_sin_asignar'] = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.NUEVO.value,
-            models.Prospecto.agente_asignado_id == None,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        # Clientes asignados
-        stats['clientes_asignados'] = db.query(models.Prospecto).filter(
-            models.Prospecto.agente_asignado_id != None,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        # Destinos
-        destinos_query = db.query(models.Prospecto.destino).filter(
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt,
-            models.Prospecto.destino.isnot(None),
-            models.Prospecto.destino != ''
-        ).distinct().all()
-        stats['destinos_count'] = len(destinos_query)
-        
-        # Ventas
-        stats['ventas_count'] = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.GANADO.value,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        # Por estado
-        stats['prospectos_nuevos'] = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.NUEVO.value,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        stats['prospectos_seguimiento'] = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.EN_SEGUIMIENTO.value,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        stats['prospectos_cotizados'] = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.COTIZADO.value,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        stats['prospectos_ganados'] = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.GANADO.value,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        stats['prospectos_perdidos'] = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.CERRADO_PERDIDO.value,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        stats['ventas_canceladas'] = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.VENTA_CANCELADA.value,
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt
-        ).count()
-        
-        # Destinos populares
-        stats['destinos_populares'] = db.query(
-            models.Prospecto.destino,
-            func.count(models.Prospecto.id).label('count')
-        ).filter(
-            models.Prospecto.fecha_registro >= fecha_inicio_dt,
-            models.Prospecto.fecha_registro <= fecha_fin_dt,
-            models.Prospecto.destino.isnot(None),
-            models.Prospecto.destino != ''
-        ).group_by(models.Prospecto.destino).order_by(func.count(models.Prospecto.id).desc()).limit(10).all()
-        
-        # Conversión por agente
-        conversion_agentes = []
-        agentes = db.query(models.Usuario).filter(
-            models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value,
-            models.Usuario.activo == 1
-        ).all()
-        
-        for agente in agentes:
-            total_agente = db.query(models.Prospecto).filter(
-                models.Prospecto.agente_asignado_id == agente.id,
-                models.Prospecto.fecha_registro >= fecha_inicio_dt,
-                models.Prospecto.fecha_registro <= fecha_fin_dt
-            ).count()
-            
-            ganados_agente = db.query(models.HistorialEstado).filter(
-                models.HistorialEstado.usuario_id == agente.id,
-                models.HistorialEstado.estado_nuevo == EstadoProspecto.GANADO.value,
-                models.HistorialEstado.fecha_cambio >= fecha_inicio_dt,
-                models.HistorialEstado.fecha_cambio <= fecha_fin_dt
-            ).count()
-            
-            cotizados_agente = db.query(models.EstadisticaCotizacion).filter(
-                models.EstadisticaCotizacion.agente_id == agente.id,
-                models.EstadisticaCotizacion.fecha_cotizacion >= fecha_inicio_obj,
-                models.EstadisticaCotizacion.fecha_cotizacion <= fecha_fin_obj
-            ).count()
-            
-            conversion_agentes.append({
-                'username': agente.username,
-                'total_prospectos': total_agente,
-                'cotizados': cotizados_agente,
-                'ganados': ganados_agente
-            })
-        
-        stats['conversion_agentes'] = conversion_agentes
-        
-        # Generar Excel
-        excel_file = generar_excel_estadisticas(stats, periodo, fecha_inicio_obj, fecha_fin_obj)
-        
-        if not excel_file:
-            raise HTTPException(status_code=500, detail="Error generando archivo Excel")
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"dashboard_{timestamp}.xlsx"
+        parametros = {
+            'periodo': periodo,
+            'fecha_inicio': fecha_inicio,
+            'fecha_fin': fecha_fin
+        }
         
-        return StreamingResponse(
-            excel_file,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        # ✅ La exportación se genera en segundo plano; el archivo queda en "Mis descargas"
+        trabajo = encolar_trabajo_exportacion(db, user, 'dashboard', parametros)
+        return redireccion_exportacion(trabajo)
         
-    except Exception as e:
-        print(f"❌ Error exportando dashboard: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error exportando dashboard")
         raise HTTPException(status_code=500, detail="Error al exportar estadísticas")
 
 
@@ -4171,7 +3687,7 @@ async def exportar_dashboard(
 async def exportar_interacciones(
     prospecto_id: int,
     request: Request,
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_read_db)
 ):
     """Exporta historial de interacciones de un prospecto"""
     user = await get_current_user(request, db)
@@ -4214,10 +3730,8 @@ async def exportar_interacciones(
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"❌ Error exportando interacciones: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error exportando interacciones")
         raise HTTPException(status_code=500, detail="Error al exportar interacciones")
 
 
@@ -4231,120 +3745,24 @@ async def exportar_clientes_ganados(
 ):
     """Exporta clientes ganados con datos completos (solo admins)"""
     try:
-        # Query base
-        query = db.query(models.Prospecto).filter(
-            models.Prospecto.estado == EstadoProspecto.GANADO.value,
-            models.Prospecto.fecha_eliminacion.is_(None)
-        )
-        
-        # Filtros de fecha
-        if fecha_inicio:
-            try:
-                fecha_inicio_obj = datetime.strptime(fecha_inicio, "%d/%m/%Y").date()
-                fecha_inicio_dt = datetime.combine(fecha_inicio_obj, datetime.min.time())
-                query = query.filter(models.Prospecto.fecha_compra >= fecha_inicio_dt)
-            except ValueError:
-                pass
-        
-        if fecha_fin:
-            try:
-                fecha_fin_obj = datetime.strptime(fecha_fin, "%d/%m/%Y").date()
-                fecha_fin_dt = datetime.combine(fecha_fin_obj, datetime.max.time())
-                query = query.filter(models.Prospecto.fecha_compra <= fecha_fin_dt)
-            except ValueError:
-                pass
-        
-        # Obtener clientes ganados
-        clientes = query.order_by(models.Prospecto.fecha_compra.desc()).all()
-        
-        # Generar Excel
-        excel_file = generar_excel_prospectos(clientes)
-        
-        if not excel_file:
-            raise HTTPException(status_code=500, detail="Error generando archivo Excel")
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"clientes_ganados_{timestamp}.xlsx"
+        parametros = {
+            'fecha_inicio': fecha_inicio,
+            'fecha_fin': fecha_fin
+        }
         
-        return StreamingResponse(
-            excel_file,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        # ✅ La exportación se genera en segundo plano; el archivo queda en "Mis descargas"
+        trabajo = encolar_trabajo_exportacion(db, user, 'clientes_ganados', parametros)
+        return redireccion_exportacion(trabajo)
         
-    except Exception as e:
-        print(f"❌ Error exportando clientes ganados: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error exportando clientes ganados")
         raise HTTPException(status_code=500, detail="Error al exportar clientes ganados")
 
 
-def generar_excel_usuarios(usuarios, filename="usuarios_export.xlsx"):
-    """
-    Genera archivo Excel con lista de usuarios del sistema
-    """
-    try:
-        data = []
-        for u in usuarios:
-            # Contar prospectos asignados
-            prospectos_count = len([p for p in u.prospectos if p.fecha_eliminacion is None]) if hasattr(u, 'prospectos') else 0
-            
-            data.append({
-                'ID': u.id,
-                'Username': u.username,
-                'Email': u.email,
-                'Tipo Usuario': u.tipo_usuario.title(),
-                'Estado': 'Activo' if u.activo else 'Inactivo',
-                'Fecha Creación': u.fecha_creacion.strftime("%d/%m/%Y %H:%M"),
-                'Prospectos Asignados': prospectos_count
-            })
-        
-        df = pd.DataFrame(data)
-        
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Usuarios', index=False)
-            
-            workbook = writer.book
-            worksheet = writer.sheets['Usuarios']
-            
-            from openpyxl.styles import Font, PatternFill, Alignment
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_font = Font(color="FFFFFF", bold=True)
-            
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 40)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-            
-            worksheet.auto_filter.ref = worksheet.dimensions
-        
-        output.seek(0)
-        return output
-        
-    except Exception as e:
-        print(f"❌ Error generando Excel de usuarios: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
-
-
 @app.get("/exportar/usuarios")
 async def exportar_usuarios(
     request: Request,
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_read_db),
     user: models.Usuario = Depends(require_admin)
 ):
     """Exporta lista de usuarios a Excel (solo admins)"""
@@ -4352,8 +3770,11 @@ async def exportar_usuarios(
         # Obtener todos los usuarios
         usuarios = db.query(models.Usuario).order_by(models.Usuario.fecha_creacion.desc()).all()
         
+        # Conteo de prospectos por agente en una sola consulta agrupada
+        conteos = consultar_conteos_prospectos_por_agente(db)
+        
         # Generar Excel
-        excel_file = generar_excel_usuarios(usuarios)
+        excel_file = generar_excel_usuarios(usuarios, conteos)
         
         if not excel_file:
             raise HTTPException(status_code=500, detail="Error generando archivo Excel")
@@ -4367,13 +3788,60 @@ async def exportar_usuarios(
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
         
-    except Exception as e:
-        print(f"❌ Error exportando usuarios: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error exportando usuarios")
         raise HTTPException(status_code=500, detail="Error al exportar usuarios")
 
 
+# ========== MIS DESCARGAS (EXPORTACIONES EN SEGUNDO PLANO) ==========
+
+@app.get("/descargas", response_class=HTMLResponse)
+async def mis_descargas(request: Request, db: Session = Depends(database.get_db)):
+    """Lista las exportaciones del usuario con su estado y fecha de expiración"""
+    user = await get_current_user(request, db)
+    
+    if not user:
+        return RedirectResponse(url="/", status_code=303)
+    
+    limpiar_exportaciones_expiradas(db)
+    trabajos = listar_trabajos_usuario(db, user.id)
+    hay_pendientes = any(t.estado in ["pendiente", "procesando"] for t in trabajos)
+    
+    return templates.TemplateResponse("mis_descargas.html", {
+        "request": request,
+        "current_user": user,
+        "trabajos": trabajos,
+        "tipos_exportacion": TIPOS_EXPORTACION,
+        "hay_pendientes": hay_pendientes
+    })
+
+
+@app.get("/descargas/{trabajo_id}")
+async def descargar_exportacion(trabajo_id: int, request: Request, db: Session = Depends(database.get_db)):
+    """Descarga el archivo de una exportación terminada"""
+    user = await get_current_user(request, db)
+    
+    if not user:
+        return RedirectResponse(url="/", status_code=303)
+    
+    trabajo = db.query(models.TrabajoExportacion).filter(
+        models.TrabajoExportacion.id == trabajo_id,
+        models.TrabajoExportacion.usuario_id == user.id
+    ).first()
+    
+    if not trabajo or trabajo.estado != "completado":
+        raise HTTPException(status_code=404, detail="Exportación no encontrada")
+    
+    if (trabajo.fecha_expiracion and trabajo.fecha_expiracion < datetime.now()) or not os.path.exists(trabajo.ruta_archivo):
+        return RedirectResponse(url="/descargas?error=expirado", status_code=303)
+    
+    return FileResponse(
+        trabajo.ruta_archivo,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=trabajo.nombre_archivo
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="debug")
\ No newline at end of file
@@ -1,11 +1,40 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date, Boolean, Sequence, Index, func, event, DDL
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.schema import PrimaryKeyConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 
 Base = declarative_base()
 
+# Versión de los datos que leen las exportaciones (se incrementa en database.py)
+version_datos_seq = Sequence("version_datos_seq", metadata=Base.metadata)
+
+# ========== PARTICIONADO MENSUAL (PostgreSQL) ==========
+# Las tablas de solo inserción que más crecen se particionan por mes (RANGE
+# sobre su fecha) para que las consultas acotadas por fecha lean solo los
+# meses necesarios. PostgreSQL exige que la clave primaria incluya la columna
+# de partición, así que allí la PK es (id, fecha); el ORM sigue usando id
+# como identidad. En otras bases de datos son tablas normales.
+# Las particiones de cada mes las crea services/particiones.py.
+def particion_mensual(columna: str) -> dict:
+    return {"postgresql_partition_by": f"RANGE ({columna})", "info": {"particion_mensual": columna}}
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _clave_primaria_particionada(constraint, compiler, **kw):
+    texto = compiler.visit_primary_key_constraint(constraint, **kw)
+    columna = constraint.table.info.get("particion_mensual")
+    if columna and texto.endswith(")"):
+        texto = f"{texto[:-1]}, {columna})"
+    return texto
+
+def _crear_particion_default(tabla):
+    # Recoge las filas de meses sin partición: las inserciones nunca fallan
+    event.listen(tabla, "after_create", DDL(
+        "CREATE TABLE IF NOT EXISTS %(table)s_default PARTITION OF %(table)s DEFAULT"
+    ).execute_if(dialect="postgresql"))
+
 class TipoUsuario(enum.Enum):
     ADMINISTRADOR = "administrador"
     SUPERVISOR = "supervisor"
@@ -53,6 +82,16 @@ class Destino(Base):
             return None
         return str(nombre).strip().upper()
 
+class DestinoAlias(Base):
+    """Escrituras de destino ya resueltas (sin tildes, mayúsculas) -> destino del catálogo"""
+    __tablename__ = "destino_alias"
+
+    id = Column(Integer, primary_key=True, index=True)
+    alias = Column(String(150), unique=True, nullable=False, index=True)
+    destino_id = Column(Integer, ForeignKey("destinos.id"), nullable=False, index=True)
+    origen = Column(String(20), nullable=False)  # exacto, similar, nuevo, fusion
+    fecha_creacion = Column(DateTime, default=datetime.now)
+
 class Cliente(Base):
     __tablename__ = "clientes"
     
@@ -116,6 +155,10 @@ class Usuario(Base):
 
 class Prospecto(Base):
     __tablename__ = "prospectos"
+    __table_args__ = (
+        # ✅ Recordatorios de viaje: clientes ganados por fecha de ida
+        Index("ix_prospectos_estado_fecha_ida", "estado", "fecha_ida"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -232,15 +275,27 @@ class Prospecto(Base):
             return f"https://wa.me/{telefono_completo}"
         return "#"
 
+
+# ✅ Índices para búsqueda por prefijo (autocompletado de prospectos).
+# text_pattern_ops permite usar el índice con LIKE 'texto%' en cualquier collation.
+Index("ix_prospectos_nombre_prefijo", func.lower(Prospecto.nombre).label("nombre_lower"),
+      postgresql_ops={"nombre_lower": "text_pattern_ops"})
+Index("ix_prospectos_apellido_prefijo", func.lower(Prospecto.apellido).label("apellido_lower"),
+      postgresql_ops={"apellido_lower": "text_pattern_ops"})
+Index("ix_prospectos_telefono_prefijo", Prospecto.telefono, postgresql_ops={"telefono": "text_pattern_ops"})
+Index("ix_prospectos_id_cliente_prefijo", Prospecto.id_cliente, postgresql_ops={"id_cliente": "text_pattern_ops"})
+Index("ix_prospectos_id_solicitud_prefijo", Prospecto.id_solicitud, postgresql_ops={"id_solicitud": "text_pattern_ops"})
+
 class Interaccion(Base):
     __tablename__ = "interacciones"
+    __table_args__ = particion_mensual("fecha_creacion")
     
     id = Column(Integer, primary_key=True, index=True)
     prospecto_id = Column(Integer, ForeignKey("prospectos.id"))
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
     tipo_interaccion = Column(String(20))
     descripcion = Column(Text, nullable=False)
-    fecha_creacion = Column(DateTime, default=datetime.now)
+    fecha_creacion = Column(DateTime, default=datetime.now, nullable=False)
     estado_anterior = Column(String(20))
     estado_nuevo = Column(String(20))
     
@@ -295,21 +350,31 @@ class EstadisticaCotizacion(Base):
             self.id_cotizacion = f"COT-{timestamp}-{self.id:04d}"
         return self.id_cotizacion
 
+# ✅ Índices por prefijo para /busqueda_ids (LIKE 'COT-2024%' / 'DOC-2024%')
+Index("ix_estadisticas_id_cotizacion_prefijo", EstadisticaCotizacion.id_cotizacion,
+      postgresql_ops={"id_cotizacion": "text_pattern_ops"})
+Index("ix_documentos_id_documento_prefijo", Documento.id_documento,
+      postgresql_ops={"id_documento": "text_pattern_ops"})
+
 class HistorialEstado(Base):
     __tablename__ = "historial_estados"
+    __table_args__ = particion_mensual("fecha_cambio")
     
     id = Column(Integer, primary_key=True, index=True)
     prospecto_id = Column(Integer, ForeignKey("prospectos.id"))
     estado_anterior = Column(String(20))
     estado_nuevo = Column(String(20))
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
-    fecha_cambio = Column(DateTime, default=datetime.now)
+    fecha_cambio = Column(DateTime, default=datetime.now, nullable=False)
     comentario = Column(Text)
     
     # Relaciones
     prospecto = relationship("Prospecto")
     usuario = relationship("Usuario")
 
+_crear_particion_default(Interaccion.__table__)
+_crear_particion_default(HistorialEstado.__table__)
+
 class Notificacion(Base):
     __tablename__ = "notificaciones"
     
@@ -326,3 +391,72 @@ class Notificacion(Base):
     # Relaciones
     usuario = relationship("Usuario")
     prospecto = relationship("Prospecto")
+
+class NotificacionArchivada(Base):
+    """Notificaciones leídas o vencidas movidas fuera de la tabla principal"""
+    __tablename__ = "notificaciones_archivo"
+    __table_args__ = (
+        Index("ix_notificaciones_archivo_usuario_fecha", "usuario_id", "fecha_creacion"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Conserva el id original
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"))
+    prospecto_id = Column(Integer, ForeignKey("prospectos.id"))
+    tipo = Column(String(50))
+    mensaje = Column(Text, nullable=False)
+    fecha_creacion = Column(DateTime)
+    fecha_programada = Column(DateTime, nullable=True)
+    leida = Column(Boolean, default=False)
+    email_enviado = Column(Boolean, default=False)
+    fecha_archivo = Column(DateTime, default=datetime.now, index=True)
+    
+    # Relaciones
+    usuario = relationship("Usuario")
+    prospecto = relationship("Prospecto")
+
+class EstadoTarea(Base):
+    """Estado persistente de una tarea programada, compartido por todos los workers"""
+    __tablename__ = "estado_tareas"
+    
+    tarea = Column(String(50), primary_key=True)
+    marca = Column(DateTime, nullable=True)  # Hasta dónde llegó la última ejecución
+    fecha_actualizacion = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class TrabajoExportacion(Base):
+    __tablename__ = "trabajos_exportacion"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False, index=True)
+    tipo = Column(String(50), nullable=False)  # prospectos, dashboard, clientes_ganados
+    parametros = Column(Text, nullable=True)  # Filtros de la exportación en JSON
+    estado = Column(String(20), default="pendiente", index=True)  # pendiente, procesando, completado, error
+    nombre_archivo = Column(String(255), nullable=True)
+    ruta_archivo = Column(String(500), nullable=True)
+    tamano_bytes = Column(Integer, nullable=True)
+    mensaje_error = Column(Text, nullable=True)
+    clave_cache = Column(String(64), nullable=True, index=True)  # Hash de filtros + alcance + versión de datos
+    fecha_creacion = Column(DateTime, default=datetime.now)
+    fecha_inicio = Column(DateTime, nullable=True)
+    fecha_completado = Column(DateTime, nullable=True)
+    fecha_expiracion = Column(DateTime, nullable=True, index=True)
+    
+    # Relaciones
+    usuario = relationship("Usuario")
+
+class CorreoSaliente(Base):
+    __tablename__ = "correos_salientes"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    notificacion_id = Column(Integer, ForeignKey("notificaciones.id"), nullable=True)
+    destinatario = Column(String(255), nullable=False)
+    asunto = Column(String(255), nullable=False)
+    cuerpo = Column(Text, nullable=False)
+    estado = Column(String(20), default="pendiente", index=True)  # pendiente, enviado, error
+    intentos = Column(Integer, default=0)
+    proximo_intento = Column(DateTime, default=datetime.now, index=True)
+    ultimo_error = Column(Text, nullable=True)
+    fecha_creacion = Column(DateTime, default=datetime.now)
+    fecha_envio = Column(DateTime, nullable=True)
+    
+    # Relaciones
+    notificacion = relationship("Notificacion")
@@ -0,0 +1,94 @@
+"""
+Script: Agrupación de destinos duplicados del catálogo
+
+Paso 1 - proponer: agrupa los destinos activos que parecen el mismo lugar
+("CANCUN", "CANCÚN", "CANCUN MX") y guarda las propuestas en un JSON con la
+cantidad de prospectos de cada destino. Nada se modifica.
+
+Paso 2 - revisar el JSON: marcar "aprobado": true en los grupos a fusionar
+(se puede cambiar el principal o quitar secundarios).
+
+Paso 3 - aplicar: fusiona los grupos aprobados (mueve los prospectos al
+principal con UPDATEs masivos y desactiva los secundarios).
+
+Uso:
+    python scripts/agrupar_destinos.py proponer [--umbral 0.85] [--salida propuestas_destinos.json]
+    python scripts/agrupar_destinos.py aplicar propuestas_destinos.json
+
+IMPORTANTE: Hacer backup de la base de datos antes de aplicar
+"""
+
+import sys
+import os
+import json
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+from services import proponer_fusiones, fusionar_destinos_catalogo
+
+
+def ejecutar_propuesta(db, umbral: float, salida: str):
+    print(f"🔍 Agrupando destinos del catálogo (umbral {umbral})...")
+    propuestas = proponer_fusiones(db, umbral=umbral)
+
+    for grupo in propuestas:
+        grupo["aprobado"] = False
+        principal = grupo["principal"]
+        print(f"\n📍 {principal['nombre']} (id={principal['id']}, {principal['prospectos']} prospectos)")
+        for secundario in grupo["secundarios"]:
+            print(f"   ← {secundario['nombre']} (id={secundario['id']}, {secundario['prospectos']} prospectos)")
+
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(propuestas, archivo, ensure_ascii=False, indent=2)
+
+    total = sum(g["prospectos_a_mover"] for g in propuestas)
+    print(f"\n📊 {len(propuestas)} grupos propuestos, {total} prospectos a mover")
+    print(f"✅ Propuestas guardadas en {salida}")
+    print("   Marque \"aprobado\": true en los grupos a fusionar y ejecute el comando aplicar")
+
+
+def ejecutar_fusiones(db, archivo_propuestas: str):
+    with open(archivo_propuestas, encoding="utf-8") as archivo:
+        propuestas = json.load(archivo)
+
+    aprobadas = [g for g in propuestas if g.get("aprobado")]
+    if not aprobadas:
+        print("ℹ️ No hay grupos aprobados en el archivo")
+        return
+
+    total = 0
+    for grupo in aprobadas:
+        principal = grupo["principal"]
+        secundario_ids = [d["id"] for d in grupo["secundarios"]]
+        movidos = fusionar_destinos_catalogo(db, principal["id"], secundario_ids)
+        total += movidos
+        print(f"✅ {principal['nombre']}: {len(secundario_ids)} destinos fusionados, {movidos} prospectos movidos")
+
+    print(f"\n🎉 {len(aprobadas)} grupos fusionados, {total} prospectos actualizados")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrupación de destinos duplicados")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    proponer = subcomandos.add_parser("proponer", help="Generar propuestas de fusión")
+    proponer.add_argument("--umbral", type=float, default=0.85, help="Similitud mínima (0-1) entre nombres")
+    proponer.add_argument("--salida", default="propuestas_destinos.json", help="Archivo JSON de propuestas")
+
+    aplicar = subcomandos.add_parser("aplicar", help="Fusionar los grupos aprobados")
+    aplicar.add_argument("archivo", help="Archivo JSON de propuestas revisado")
+
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        if args.comando == "proponer":
+            ejecutar_propuesta(db, args.umbral, args.salida)
+        else:
+            ejecutar_fusiones(db, args.archivo)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Script de migración: Índices para el autocompletado y la búsqueda por ID
+
+Crea los índices por prefijo (text_pattern_ops) que usan /api/prospectos/buscar
+y /busqueda_ids. Se crean con CONCURRENTLY para no bloquear las escrituras.
+
+Las bases de datos nuevas ya los obtienen con create_all.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from database import SQLALCHEMY_DATABASE_URL
+
+INDICES = {
+    "ix_prospectos_nombre_prefijo": ("prospectos", "lower(nombre) text_pattern_ops"),
+    "ix_prospectos_apellido_prefijo": ("prospectos", "lower(apellido) text_pattern_ops"),
+    "ix_prospectos_telefono_prefijo": ("prospectos", "telefono text_pattern_ops"),
+    "ix_prospectos_id_cliente_prefijo": ("prospectos", "id_cliente text_pattern_ops"),
+    "ix_prospectos_id_solicitud_prefijo": ("prospectos", "id_solicitud text_pattern_ops"),
+    "ix_estadisticas_id_cotizacion_prefijo": ("estadisticas_cotizacion", "id_cotizacion text_pattern_ops"),
+    "ix_documentos_id_documento_prefijo": ("documentos", "id_documento text_pattern_ops"),
+}
+
+
+def crear_indices_busqueda():
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, isolation_level="AUTOCOMMIT")
+
+    with engine.connect() as conn:
+        print("🔄 Creando índices de búsqueda de prospectos...")
+        for nombre, (tabla, expresion) in INDICES.items():
+            try:
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {tabla} ({expresion});"))
+                print(f"✅ {nombre}")
+            except Exception as e:
+                print(f"⚠️ Error al crear {nombre}: {e}")
+
+        print("\n🎉 Migración completada")
+
+
+if __name__ == "__main__":
+    crear_indices_busqueda()
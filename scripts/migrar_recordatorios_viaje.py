@@ -0,0 +1,65 @@
+"""
+Script de migración: Recordatorios de viaje bajo demanda
+
+Este script:
+1. Crea el índice (estado, fecha_ida) en prospectos que usa la tarea de recordatorios
+2. Elimina las notificaciones seguimiento_viaje futuras que se creaban por adelantado
+   (el planificador las volverá a crear cuando venzan)
+
+IMPORTANTE: Hacer backup de la base de datos antes de ejecutar
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from database import SQLALCHEMY_DATABASE_URL
+
+TAMANO_LOTE = 10000
+
+
+def migrar_recordatorios_viaje():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    with engine.connect() as conn:
+        print("🔄 Iniciando migración de recordatorios de viaje...")
+
+        # 1. Índice para derivar los recordatorios desde prospectos
+        print("\n1️⃣ Creando índice ix_prospectos_estado_fecha_ida...")
+        try:
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_prospectos_estado_fecha_ida
+                ON prospectos(estado, fecha_ida);
+            """))
+            conn.commit()
+            print("✅ Índice creado")
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ Error al crear índice: {e}")
+
+        # 2. Borrar en lotes los recordatorios futuros ya no necesarios
+        print("\n2️⃣ Eliminando recordatorios de viaje futuros pre-generados...")
+        total = 0
+        while True:
+            resultado = conn.execute(text("""
+                DELETE FROM notificaciones
+                WHERE id IN (
+                    SELECT id FROM notificaciones
+                    WHERE tipo = 'seguimiento_viaje'
+                      AND leida = FALSE
+                      AND fecha_programada > NOW()
+                    LIMIT :lote
+                );
+            """), {"lote": TAMANO_LOTE})
+            conn.commit()
+            total += resultado.rowcount
+            if resultado.rowcount < TAMANO_LOTE:
+                break
+        print(f"✅ {total} notificaciones eliminadas")
+
+        print("\n🎉 Migración completada")
+
+
+if __name__ == "__main__":
+    migrar_recordatorios_viaje()
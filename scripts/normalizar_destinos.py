@@ -0,0 +1,82 @@
+"""
+Script: Normalización de destinos y backfill de destino_id
+
+Por defecto solo simula (muestra cuántos prospectos cambiarían). Usar --aplicar
+para ejecutar los UPDATE.
+
+Uso:
+    # Asignar destino_id a todos los prospectos con texto de destino heredado
+    python scripts/normalizar_destinos.py backfill [--crear-faltantes] [--aplicar]
+
+    # Renombrar un destino (texto y destino_id a la vez)
+    python scripts/normalizar_destinos.py normalizar "CANCUN MX" "CANCUN" [--parcial] [--aplicar]
+
+IMPORTANTE: Hacer backup de la base de datos antes de ejecutar con --aplicar
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+from services import completar_destino_id, normalizar_destinos_prospectos
+
+
+def ejecutar_backfill(db, aplicar: bool, crear_faltantes: bool):
+    print("🔄 Resolviendo textos de destino sin destino_id...")
+    resumen = completar_destino_id(db, simular=not aplicar, crear_faltantes=crear_faltantes)
+
+    print(f"📊 Textos distintos sin destino_id: {resumen['textos_distintos']}")
+    print(f"✅ Resueltos contra el catálogo: {resumen['textos_resueltos']} ({resumen['prospectos']} prospectos)")
+    if resumen["sin_resolver"]:
+        print(f"⚠️ Sin coincidencia en el catálogo: {len(resumen['sin_resolver'])} textos")
+        for texto, cantidad in resumen["sin_resolver"][:20]:
+            print(f"   - {texto!r}: {cantidad} prospectos")
+        if not crear_faltantes:
+            print("   Use --crear-faltantes para agregarlos al catálogo")
+
+    if not aplicar:
+        print("\nℹ️ Simulación: no se modificó nada. Use --aplicar para ejecutar.")
+    else:
+        print("\n🎉 Backfill completado")
+
+
+def ejecutar_normalizacion(db, origen: str, destino: str, parcial: bool, aplicar: bool):
+    resultado = normalizar_destinos_prospectos(db, origen, destino, coincidencia_parcial=parcial, simular=not aplicar)
+
+    if not aplicar:
+        nuevo = " (se creará en el catálogo)" if resultado.get("destino_nuevo") else ""
+        print(f"ℹ️ Simulación: {resultado['count']} prospectos pasarían a '{resultado['destino']}'{nuevo}")
+        print("   Use --aplicar para ejecutar.")
+    else:
+        print(f"✅ {resultado['count']} prospectos normalizados a '{resultado['destino']}' (destino_id={resultado['destino_id']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalización de destinos de prospectos")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    backfill = subcomandos.add_parser("backfill", help="Asignar destino_id a partir del texto de destino")
+    backfill.add_argument("--crear-faltantes", action="store_true", help="Crear en el catálogo los destinos sin coincidencia")
+    backfill.add_argument("--aplicar", action="store_true", help="Ejecutar los cambios (por defecto solo simula)")
+
+    normalizar = subcomandos.add_parser("normalizar", help="Renombrar un destino en todos sus prospectos")
+    normalizar.add_argument("origen", help="Texto de destino actual")
+    normalizar.add_argument("destino", help="Nombre normalizado")
+    normalizar.add_argument("--parcial", action="store_true", help="Coincidir por contenido en lugar de igualdad")
+    normalizar.add_argument("--aplicar", action="store_true", help="Ejecutar los cambios (por defecto solo simula)")
+
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        if args.comando == "backfill":
+            ejecutar_backfill(db, args.aplicar, args.crear_faltantes)
+        else:
+            ejecutar_normalizacion(db, args.origen, args.destino, args.parcial, args.aplicar)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Script de migración: Particionado mensual de interacciones e historial_estados
+
+Convierte cada tabla en una tabla particionada por mes (PostgreSQL,
+PARTITION BY RANGE sobre fecha_creacion / fecha_cambio) y copia sus datos:
+
+1. Bloquea la tabla y la renombra a <tabla>_sin_particion (con sus índices
+   y su secuencia).
+2. Crea la tabla particionada desde models.py y las particiones desde el
+   mes del registro más antiguo hasta los próximos meses.
+3. Copia las filas y ajusta la secuencia del id.
+
+Las filas sin fecha reciben 1970-01-01 y quedan en la partición DEFAULT:
+igual que antes, no entran en ningún filtro por fechas.
+
+Cada tabla se migra en su propia transacción y bloquea las escrituras sobre
+ella mientras dura la copia: ejecutar en una ventana de mantenimiento.
+Las tablas <tabla>_sin_particion se conservan para verificar la copia;
+usar --eliminar-antiguas para borrarlas.
+
+Las bases de datos nuevas ya se crean particionadas con create_all.
+"""
+
+import sys
+import os
+import argparse
+from datetime import date
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from database import SQLALCHEMY_DATABASE_URL
+import models
+from services.particiones import MESES_ADELANTE, asegurar_particiones, esta_particionada, tablas_particionadas
+
+SUFIJO = "_sin_particion"
+FECHA_SIN_FECHA = "1970-01-01"
+
+
+def _mes_futuro(meses: int) -> date:
+    hoy = date.today()
+    indice = hoy.year * 12 + hoy.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def particionar_tabla(conn, tabla: str, columna: str):
+    antigua = f"{tabla}{SUFIJO}"
+    conn.execute(text(f"LOCK TABLE {tabla} IN ACCESS EXCLUSIVE MODE"))
+
+    minimo = conn.execute(text(f"SELECT min({columna}) FROM {tabla}")).scalar()
+    sin_fecha = conn.execute(text(
+        f"UPDATE {tabla} SET {columna} = :fecha WHERE {columna} IS NULL"
+    ), {"fecha": FECHA_SIN_FECHA}).rowcount
+    if sin_fecha:
+        print(f"   ⚠️ {sin_fecha} filas sin fecha irán a la partición DEFAULT")
+
+    # Liberar los nombres de índices y secuencia para la tabla nueva
+    secuencia = conn.execute(text("SELECT pg_get_serial_sequence(:tabla, 'id')"), {"tabla": tabla}).scalar()
+    indices = conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = :tabla AND schemaname = current_schema()"
+    ), {"tabla": tabla}).scalars().all()
+
+    conn.execute(text(f"ALTER TABLE {tabla} RENAME TO {antigua}"))
+    for indice in indices:
+        conn.execute(text(f"ALTER INDEX {indice} RENAME TO {indice[:63 - len(SUFIJO)]}{SUFIJO}"))
+    if secuencia:
+        conn.execute(text(f"ALTER SEQUENCE {secuencia} RENAME TO {secuencia.split('.')[-1]}{SUFIJO}"))
+
+    models.Base.metadata.tables[tabla].create(conn)
+    creadas = asegurar_particiones(conn, tabla, minimo or date.today(), _mes_futuro(MESES_ADELANTE))
+    print(f"   ✅ Tabla particionada creada ({creadas} particiones mensuales)")
+
+    columnas = ", ".join(c.name for c in models.Base.metadata.tables[tabla].columns)
+    copiadas = conn.execute(text(
+        f"INSERT INTO {tabla} ({columnas}) SELECT {columnas} FROM {antigua}"
+    )).rowcount
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), COALESCE(max(id), 0) + 1, false) FROM {tabla}"
+    ))
+    print(f"   ✅ {copiadas} filas copiadas")
+
+
+def particionar_tablas(eliminar_antiguas: bool = False):
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    if engine.dialect.name != "postgresql":
+        print("⚠️ El particionado solo aplica a PostgreSQL")
+        return
+
+    for tabla, columna in tablas_particionadas().items():
+        print(f"🔄 {tabla} (por {columna})...")
+        try:
+            with engine.begin() as conn:
+                if esta_particionada(conn, tabla):
+                    print("   ✅ Ya está particionada")
+                else:
+                    particionar_tabla(conn, tabla, columna)
+
+            if eliminar_antiguas:
+                with engine.begin() as conn:
+                    conn.execute(text(f"DROP TABLE IF EXISTS {tabla}{SUFIJO}"))
+                print(f"   🗑️ {tabla}{SUFIJO} eliminada")
+        except Exception as e:
+            print(f"   ❌ Error (sin cambios en {tabla}): {e}")
+
+    with engine.begin() as conn:
+        for tabla in tablas_particionadas():
+            conn.execute(text(f"ANALYZE {tabla}"))
+
+    print("\n🎉 Migración completada")
+    if not eliminar_antiguas:
+        print(f"   Tras verificar los datos, borrar las tablas *{SUFIJO} con --eliminar-antiguas")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particiona por mes interacciones e historial_estados")
+    parser.add_argument("--eliminar-antiguas", action="store_true",
+                        help=f"Borrar las tablas *{SUFIJO} tras la copia")
+    args = parser.parse_args()
+    particionar_tablas(eliminar_antiguas=args.eliminar_antiguas)
@@ -1,18 +1,147 @@
 """
 Módulo de servicios para el CRM ZARITA!
-Contiene la lógica de negocio y servicios de exportación.
+Contiene la lógica de negocio, servicios de exportación y trabajos en segundo plano.
 """
 
 from .exportacion_service import (
+    EscritorExcel,
+    consultar_prospectos_exportacion,
+    consultar_conteos_prospectos_por_agente,
     generar_excel_prospectos,
     generar_excel_estadisticas,
     generar_excel_interacciones,
     generar_excel_usuarios
 )
+from .trabajos_exportacion import (
+    TIPOS_EXPORTACION,
+    encolar_trabajo_exportacion,
+    listar_trabajos_usuario,
+    limpiar_exportaciones_expiradas,
+    marcar_trabajos_interrumpidos,
+    cerrar_pool
+)
+from .notificaciones_service import (
+    generar_alertas_inactividad,
+    consultar_recordatorios_vencidos,
+    despachar_recordatorios_vencidos
+)
+from .canal_notificaciones import canal_notificaciones, formatear_evento_sse
+from .recordatorios_viaje import (
+    materializar_recordatorios_viaje,
+    descartar_recordatorios_viaje,
+    consultar_proximos_recordatorios_viaje
+)
+from .archivo_notificaciones import archivar_notificaciones, paginar_notificaciones_con_archivo
+from .busqueda_prospectos import buscar_prospectos_rapido
+from .busqueda_ids import buscar_prospectos_por_id, detectar_tipo_id
+from .datos_referencia import (
+    obtener_usuarios,
+    obtener_agentes,
+    obtener_medios_ingreso,
+    obtener_destinos,
+    obtener_destinos_por_nombre,
+    obtener_alias_destinos,
+    invalidar_datos_referencia,
+    version_datos_referencia
+)
+from .autocompletado_destinos import buscar_destinos_autocompletado, obtener_indice_destinos
+from .normalizacion_destinos import resolver_destinos, normalizar_destinos_prospectos, completar_destino_id
+from .alias_destinos import registrar_alias_destino, redirigir_alias_destinos, resolver_destino_texto
+from .agrupacion_destinos import proponer_fusiones, fusionar_destinos_catalogo
+from .contador_notificaciones import obtener_contador
+from .correo_service import encolar_correo, entregar_correos_pendientes
+from .tareas_programadas import planificador
+from .perfilado_sql import (
+    iniciar_perfil,
+    terminar_perfil,
+    cabecera_server_timing,
+    registrar_peticion,
+    obtener_estadisticas_rutas,
+    reiniciar_estadisticas_rutas,
+    SENTENCIA_LENTA_MS,
+    PETICION_LENTA_MS,
+    MAX_CONSULTAS
+)
+from .registro import obtener_logger, iniciar_id_peticion, terminar_id_peticion, detener_registro
+from .metricas import (
+    registrar_peticion_http,
+    registrar_importacion,
+    registrar_acceso_cache,
+    medir_retraso_event_loop,
+    generar_metricas,
+    marcar_proceso_terminado
+)
+from .particiones import crear_particiones_mensuales, asegurar_particiones, tablas_particionadas
 
 __all__ = [
+    'EscritorExcel',
+    'consultar_prospectos_exportacion',
+    'consultar_conteos_prospectos_por_agente',
     'generar_excel_prospectos',
     'generar_excel_estadisticas',
     'generar_excel_interacciones',
-    'generar_excel_usuarios'
+    'generar_excel_usuarios',
+    'TIPOS_EXPORTACION',
+    'encolar_trabajo_exportacion',
+    'listar_trabajos_usuario',
+    'limpiar_exportaciones_expiradas',
+    'marcar_trabajos_interrumpidos',
+    'cerrar_pool',
+    'generar_alertas_inactividad',
+    'consultar_recordatorios_vencidos',
+    'despachar_recordatorios_vencidos',
+    'materializar_recordatorios_viaje',
+    'descartar_recordatorios_viaje',
+    'consultar_proximos_recordatorios_viaje',
+    'archivar_notificaciones',
+    'paginar_notificaciones_con_archivo',
+    'buscar_prospectos_rapido',
+    'buscar_prospectos_por_id',
+    'detectar_tipo_id',
+    'obtener_usuarios',
+    'obtener_agentes',
+    'obtener_medios_ingreso',
+    'obtener_destinos',
+    'obtener_destinos_por_nombre',
+    'obtener_alias_destinos',
+    'invalidar_datos_referencia',
+    'version_datos_referencia',
+    'buscar_destinos_autocompletado',
+    'obtener_indice_destinos',
+    'resolver_destinos',
+    'normalizar_destinos_prospectos',
+    'completar_destino_id',
+    'registrar_alias_destino',
+    'redirigir_alias_destinos',
+    'resolver_destino_texto',
+    'proponer_fusiones',
+    'fusionar_destinos_catalogo',
+    'canal_notificaciones',
+    'formatear_evento_sse',
+    'obtener_contador',
+    'encolar_correo',
+    'entregar_correos_pendientes',
+    'planificador',
+    'iniciar_perfil',
+    'terminar_perfil',
+    'cabecera_server_timing',
+    'registrar_peticion',
+    'obtener_estadisticas_rutas',
+    'reiniciar_estadisticas_rutas',
+    'SENTENCIA_LENTA_MS',
+    'PETICION_LENTA_MS',
+    'MAX_CONSULTAS',
+    'obtener_logger',
+    'iniciar_id_peticion',
+    'terminar_id_peticion',
+    'detener_registro',
+    'registrar_peticion_http',
+    'registrar_importacion',
+    'registrar_acceso_cache',
+    'medir_retraso_event_loop',
+    'generar_metricas',
+    'marcar_proceso_terminado',
+    'crear_particiones_mensuales',
+    'asegurar_particiones',
+    'tablas_particionadas'
 ]
@@ -0,0 +1,182 @@
+"""
+Agrupación de destinos duplicados en el catálogo
+
+Propone grupos de destinos que son el mismo lugar escrito de distintas formas
+("CANCUN", "CANCÚN", "CANCUN MX") para que un administrador los apruebe, y
+aplica las fusiones aprobadas con UPDATEs masivos.
+
+Los grupos se forman en tres pasos:
+1. Misma clave: sin tildes, mayúsculas y con las palabras ordenadas.
+2. Mismas palabras más códigos cortos (hasta 3 letras, p. ej. "MX", "RD").
+3. Levenshtein acotado entre claves que comparten el inicio de una palabra,
+   con la misma escala 0-1 que excel_import.calcular_similitud.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+import models
+from .alias_destinos import redirigir_alias_destinos
+from .autocompletado_destinos import normalizar_busqueda
+
+
+UMBRAL_SIMILITUD = 0.85
+LONGITUD_CODIGO = 3  # Palabras extra de hasta esta longitud se consideran códigos de país
+
+
+def clave_agrupacion(nombre: str) -> str:
+    """Clave sin tildes, en mayúsculas y con las palabras únicas ordenadas"""
+    return " ".join(sorted(set(normalizar_busqueda(nombre).split())))
+
+
+def distancia_acotada(a: str, b: str, maximo: int) -> int:
+    """
+    Distancia de Levenshtein limitada a `maximo`: solo calcula la banda
+    diagonal de ancho 2*maximo+1 y corta en cuanto la fila supera el límite.
+
+    Returns:
+        La distancia, o maximo + 1 si es mayor que maximo
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    infinito = maximo + 1
+    anterior = [j if j <= maximo else infinito for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        actual = [infinito] * (len(b) + 1)
+        if i <= maximo:
+            actual[0] = i
+        desde = max(1, i - maximo)
+        hasta = min(len(b), i + maximo)
+        for j in range(desde, hasta + 1):
+            costo = 0 if a[i - 1] == b[j - 1] else 1
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + costo)
+        if min(actual[desde - 1:hasta + 1]) > maximo:
+            return infinito
+        anterior = actual
+    return min(anterior[len(b)], infinito)
+
+
+class _Conjuntos:
+    """Union-find para unir destinos en grupos"""
+
+    def __init__(self, elementos):
+        self.padre = {e: e for e in elementos}
+
+    def raiz(self, e):
+        while self.padre[e] != e:
+            self.padre[e] = self.padre[self.padre[e]]
+            e = self.padre[e]
+        return e
+
+    def unir(self, a, b):
+        self.padre[self.raiz(a)] = self.raiz(b)
+
+
+def proponer_fusiones(db: Session, umbral: float = UMBRAL_SIMILITUD) -> list:
+    """
+    Agrupa los destinos activos del catálogo y propone fusiones.
+
+    Returns:
+        Lista de grupos ordenada por prospectos afectados; cada grupo es un dict
+        con principal (el más usado) y secundarios, cada uno con id, nombre y prospectos
+    """
+    D = models.Destino
+    P = models.Prospecto
+    filas = db.query(D.id, D.nombre, func.count(P.id)).outerjoin(
+        P, and_(P.destino_id == D.id, P.fecha_eliminacion.is_(None))
+    ).filter(D.activo == 1).group_by(D.id, D.nombre).all()
+
+    destinos = {id_: {"id": id_, "nombre": nombre, "prospectos": total} for id_, nombre, total in filas}
+    claves = {id_: clave_agrupacion(d["nombre"]) for id_, d in destinos.items()}
+    conjuntos = _Conjuntos(destinos)
+
+    # 1. Misma clave
+    por_clave = defaultdict(list)
+    for id_, clave in claves.items():
+        por_clave[clave].append(id_)
+    for ids in por_clave.values():
+        for id_ in ids[1:]:
+            conjuntos.unir(ids[0], id_)
+
+    representantes = {clave: ids[0] for clave, ids in por_clave.items()}
+    palabras = {clave: set(clave.split()) for clave in representantes}
+
+    # Bloques por las 3 primeras letras de cada palabra: solo se comparan claves del mismo bloque
+    bloques = defaultdict(set)
+    for clave in representantes:
+        for palabra in palabras[clave]:
+            if len(palabra) > LONGITUD_CODIGO:
+                bloques[palabra[:3]].add(clave)
+
+    comparados = set()
+    for claves_bloque in bloques.values():
+        claves_bloque = sorted(claves_bloque)
+        for i, clave_a in enumerate(claves_bloque):
+            for clave_b in claves_bloque[i + 1:]:
+                if (clave_a, clave_b) in comparados:
+                    continue
+                comparados.add((clave_a, clave_b))
+
+                # 2. Mismas palabras más códigos cortos
+                menor, mayor = sorted((palabras[clave_a], palabras[clave_b]), key=len)
+                extra = mayor - menor
+                if menor <= mayor and extra and all(len(p) <= LONGITUD_CODIGO for p in extra):
+                    conjuntos.unir(representantes[clave_a], representantes[clave_b])
+                    continue
+
+                # 3. Levenshtein acotado sobre la clave
+                longitud = max(len(clave_a), len(clave_b))
+                maximo = int((1 - umbral) * longitud)
+                if distancia_acotada(clave_a, clave_b, maximo) <= maximo:
+                    conjuntos.unir(representantes[clave_a], representantes[clave_b])
+
+    grupos = defaultdict(list)
+    for id_ in destinos:
+        grupos[conjuntos.raiz(id_)].append(destinos[id_])
+
+    propuestas = []
+    for miembros in grupos.values():
+        if len(miembros) < 2:
+            continue
+        miembros.sort(key=lambda d: (-d["prospectos"], len(d["nombre"]), d["id"]))
+        propuestas.append({
+            "principal": miembros[0],
+            "secundarios": miembros[1:],
+            "prospectos_a_mover": sum(d["prospectos"] for d in miembros[1:])
+        })
+    propuestas.sort(key=lambda g: -sum(d["prospectos"] for d in [g["principal"]] + g["secundarios"]))
+    return propuestas
+
+
+def fusionar_destinos_catalogo(db: Session, principal_id: int, secundario_ids: list) -> int:
+    """
+    Mueve los prospectos de los destinos secundarios al principal (texto y
+    destino_id), redirige sus alias y desactiva los secundarios, en una transacción.
+
+    Returns:
+        Número de prospectos movidos
+    """
+    secundario_ids = [id_ for id_ in secundario_ids if id_ != principal_id]
+    if not secundario_ids:
+        return 0
+
+    principal = db.query(models.Destino).filter(models.Destino.id == principal_id).one()
+
+    movidos = db.query(models.Prospecto).filter(
+        models.Prospecto.destino_id.in_(secundario_ids)
+    ).update(
+        {models.Prospecto.destino_id: principal.id, models.Prospecto.destino: principal.nombre},
+        synchronize_session=False
+    )
+    db.query(models.Destino).filter(
+        models.Destino.id.in_(secundario_ids)
+    ).update({models.Destino.activo: 0}, synchronize_session=False)
+    redirigir_alias_destinos(db, secundario_ids, principal.id)
+
+    db.commit()
+    return movidos
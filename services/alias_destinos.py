@@ -0,0 +1,135 @@
+"""
+Diccionario persistente de alias de destinos
+
+Cada escritura de destino que ya se resolvió contra el catálogo (exacta, por
+similitud, creada en una importación o absorbida en una fusión) se guarda en
+destino_alias, normalizada sin tildes ni espacios extra. La siguiente vez que
+aparece se resuelve con una búsqueda en el diccionario en memoria, sin volver
+a calcular similitudes contra todo el catálogo.
+
+Los alias por similitud son una suposición: una coincidencia exacta con el
+catálogo (p. ej. un destino creado después) tiene prioridad y los corrige.
+"""
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from .autocompletado_destinos import normalizar_busqueda
+from .datos_referencia import obtener_alias_destinos, obtener_destinos, obtener_destinos_por_nombre
+
+
+UMBRAL_SIMILITUD_ALIAS = 0.7  # Mismo umbral que la importación de Excel
+
+
+def registrar_alias_destino(db: Session, texto: str, destino_id: int, origen: str) -> bool:
+    """
+    Guarda (o redirige) el alias de `texto` hacia `destino_id`, en un savepoint
+    para que una carrera con otra sesión no invalide la transacción. No hace commit.
+
+    Returns:
+        True si se creó o cambió el alias
+    """
+    alias = normalizar_busqueda(texto)
+    if not alias:
+        return False
+
+    existente = db.query(models.DestinoAlias).filter(models.DestinoAlias.alias == alias).first()
+    if existente:
+        if existente.destino_id == destino_id:
+            if existente.origen == "similar" and origen != "similar":
+                existente.origen = origen  # Suposición confirmada
+                return True
+            return False
+        existente.destino_id = destino_id
+        existente.origen = origen
+        return True
+
+    try:
+        with db.begin_nested():
+            db.add(models.DestinoAlias(alias=alias, destino_id=destino_id, origen=origen))
+    except IntegrityError:
+        return False  # Otra sesión lo registró primero
+    return True
+
+
+def redirigir_alias_destinos(db: Session, secundario_ids: list, principal_id: int):
+    """
+    Fusión de destinos: los alias de los secundarios y sus propios nombres pasan
+    a apuntar al principal. No hace commit.
+    """
+    db.query(models.DestinoAlias).filter(
+        models.DestinoAlias.destino_id.in_(secundario_ids)
+    ).update({models.DestinoAlias.destino_id: principal_id}, synchronize_session=False)
+
+    for destino in obtener_destinos(db, solo_activos=False):
+        if destino.id in secundario_ids:
+            registrar_alias_destino(db, destino.nombre, principal_id, "fusion")
+
+
+def resolver_destino_texto(db: Session, texto: str, crear_faltantes: bool = False, alias: dict = None,
+                           permitir_similares: bool = True):
+    """
+    Resuelve un destino escrito libremente al catálogo, en este orden:
+    1. Alias ya conocido (búsqueda en diccionario), salvo los de similitud
+    2. Nombre del catálogo igual sin tildes ni mayúsculas
+    3. Alias conocido por similitud
+    4. Destino activo más parecido (>= UMBRAL_SIMILITUD_ALIAS)
+    5. Nuevo destino en el catálogo, solo si crear_faltantes
+    Los casos 2, 4 y 5 quedan registrados como alias. No hace commit.
+
+    Args:
+        alias: Diccionario alias -> (destino_id, nombre, origen) a usar y completar
+               con los nuevos alias (importaciones masivas); por defecto el de la caché
+        permitir_similares: False en los formularios: solo alias confirmados o
+               coincidencia exacta, sin reescribir lo que escribió el usuario
+
+    Returns:
+        Tupla (destino_id, nombre); destino_id es None si no se resolvió y
+        nombre es entonces el texto en mayúsculas
+    """
+    nombre = " ".join(str(texto).upper().split()) if texto else None
+    clave = normalizar_busqueda(texto)
+    if not clave:
+        return None, nombre
+
+    conocidos = alias if alias is not None else obtener_alias_destinos(db)
+    conocido = conocidos.get(clave)
+
+    # 1. Alias confirmado
+    if conocido and conocido[2] != "similar":
+        return conocido[:2]
+
+    # 2. Coincidencia exacta normalizada (gana el activo ante nombres repetidos)
+    destino = obtener_destinos_por_nombre(db).get(clave)
+    origen = "exacto"
+
+    if destino is None:
+        if not permitir_similares:
+            return None, nombre
+
+        # 3. Alias por similitud ya conocido
+        if conocido:
+            return conocido[:2]
+
+        # 4. Similitud contra los destinos activos
+        from excel_import import buscar_destino_similar
+        destino, _ = buscar_destino_similar(
+            nombre, db, umbral=UMBRAL_SIMILITUD_ALIAS, lista_destinos=obtener_destinos(db)
+        )
+        origen = "similar"
+
+    # 5. Nuevo destino
+    if destino is None:
+        if not crear_faltantes:
+            return None, nombre
+        destino = models.Destino(nombre=nombre, activo=1)
+        db.add(destino)
+        db.flush()
+        origen = "nuevo"
+
+    # Registra el alias (o corrige uno por similitud que apuntaba a otro destino)
+    registrar_alias_destino(db, texto, destino.id, origen)
+    if alias is not None:
+        alias[clave] = (destino.id, destino.nombre, origen)
+    return destino.id, destino.nombre
@@ -0,0 +1,142 @@
+"""
+Retención de notificaciones para el CRM ZARITA!
+
+Mueve a notificaciones_archivo, en lotes, las notificaciones que ya no
+necesitan estar en la tabla principal: así las consultas del día a día
+(badge, recordatorios, /notificaciones) recorren solo las vigentes.
+
+Configuración (variables de entorno):
+    NOTIFICACIONES_RETENCION_DIAS  Antigüedad mínima para archivar (por defecto 90)
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, exists, insert, literal, or_, select, union_all, update
+from sqlalchemy.orm import Session
+
+import models
+from .contador_notificaciones import marcar_contadores
+
+
+RETENCION_DIAS = int(os.getenv("NOTIFICACIONES_RETENCION_DIAS", "90"))
+TAMANO_LOTE = 5000
+MAX_LOTES_POR_EJECUCION = 20  # Acota la duración de cada ejecución de la tarea
+
+COLUMNAS_ARCHIVO = [
+    "id", "usuario_id", "prospecto_id", "tipo", "mensaje",
+    "fecha_creacion", "fecha_programada", "leida", "email_enviado"
+]
+
+
+def _condicion_archivable(corte: datetime):
+    """
+    Notificaciones creadas antes del corte que ya cumplieron su función:
+    - leídas,
+    - recordatorios cuya fecha programada pasó hace más del periodo de retención,
+    - alertas de inactividad (se regeneran si el prospecto sigue inactivo),
+    y que no tienen un correo pendiente en la bandeja de salida.
+    """
+    N = models.Notificacion
+    C = models.CorreoSaliente
+
+    correo_pendiente = exists().where(
+        C.notificacion_id == N.id,
+        C.estado == "pendiente"
+    )
+    return (
+        (N.fecha_creacion < corte)
+        & or_(
+            N.leida == True,
+            (N.fecha_programada.isnot(None)) & (N.fecha_programada < corte),
+            N.tipo == "inactividad"
+        )
+        & ~correo_pendiente
+    )
+
+
+def archivar_notificaciones(db: Session, dias: int = None) -> int:
+    """
+    Tarea programada: mueve al archivo las notificaciones antiguas en lotes
+    de TAMANO_LOTE, con un commit por lote.
+
+    Args:
+        dias: Antigüedad mínima en días (por defecto RETENCION_DIAS)
+
+    Returns:
+        Número de notificaciones archivadas
+    """
+    N = models.Notificacion
+    A = models.NotificacionArchivada
+    corte = datetime.now() - timedelta(days=dias or RETENCION_DIAS)
+    condicion = _condicion_archivable(corte)
+
+    total = 0
+    for _ in range(MAX_LOTES_POR_EJECUCION):
+        ids = db.execute(
+            select(N.id).where(condicion).order_by(N.id).limit(TAMANO_LOTE).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            break
+
+        db.execute(
+            insert(A).from_select(
+                COLUMNAS_ARCHIVO + ["fecha_archivo"],
+                select(*[getattr(N, c) for c in COLUMNAS_ARCHIVO], literal(datetime.now())).where(N.id.in_(ids))
+            )
+        )
+        # Los correos ya entregados conservan su registro, sin la referencia
+        db.execute(
+            update(models.CorreoSaliente).where(
+                models.CorreoSaliente.notificacion_id.in_(ids)
+            ).values(notificacion_id=None)
+        )
+        usuario_ids = db.execute(
+            delete(N).where(N.id.in_(ids)).returning(N.usuario_id).execution_options(usuarios_notificaciones=())
+        ).scalars().all()
+        marcar_contadores(db, usuario_ids)
+        db.commit()
+
+        total += len(ids)
+        if len(ids) < TAMANO_LOTE:
+            break
+
+    return total
+
+
+def paginar_notificaciones_con_archivo(db: Session, query, query_archivo, offset: int, limit: int) -> list:
+    """
+    Página de notificaciones que mezcla la tabla principal y el archivo,
+    ordenada por fecha de creación. Solo pagina ids con UNION ALL y después
+    carga las filas de la página.
+
+    Args:
+        query: Consulta filtrada sobre Notificacion
+        query_archivo: La misma consulta sobre NotificacionArchivada
+
+    Returns:
+        Lista de objetos; los del archivo llevan el atributo archivada = True
+    """
+    N = models.Notificacion
+    A = models.NotificacionArchivada
+
+    union = union_all(
+        query.with_entities(N.id.label("id"), N.fecha_creacion.label("fecha_creacion"), literal(False).label("archivada")).statement,
+        query_archivo.with_entities(A.id, A.fecha_creacion, literal(True)).statement
+    ).subquery()
+    pagina = db.execute(
+        select(union.c.id, union.c.archivada).order_by(union.c.fecha_creacion.desc()).offset(offset).limit(limit)
+    ).all()
+
+    ids_activas = [fila.id for fila in pagina if not fila.archivada]
+    ids_archivo = [fila.id for fila in pagina if fila.archivada]
+    activas = {n.id: n for n in db.query(N).filter(N.id.in_(ids_activas)).all()} if ids_activas else {}
+    archivadas = {n.id: n for n in db.query(A).filter(A.id.in_(ids_archivo)).all()} if ids_archivo else {}
+    for notificacion in archivadas.values():
+        notificacion.archivada = True
+
+    return [
+        archivadas[fila.id] if fila.archivada else activas[fila.id]
+        for fila in pagina
+        if (fila.id in archivadas if fila.archivada else fila.id in activas)
+    ]
@@ -0,0 +1,153 @@
+"""
+Autocompletado de destinos desde un índice en memoria
+
+El catálogo de destinos es pequeño y cambia poco, así que cada worker mantiene
+un índice por prefijos de palabra y trigramas, con la popularidad de cada
+destino (número de prospectos). Las búsquedas no tocan la base de datos.
+
+El índice se reconstruye cuando cambia la versión del catálogo en la caché de
+datos de referencia (altas, ediciones, fusiones de destinos) y, para
+actualizar la popularidad, cada TTL_POPULARIDAD segundos.
+"""
+
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from sqlalchemy import func
+
+import database
+import models
+from .datos_referencia import obtener_destinos, version_datos_referencia
+from .metricas import registrar_acceso_cache
+
+
+TTL_POPULARIDAD = 15 * 60  # segundos
+MIN_SIMILITUD_TRIGRAMAS = 0.3
+
+
+def normalizar_busqueda(texto: str) -> str:
+    """Mayúsculas, sin tildes y con espacios simples"""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.upper().split())
+
+
+def _trigramas(texto: str) -> set:
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceDestinos:
+    """Índice inmutable: se reemplaza completo al reconstruirse"""
+
+    def __init__(self, destinos, popularidad: dict, version: int):
+        self.version = version
+        self.generacion = f"{version}-{int(time.time())}"
+        self.creado = time.monotonic()
+        self.destinos = {d.id: d for d in destinos}
+        self.popularidad = popularidad
+        self.nombres = {}
+        self.prefijos = defaultdict(set)  # prefijo de palabra -> ids
+        self.trigramas = defaultdict(set)  # trigrama -> ids
+        self.trigramas_por_id = {}
+
+        for destino in destinos:
+            nombre = normalizar_busqueda(destino.nombre)
+            self.nombres[destino.id] = nombre
+            for palabra in nombre.split():
+                for i in range(1, len(palabra) + 1):
+                    self.prefijos[palabra[:i]].add(destino.id)
+            trigramas = _trigramas(nombre)
+            self.trigramas_por_id[destino.id] = trigramas
+            for trigrama in trigramas:
+                self.trigramas[trigrama].add(destino.id)
+
+    def buscar(self, q: str, limite: int = 10) -> list:
+        """
+        Destinos ordenados por relevancia:
+        1. El nombre empieza por el texto buscado
+        2. Todas las palabras buscadas son prefijo de alguna palabra del nombre
+        3. Parecido por trigramas (errores de escritura)
+        Dentro de cada grupo, los más usados primero.
+        """
+        consulta = normalizar_busqueda(q)
+        if not consulta:
+            return []
+
+        palabras = consulta.split()
+        candidatos = set(self.prefijos.get(palabras[0], ()))
+        for palabra in palabras[1:]:
+            candidatos &= self.prefijos.get(palabra, set())
+
+        puntajes = {}
+        for destino_id in candidatos:
+            rango = 0 if self.nombres[destino_id].startswith(consulta) else 1
+            puntajes[destino_id] = (rango, 0.0)
+
+        if len(puntajes) < limite and len(consulta) >= 3:
+            trigramas_consulta = _trigramas(consulta)
+            coincidencias = defaultdict(int)
+            for trigrama in trigramas_consulta:
+                for destino_id in self.trigramas.get(trigrama, ()):
+                    coincidencias[destino_id] += 1
+            for destino_id, comunes in coincidencias.items():
+                if destino_id in puntajes:
+                    continue
+                similitud = comunes / len(trigramas_consulta | self.trigramas_por_id[destino_id])
+                if similitud >= MIN_SIMILITUD_TRIGRAMAS:
+                    puntajes[destino_id] = (2, -similitud)
+
+        ordenados = sorted(
+            puntajes,
+            key=lambda d: (puntajes[d][0], puntajes[d][1], -self.popularidad.get(d, 0), self.nombres[d])
+        )
+        return [self.destinos[d] for d in ordenados[:limite]]
+
+
+_indice = None
+_lock = threading.Lock()
+
+
+def _contar_prospectos_por_destino(db) -> dict:
+    P = models.Prospecto
+    filas = db.query(P.destino_id, func.count(P.id)).filter(
+        P.destino_id.isnot(None),
+        P.fecha_eliminacion.is_(None)
+    ).group_by(P.destino_id).all()
+    return dict(filas)
+
+
+def obtener_indice_destinos(db=None) -> IndiceDestinos:
+    """Índice vigente; lo reconstruye si cambió el catálogo o venció la popularidad"""
+    global _indice
+    indice = _indice
+    version = version_datos_referencia("destinos")
+    if indice and indice.version == version and time.monotonic() - indice.creado < TTL_POPULARIDAD:
+        registrar_acceso_cache("indice_destinos", True)
+        return indice
+    registrar_acceso_cache("indice_destinos", False)
+
+    with _lock:
+        indice = _indice
+        if indice and indice.version == version and time.monotonic() - indice.creado < TTL_POPULARIDAD:
+            return indice
+
+        sesion_propia = db is None
+        if sesion_propia:
+            db = database.SessionLocal()
+        try:
+            destinos = obtener_destinos(db)
+            popularidad = _contar_prospectos_por_destino(db)
+        finally:
+            if sesion_propia:
+                db.close()
+
+        _indice = IndiceDestinos(destinos, popularidad, version)
+        return _indice
+
+
+def buscar_destinos_autocompletado(q: str, limite: int = 10, db=None) -> list:
+    """Destinos activos que coinciden con `q`, ordenados por relevancia y popularidad"""
+    return obtener_indice_destinos(db).buscar(q, limite)
@@ -0,0 +1,82 @@
+"""
+Búsqueda de prospectos por ID (cliente, solicitud, cotización o documento)
+
+Los IDs tienen la forma PREFIJO-AAAAMMDD-NNNN (CL-, SOL-, COT-, DOC-). Un ID
+completo se busca por igualdad y uno parcial por su inicio, de modo que
+PostgreSQL usa el índice único o el de prefijo (text_pattern_ops) en lugar de
+recorrer la tabla con ILIKE '%valor%'. Las cotizaciones y documentos se
+resuelven a sus prospectos en la misma consulta.
+"""
+
+import re
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+
+
+PREFIJOS_ID = {
+    "cliente": "CL-",
+    "solicitud": "SOL-",
+    "cotizacion": "COT-",
+    "documento": "DOC-",
+}
+
+_ID_COMPLETO = re.compile(r"^[A-Z]+-\d{8}-\d{4,}$")
+
+LIMITE_RESULTADOS = 200
+
+
+def detectar_tipo_id(valor: str):
+    """Tipo de ID según su prefijo (CL-, SOL-, COT-, DOC-) o None"""
+    valor = (valor or "").strip().upper()
+    for tipo, prefijo in PREFIJOS_ID.items():
+        if valor.startswith(prefijo):
+            return tipo
+    return None
+
+
+def _condicion(columna, valor: str, exacto: bool):
+    if exacto or _ID_COMPLETO.match(valor):
+        return columna == valor
+    return columna.startswith(valor, autoescape=True)
+
+
+def buscar_prospectos_por_id(db: Session, valor: str, tipo: str = None, exacto: bool = False,
+                             limite: int = LIMITE_RESULTADOS) -> list:
+    """
+    Prospectos cuyo ID del tipo dado es `valor` o empieza por `valor`.
+
+    Args:
+        valor: ID completo o su inicio; si no trae el prefijo del tipo se le
+               antepone ("20240115" con tipo cliente busca "CL-20240115...")
+        tipo: cliente, solicitud, cotizacion o documento; por defecto se
+              deduce del prefijo
+        exacto: Solo igualdad, también para IDs incompletos
+
+    Returns:
+        Lista de Prospecto (sin repetidos), los más recientes primero
+    """
+    valor = (valor or "").strip().upper()
+    tipo = tipo or detectar_tipo_id(valor)
+    if not valor or tipo not in PREFIJOS_ID:
+        return []
+
+    prefijo = PREFIJOS_ID[tipo]
+    if not valor.startswith(prefijo):
+        valor = prefijo + valor.lstrip("-")
+
+    P = models.Prospecto
+    if tipo == "cliente":
+        condicion = _condicion(P.id_cliente, valor, exacto)
+    elif tipo == "solicitud":
+        condicion = _condicion(P.id_solicitud, valor, exacto)
+    elif tipo == "cotizacion":
+        E = models.EstadisticaCotizacion
+        condicion = P.id.in_(select(E.prospecto_id).where(_condicion(E.id_cotizacion, valor, exacto)))
+    else:
+        D = models.Documento
+        condicion = P.id.in_(select(D.prospecto_id).where(_condicion(D.id_documento, valor, exacto)))
+
+    return db.query(P).filter(condicion).order_by(P.id.desc()).limit(limite).all()
@@ -0,0 +1,75 @@
+"""
+Búsqueda rápida de prospectos para selectores con autocompletado
+
+Busca por prefijo (nombre, apellido, teléfono, ID de cliente o de solicitud)
+para que PostgreSQL resuelva cada condición con un índice en lugar de
+recorrer la tabla con LIKE '%texto%'.
+"""
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+import models
+from models import EstadoProspecto, TipoUsuario
+from utils import normalizar_numero
+
+
+LIMITE_RESULTADOS = 10
+MIN_DIGITOS_TELEFONO = 3
+
+# Los recordatorios se programan sobre prospectos aún en gestión
+ESTADOS_SELECCIONABLES = [
+    EstadoProspecto.NUEVO.value,
+    EstadoProspecto.EN_SEGUIMIENTO.value,
+    EstadoProspecto.COTIZADO.value
+]
+
+
+def buscar_prospectos_rapido(db: Session, usuario: models.Usuario, q: str, limite: int = LIMITE_RESULTADOS) -> list:
+    """
+    Prospectos activos (nuevo, en seguimiento o cotizado) cuyo nombre,
+    apellido, teléfono o IDs empiezan por `q`. Los agentes solo ven sus
+    propios prospectos.
+
+    Returns:
+        Lista de dicts con los datos que muestra el selector
+    """
+    q = (q or "").strip()
+    if not q:
+        return []
+
+    P = models.Prospecto
+    texto = q.lower()
+    condiciones = [
+        func.lower(P.nombre).startswith(texto, autoescape=True),
+        func.lower(P.apellido).startswith(texto, autoescape=True),
+        P.id_cliente.startswith(q.upper(), autoescape=True),
+        P.id_solicitud.startswith(q.upper(), autoescape=True),
+    ]
+    digitos = normalizar_numero(q)
+    if digitos and len(digitos) >= MIN_DIGITOS_TELEFONO:
+        condiciones.append(P.telefono.startswith(digitos, autoescape=True))
+
+    query = db.query(
+        P.id, P.nombre, P.apellido, P.telefono, P.destino, P.id_cliente, P.id_solicitud, P.estado
+    ).filter(
+        or_(*condiciones),
+        P.estado.in_(ESTADOS_SELECCIONABLES),
+        P.fecha_eliminacion.is_(None)
+    )
+    if usuario.tipo_usuario == TipoUsuario.AGENTE.value:
+        query = query.filter(P.agente_asignado_id == usuario.id)
+
+    filas = query.order_by(P.fecha_registro.desc()).limit(limite).all()
+    return [
+        {
+            "id": fila.id,
+            "nombre": f"{fila.nombre or ''} {fila.apellido or ''}".strip(),
+            "telefono": fila.telefono,
+            "destino": fila.destino,
+            "id_cliente": fila.id_cliente,
+            "id_solicitud": fila.id_solicitud,
+            "estado": fila.estado
+        }
+        for fila in filas
+    ]
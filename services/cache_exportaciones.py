@@ -0,0 +1,148 @@
+"""
+Caché de archivos de exportación direccionada por contenido
+
+Cada exportación se identifica por el hash de (tipo, filtros normalizados,
+alcance del usuario, versión de datos). Mientras los datos no cambien, una
+exportación repetida reutiliza el archivo ya generado. El directorio de caché
+tiene un tamaño máximo y descarta primero los archivos usados hace más tiempo.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from models import TipoUsuario
+from utils import calcular_rango_fechas, normalizar_numero
+from .metricas import registrar_acceso_cache
+from .registro import obtener_logger
+
+log = obtener_logger("exportaciones.cache")
+
+
+EXPORT_CACHE_DIR = os.path.abspath(
+    os.getenv("EXPORT_CACHE_DIR", os.path.join(os.getenv("EXPORT_DIR", "exportaciones"), "cache"))
+)
+EXPORT_CACHE_MAX_MB = int(os.getenv("EXPORT_CACHE_MAX_MB", "200"))
+
+# Filtros que se comparan con ilike: no distinguen mayúsculas
+FILTROS_SIN_MAYUSCULAS = {'destino', 'busqueda_global'}
+
+
+def normalizar_parametros(tipo: str, parametros: dict) -> dict:
+    """
+    Normaliza los filtros para que peticiones equivalentes produzcan la misma clave
+    (descarta vacíos y "todos", ignora mayúsculas en búsquedas de texto y resuelve
+    los periodos relativos del dashboard a fechas concretas).
+    """
+    normalizados = {}
+    for clave, valor in parametros.items():
+        if valor is None:
+            continue
+        valor = str(valor).strip()
+        if not valor or valor == "todos":
+            continue
+        if clave in FILTROS_SIN_MAYUSCULAS:
+            valor = valor.lower()
+        elif clave == 'telefono':
+            valor = normalizar_numero(valor)
+        normalizados[clave] = valor
+
+    if tipo == 'dashboard':
+        periodo = normalizados.get('periodo', "mes")
+        fecha_inicio, fecha_fin = calcular_rango_fechas(
+            periodo, normalizados.get('fecha_inicio'), normalizados.get('fecha_fin')
+        )
+        normalizados = {
+            'periodo': periodo,
+            'fecha_inicio': fecha_inicio.isoformat(),
+            'fecha_fin': fecha_fin.isoformat()
+        }
+
+    return normalizados
+
+
+def alcance_usuario(tipo: str, usuario) -> str:
+    """Los agentes solo exportan sus propios prospectos; el resto ve todo"""
+    if tipo == 'prospectos' and usuario.tipo_usuario not in [
+        TipoUsuario.ADMINISTRADOR.value, TipoUsuario.SUPERVISOR.value
+    ]:
+        return f"agente:{usuario.id}"
+    return "global"
+
+
+def calcular_clave_cache(tipo: str, parametros: dict, usuario, version_datos: int) -> str:
+    """Hash SHA-256 que identifica el contenido de una exportación"""
+    contenido = json.dumps({
+        'tipo': tipo,
+        'filtros': normalizar_parametros(tipo, parametros),
+        'alcance': alcance_usuario(tipo, usuario),
+        'version': version_datos
+    }, sort_keys=True)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _ruta_cache(clave: str) -> str:
+    return os.path.join(EXPORT_CACHE_DIR, f"{clave}.xlsx")
+
+
+def _enlazar_o_copiar(origen: str, destino: str):
+    """Hardlink si es posible (sin duplicar espacio); copia si no"""
+    ruta_temporal = destino + ".tmp"
+    try:
+        os.link(origen, ruta_temporal)
+    except OSError:
+        shutil.copyfile(origen, ruta_temporal)
+    os.replace(ruta_temporal, destino)
+
+
+def obtener_de_cache(clave: str, destino: str) -> bool:
+    """
+    Si la exportación está en caché, la coloca en `destino` y la marca como
+    usada recientemente.
+
+    Returns:
+        True si hubo acierto de caché
+    """
+    ruta = _ruta_cache(clave)
+    try:
+        _enlazar_o_copiar(ruta, destino)
+        os.utime(ruta)
+    except OSError:
+        registrar_acceso_cache("exportaciones", False)
+        return False
+    registrar_acceso_cache("exportaciones", True)
+    return True
+
+
+def guardar_en_cache(clave: str, ruta_archivo: str):
+    """Guarda un archivo generado en la caché y aplica el límite de tamaño"""
+    try:
+        os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+        _enlazar_o_copiar(ruta_archivo, _ruta_cache(clave))
+        os.utime(_ruta_cache(clave))
+        _aplicar_limite_tamano()
+    except OSError as e:
+        log.warning("No se pudo guardar la exportación en caché", extra={"error": str(e)})
+
+
+def _aplicar_limite_tamano():
+    """Elimina los archivos usados hace más tiempo hasta quedar bajo el límite"""
+    limite_bytes = EXPORT_CACHE_MAX_MB * 1024 * 1024
+    archivos = []
+    total = 0
+
+    for entrada in os.scandir(EXPORT_CACHE_DIR):
+        if entrada.is_file() and entrada.name.endswith(".xlsx"):
+            info = entrada.stat()
+            archivos.append((info.st_mtime, info.st_size, entrada.path))
+            total += info.st_size
+
+    for _, tamano, ruta in sorted(archivos):
+        if total <= limite_bytes:
+            break
+        try:
+            os.remove(ruta)
+            total -= tamano
+        except OSError:
+            pass
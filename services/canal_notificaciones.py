@@ -0,0 +1,223 @@
+"""
+Canal de notificaciones en tiempo real (Server-Sent Events)
+
+Cada pestaña abierta se suscribe al canal de su usuario y recibe los eventos
+sin consultar la base de datos periódicamente.
+
+Con varios workers de uvicorn el evento se publica con NOTIFY de PostgreSQL y
+un hilo en cada worker lo recibe con LISTEN y lo entrega a sus suscriptores
+locales. Si el puente con PostgreSQL no está disponible se entrega solo en el
+proceso actual.
+"""
+
+import asyncio
+import json
+import os
+import select
+import threading
+
+from sqlalchemy import text
+
+import database
+from .registro import obtener_logger
+
+log = obtener_logger("notificaciones.canal")
+
+
+CANAL_PG = "zarita_notificaciones"
+PUENTE_PG_ACTIVO = os.getenv("NOTIFICACIONES_PG_BRIDGE", "1") == "1"
+TAMANO_COLA = 100
+
+
+class CanalNotificaciones:
+    """Pub/sub en memoria por usuario, con puente opcional LISTEN/NOTIFY"""
+
+    def __init__(self):
+        self._suscriptores = {}  # usuario_id -> set de (loop, cola)
+        self._manejadores_control = []
+        self._lock = threading.Lock()
+        self._hilo_puente = None
+        self._detener_puente = threading.Event()
+        self.puente_conectado = False
+
+    # ---------- Suscripciones ----------
+
+    def suscribir(self, usuario_id: int) -> asyncio.Queue:
+        """Crea la cola de eventos de una conexión SSE (llamar desde el event loop)"""
+        cola = asyncio.Queue(maxsize=TAMANO_COLA)
+        with self._lock:
+            self._suscriptores.setdefault(usuario_id, set()).add((asyncio.get_running_loop(), cola))
+        return cola
+
+    def desuscribir(self, usuario_id: int, cola: asyncio.Queue):
+        with self._lock:
+            suscriptores = self._suscriptores.get(usuario_id)
+            if not suscriptores:
+                return
+            suscriptores.difference_update({s for s in suscriptores if s[1] is cola})
+            if not suscriptores:
+                del self._suscriptores[usuario_id]
+
+    def total_suscriptores(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._suscriptores.values())
+
+    def usuarios_suscritos(self) -> list:
+        with self._lock:
+            return list(self._suscriptores.keys())
+
+    # ---------- Publicación ----------
+
+    def publicar(self, usuario_id: int, evento: dict, db=None):
+        """
+        Publica un evento para un usuario. Puede llamarse desde cualquier hilo.
+
+        Si el puente con PostgreSQL está activo y se pasa `db`, el NOTIFY se
+        envía dentro de la transacción de esa sesión (se entrega al hacer commit).
+        """
+        if self.puente_conectado:
+            payload = json.dumps({"usuario_id": usuario_id, "evento": evento})
+            consulta = text("SELECT pg_notify(:canal, :payload)")
+            parametros = {"canal": CANAL_PG, "payload": payload}
+            try:
+                if db is not None:
+                    db.execute(consulta, parametros)
+                else:
+                    with database.engine.connect() as conn:
+                        conn.execute(consulta, parametros)
+                        conn.commit()
+                return
+            except Exception as e:
+                log.warning("Error publicando en PostgreSQL, se entrega localmente", extra={"error": str(e)})
+
+        self.entregar_local(usuario_id, evento)
+
+    def entregar_local(self, usuario_id: int, evento: dict):
+        """Entrega un evento solo a las pestañas conectadas a este worker"""
+        with self._lock:
+            suscriptores = list(self._suscriptores.get(usuario_id, ()))
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(self._encolar, cola, evento)
+            except RuntimeError:
+                pass  # Event loop ya cerrado (apagado del worker)
+
+    @staticmethod
+    def _encolar(cola: asyncio.Queue, evento: dict):
+        try:
+            cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            pass  # Pestaña que no consume: se descarta; al reconectar recibe el estado completo
+
+    # ---------- Mensajes de control entre workers ----------
+
+    def registrar_control(self, funcion):
+        """Registra una función que recibe los mensajes de control (dict)"""
+        self._manejadores_control.append(funcion)
+
+    def publicar_control(self, datos: dict, local: bool = True, db=None):
+        """
+        Difunde un mensaje de control a todos los workers.
+
+        Args:
+            local: Procesarlo también en este worker si no hay puente
+                   (False si el llamador ya lo aplicó localmente)
+            db: Sesión en cuya transacción enviar el NOTIFY (se entrega al hacer
+                commit); el worker de origen no lo recibe, usar con local=False
+        """
+        if self.puente_conectado:
+            payload = json.dumps({"control": datos, "origen": None if local else os.getpid()})
+            consulta = text("SELECT pg_notify(:canal, :payload)")
+            parametros = {"canal": CANAL_PG, "payload": payload}
+            try:
+                if db is not None:
+                    db.execute(consulta, parametros)
+                else:
+                    with database.engine.connect() as conn:
+                        conn.execute(consulta, parametros)
+                        conn.commit()
+                return
+            except Exception as e:
+                log.warning("Error difundiendo mensaje de control", extra={"error": str(e)})
+        if local:
+            self._procesar_control(datos)
+
+    def _procesar_control(self, datos: dict):
+        for funcion in self._manejadores_control:
+            try:
+                funcion(datos)
+            except Exception:
+                log.exception("Error procesando mensaje de control")
+
+    # ---------- Puente LISTEN/NOTIFY ----------
+
+    def iniciar_puente(self):
+        """Arranca el hilo que escucha NOTIFY de PostgreSQL"""
+        if not PUENTE_PG_ACTIVO or self._hilo_puente is not None:
+            return
+        self._detener_puente.clear()
+        self._hilo_puente = threading.Thread(target=self._escuchar_postgres, name="canal-notificaciones", daemon=True)
+        self._hilo_puente.start()
+
+    def detener_puente(self):
+        self._detener_puente.set()
+        if self._hilo_puente is not None:
+            self._hilo_puente.join(timeout=5)
+            self._hilo_puente = None
+
+    def _escuchar_postgres(self):
+        espera = 1
+        while not self._detener_puente.is_set():
+            conexion = None
+            try:
+                conexion = database.engine.raw_connection()
+                dbapi = conexion.driver_connection
+                dbapi.autocommit = True
+                with dbapi.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CANAL_PG}")
+                self.puente_conectado = True
+                espera = 1
+
+                while not self._detener_puente.is_set():
+                    if select.select([dbapi], [], [], 5) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        aviso = dbapi.notifies.pop(0)
+                        try:
+                            datos = json.loads(aviso.payload)
+                            if "control" in datos:
+                                # El worker de origen ya lo aplicó si no pidió eco
+                                if datos.get("origen") != os.getpid():
+                                    self._procesar_control(datos["control"])
+                            else:
+                                self.entregar_local(datos["usuario_id"], datos["evento"])
+                        except (ValueError, KeyError):
+                            pass
+            except Exception as e:
+                if self.puente_conectado:
+                    log.warning("Puente de notificaciones desconectado", extra={"error": str(e)})
+            finally:
+                self.puente_conectado = False
+                if conexion is not None:
+                    # No devolver al pool una conexión con LISTEN activo
+                    try:
+                        conexion.invalidate()
+                        conexion.close()
+                    except Exception:
+                        pass
+
+            self._detener_puente.wait(espera)
+            espera = min(espera * 2, 60)
+
+
+canal_notificaciones = CanalNotificaciones()
+
+
+def formatear_evento_sse(evento: dict, nombre: str = None) -> str:
+    """Serializa un evento en el formato de Server-Sent Events"""
+    lineas = []
+    if nombre:
+        lineas.append(f"event: {nombre}")
+    lineas.append(f"data: {json.dumps(evento, ensure_ascii=False)}")
+    return "\n".join(lineas) + "\n\n"
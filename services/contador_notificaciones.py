@@ -0,0 +1,213 @@
+"""
+Contador de notificaciones por usuario en caché
+
+El badge de la campana lee el contador de memoria en lugar de consultar la
+tabla de notificaciones en cada página. El contador de un usuario se invalida:
+- al hacer commit de una sesión que creó, modificó o borró sus notificaciones
+  (las escrituras masivas indican los usuarios afectados; si no lo hacen y
+  afectan a alguna fila, invalidan a todos),
+- cuando vence su próximo recordatorio programado,
+- en los demás workers, mediante el puente LISTEN/NOTIFY del canal de notificaciones.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import case, event, func, inspect
+from sqlalchemy.orm import Session
+
+import database
+import models
+from .canal_notificaciones import canal_notificaciones
+from .metricas import registrar_acceso_cache
+from .registro import obtener_logger
+
+log = obtener_logger("notificaciones.contador")
+
+
+TTL_CONTADOR = 600  # segundos; red de seguridad ante escrituras fuera del ORM
+MAX_USUARIOS_AVISO = 500  # Por encima, el aviso a otros workers invalida a todos (límite de NOTIFY)
+
+_contadores = {}  # usuario_id -> (contador, expira_monotonic, proximo_vencimiento)
+_lock = threading.Lock()
+
+CONTADOR_VACIO = {"no_leidas": 0, "vencidas": 0, "proximas": 0, "visibles": 0}
+
+
+def _calcular_contador(db: Session, usuario_id: int):
+    """Cuenta las notificaciones no leídas del usuario en una sola consulta"""
+    N = models.Notificacion
+    ahora = datetime.now()
+    programada_futura = (N.fecha_programada.isnot(None)) & (N.fecha_programada > ahora)
+
+    no_leidas, vencidas, proximas, proximo_vencimiento = db.query(
+        func.count(N.id),
+        func.count(case(((N.fecha_programada.isnot(None)) & (N.fecha_programada <= ahora), 1))),
+        func.count(case((programada_futura, 1))),
+        func.min(case((programada_futura, N.fecha_programada)))
+    ).filter(
+        N.usuario_id == usuario_id,
+        N.leida == False
+    ).one()
+
+    contador = {
+        "no_leidas": no_leidas,
+        "vencidas": vencidas,
+        "proximas": proximas,
+        # Lo que el usuario ya puede ver: sin programar o ya vencidas
+        "visibles": no_leidas - proximas
+    }
+    return contador, proximo_vencimiento
+
+
+def obtener_contador(usuario_id: int, db: Session = None) -> dict:
+    """
+    Contador de notificaciones del usuario: no_leidas, vencidas, proximas y visibles.
+    Solo consulta la base de datos si el valor en caché no es válido.
+    """
+    with _lock:
+        entrada = _contadores.get(usuario_id)
+    if entrada:
+        contador, expira, proximo_vencimiento = entrada
+        if time.monotonic() < expira and (proximo_vencimiento is None or datetime.now() < proximo_vencimiento):
+            registrar_acceso_cache("contador_notificaciones", True)
+            return contador
+    registrar_acceso_cache("contador_notificaciones", False)
+
+    sesion_propia = db is None
+    if sesion_propia:
+        db = database.SessionLocal()
+    try:
+        contador, proximo_vencimiento = _calcular_contador(db, usuario_id)
+    except Exception:
+        log.exception("Error calculando contador de notificaciones", extra={"usuario_id": usuario_id})
+        return dict(CONTADOR_VACIO)
+    finally:
+        if sesion_propia:
+            db.close()
+
+    with _lock:
+        _contadores[usuario_id] = (contador, time.monotonic() + TTL_CONTADOR, proximo_vencimiento)
+    return contador
+
+
+def invalidar_contadores(usuario_ids=None):
+    """
+    Invalida el contador de los usuarios dados (None = todos) en este worker
+    y avisa por SSE a sus pestañas abiertas para que refresquen el badge.
+    """
+    with _lock:
+        if usuario_ids is None:
+            _contadores.clear()
+        else:
+            for usuario_id in usuario_ids:
+                _contadores.pop(usuario_id, None)
+
+    destinatarios = canal_notificaciones.usuarios_suscritos() if usuario_ids is None else usuario_ids
+    for usuario_id in destinatarios:
+        canal_notificaciones.entregar_local(usuario_id, {"contador": True})
+
+
+def _manejar_control(datos: dict):
+    if "contadores" in datos:
+        invalidar_contadores(datos["contadores"])
+
+
+canal_notificaciones.registrar_control(_manejar_control)
+
+
+# ========== INVALIDACIÓN AUTOMÁTICA DESDE LA SESIÓN ==========
+
+def _marcar(session, usuario_ids):
+    """Acumula en la sesión los usuarios afectados (None = todos)"""
+    if usuario_ids is not None and not usuario_ids:
+        return
+    pendientes = session.info.get("contadores_sucios", set())
+    if pendientes is None or usuario_ids is None:
+        session.info["contadores_sucios"] = None
+    else:
+        session.info["contadores_sucios"] = pendientes | set(usuario_ids)
+
+
+@event.listens_for(models.Notificacion.usuario_id, "set", active_history=True)
+def _cargar_usuario_anterior(target, valor, anterior, initiator):
+    # active_history: al reasignar se carga el usuario anterior aunque el
+    # atributo esté expirado, para que quede en el historial del flush
+    pass
+
+
+@event.listens_for(database.SessionLocal, "after_flush")
+def _registrar_notificaciones_modificadas(session, flush_context):
+    usuario_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Notificacion):
+            usuario_ids.add(obj.usuario_id)
+            # Notificación reasignada: también cambia el contador del usuario anterior
+            usuario_ids.update(inspect(obj).attrs.usuario_id.history.deleted)
+    if usuario_ids:
+        _marcar(session, usuario_ids)
+
+
+def marcar_contadores(session, usuario_ids):
+    """
+    Invalida al hacer commit el contador de estos usuarios. Para escrituras
+    masivas que obtienen los afectados con RETURNING usuario_id (y se
+    ejecutan con usuarios_notificaciones=()).
+    """
+    _marcar(session, {uid for uid in usuario_ids if uid is not None})
+
+
+@event.listens_for(database.SessionLocal, "do_orm_execute")
+def _registrar_escrituras_masivas(orm_execute_state):
+    # INSERT ... SELECT, UPDATE y DELETE masivos no pasan por el flush. La opción
+    # de ejecución usuarios_notificaciones indica los usuarios afectados
+    # (() = ninguno o los marca el llamador); sin ella se invalidan todos
+    es_escritura = orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    mapper = orm_execute_state.bind_mapper
+    if not (es_escritura and mapper is not None and mapper.class_ is models.Notificacion):
+        return None
+
+    usuario_ids = orm_execute_state.execution_options.get("usuarios_notificaciones")
+    if usuario_ids is not None and not usuario_ids:
+        return None
+
+    resultado = orm_execute_state.invoke_statement()
+    # Las sentencias con RETURNING no informan rowcount: se marcan igualmente
+    if getattr(resultado, "rowcount", None) != 0:
+        _marcar(orm_execute_state.session, usuario_ids)
+    return resultado
+
+
+def _usuarios_sucios(session):
+    usuario_ids = session.info["contadores_sucios"]
+    return None if usuario_ids is None else [uid for uid in usuario_ids if uid is not None]
+
+
+@event.listens_for(database.SessionLocal, "before_commit")
+def _avisar_antes_del_commit(session):
+    # El NOTIFY va en la misma transacción: los demás workers lo reciben al
+    # hacer commit, sin pedir otra conexión al pool
+    if session.in_nested_transaction():
+        return
+    session.flush()
+    if "contadores_sucios" not in session.info:
+        return
+    usuario_ids = _usuarios_sucios(session)
+    if usuario_ids is not None and len(usuario_ids) > MAX_USUARIOS_AVISO:
+        usuario_ids = None
+    canal_notificaciones.publicar_control({"contadores": usuario_ids}, local=False, db=session)
+
+
+@event.listens_for(database.SessionLocal, "after_commit")
+def _invalidar_tras_commit(session):
+    if session.in_nested_transaction() or "contadores_sucios" not in session.info:
+        return
+    usuario_ids = _usuarios_sucios(session)
+    session.info.pop("contadores_sucios")
+    invalidar_contadores(usuario_ids)
+
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop("contadores_sucios", None)
@@ -0,0 +1,183 @@
+"""
+Bandeja de salida de correos para el CRM ZARITA!
+
+Las peticiones no envían correos: los registran en correos_salientes dentro de
+su propia transacción y una tarea programada los entrega en lotes, reutilizando
+una sola conexión SMTP por lote y reintentando con espera exponencial.
+
+Configuración (variables de entorno):
+    SMTP_HOST       Servidor SMTP. Vacío = modo simulado (solo se imprime)
+    SMTP_PORT       Puerto (por defecto 587)
+    SMTP_USER       Usuario (opcional)
+    SMTP_PASSWORD   Contraseña (opcional)
+    SMTP_STARTTLS   "1" para usar STARTTLS (por defecto "1")
+    SMTP_REMITENTE  Dirección del remitente
+
+Para pruebas locales: python -m aiosmtpd -n -l localhost:8025
+y SMTP_HOST=localhost SMTP_PORT=8025 SMTP_STARTTLS=0
+"""
+
+import os
+import smtplib
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import models
+from .registro import obtener_logger
+
+log = obtener_logger("correo")
+
+
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_REMITENTE = os.getenv("SMTP_REMITENTE", "sistema@prospectos.com")
+
+TAMANO_LOTE = 50
+MAX_INTENTOS = 6
+ESPERA_BASE_SEGUNDOS = 30
+ESPERA_MAXIMA_SEGUNDOS = 3600
+
+
+def encolar_correo(db: Session, destinatario: str, asunto: str, cuerpo: str, notificacion: models.Notificacion = None) -> models.CorreoSaliente:
+    """
+    Registra un correo en la bandeja de salida. Se guarda con el commit del
+    llamador, así el correo solo sale si la operación que lo origina se confirma.
+
+    Args:
+        notificacion: Notificación asociada; se marca email_enviado al entregarse
+    """
+    correo = models.CorreoSaliente(
+        destinatario=destinatario,
+        asunto=asunto,
+        cuerpo=cuerpo,
+        notificacion=notificacion,
+        estado="pendiente",
+        intentos=0,
+        proximo_intento=datetime.now()
+    )
+    db.add(correo)
+    return correo
+
+
+def _calcular_espera(intentos: int) -> timedelta:
+    """Espera exponencial: 30s, 60s, 120s, ... hasta 1 hora"""
+    return timedelta(seconds=min(ESPERA_BASE_SEGUNDOS * (2 ** (intentos - 1)), ESPERA_MAXIMA_SEGUNDOS))
+
+
+def _construir_mensaje(correo: models.CorreoSaliente) -> MIMEText:
+    mensaje = MIMEText(correo.cuerpo, "plain", "utf-8")
+    mensaje["Subject"] = correo.asunto
+    mensaje["From"] = SMTP_REMITENTE
+    mensaje["To"] = correo.destinatario
+    return mensaje
+
+
+def _abrir_conexion_smtp() -> smtplib.SMTP:
+    servidor = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+    if SMTP_STARTTLS:
+        servidor.starttls()
+    if SMTP_USER:
+        servidor.login(SMTP_USER, SMTP_PASSWORD)
+    return servidor
+
+
+def _registrar_fallo(correo: models.CorreoSaliente, error: Exception, ahora: datetime):
+    correo.intentos = (correo.intentos or 0) + 1
+    correo.ultimo_error = str(error)[:500]
+    if correo.intentos >= MAX_INTENTOS:
+        correo.estado = "error"
+    else:
+        correo.proximo_intento = ahora + _calcular_espera(correo.intentos)
+
+
+def _registrar_envio(correo: models.CorreoSaliente, ahora: datetime):
+    correo.estado = "enviado"
+    correo.intentos = (correo.intentos or 0) + 1
+    correo.fecha_envio = ahora
+    correo.ultimo_error = None
+
+
+def _marcar_notificaciones_enviadas(db: Session, lote: list):
+    """Actualiza email_enviado de las notificaciones del lote en una sola sentencia"""
+    ids = [c.notificacion_id for c in lote if c.estado == "enviado" and c.notificacion_id]
+    if ids:
+        # email_enviado no cambia el contador de notificaciones
+        db.execute(
+            update(models.Notificacion).where(
+                models.Notificacion.id.in_(ids)
+            ).values(email_enviado=True).execution_options(synchronize_session=False, usuarios_notificaciones=())
+        )
+
+
+def entregar_correos_pendientes(db: Session) -> int:
+    """
+    Tarea programada: entrega un lote de correos pendientes por una sola
+    conexión SMTP.
+
+    Returns:
+        Número de correos enviados
+    """
+    ahora = datetime.now()
+    lote = db.query(models.CorreoSaliente).filter(
+        models.CorreoSaliente.estado == "pendiente",
+        models.CorreoSaliente.proximo_intento <= ahora
+    ).order_by(
+        models.CorreoSaliente.proximo_intento.asc()
+    ).limit(TAMANO_LOTE).with_for_update(skip_locked=True).all()
+
+    if not lote:
+        db.rollback()
+        return 0
+
+    enviados = 0
+
+    if not SMTP_HOST:
+        # Modo simulado: mismo comportamiento que antes de la bandeja de salida
+        for correo in lote:
+            log.info("Email simulado", extra={"destinatario": correo.destinatario, "asunto": correo.asunto})
+            _registrar_envio(correo, ahora)
+            enviados += 1
+        _marcar_notificaciones_enviadas(db, lote)
+        db.commit()
+        return enviados
+
+    try:
+        servidor = _abrir_conexion_smtp()
+    except Exception as e:
+        # Servidor no disponible: todo el lote se reintenta más tarde
+        log.error("Error conectando al servidor SMTP", extra={"error": str(e)})
+        for correo in lote:
+            _registrar_fallo(correo, e, ahora)
+        db.commit()
+        return 0
+
+    try:
+        for correo in lote:
+            try:
+                servidor.send_message(_construir_mensaje(correo))
+                _registrar_envio(correo, ahora)
+                enviados += 1
+            except smtplib.SMTPServerDisconnected as e:
+                _registrar_fallo(correo, e, ahora)
+                servidor = _abrir_conexion_smtp()
+            except Exception as e:
+                log.error("Error enviando email", extra={"destinatario": correo.destinatario, "error": str(e)})
+                _registrar_fallo(correo, e, ahora)
+    except Exception as e:
+        # Falló la reconexión: el resto del lote queda pendiente para el próximo ciclo
+        log.error("Conexión SMTP perdida", extra={"error": str(e)})
+    finally:
+        try:
+            servidor.quit()
+        except Exception:
+            pass
+
+    _marcar_notificaciones_enviadas(db, lote)
+    db.commit()
+    return enviados
@@ -0,0 +1,215 @@
+"""
+Caché en memoria de datos de referencia para el CRM ZARITA!
+
+Listas pequeñas que casi no cambian y que se consultan en casi todas las
+páginas: agentes, administradores, medios de ingreso, destinos y alias de
+destinos. Se guardan como registros inmutables (no objetos ORM, que quedarían
+ligados a una sesión).
+
+Cada lista tiene un número de versión. Se invalida:
+- al hacer commit de una sesión que creó, modificó o borró usuarios, medios
+  de ingreso, destinos o alias (altas, ediciones, bajas e importaciones),
+- en los demás workers, mediante el puente LISTEN/NOTIFY del canal de notificaciones,
+- por tiempo (TTL) como red de seguridad ante escrituras fuera del ORM.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event
+
+import database
+import models
+from models import TipoUsuario
+from .canal_notificaciones import canal_notificaciones
+from .metricas import registrar_acceso_cache
+
+
+TTL_DATOS_REFERENCIA = 600  # segundos
+
+UsuarioRef = namedtuple("UsuarioRef", ["id", "username", "email", "tipo_usuario", "activo"])
+MedioIngresoRef = namedtuple("MedioIngresoRef", ["id", "nombre", "activo"])
+DestinoRef = namedtuple("DestinoRef", ["id", "nombre", "pais", "continente", "activo"])
+
+# Tabla de origen de cada lista: un cambio en el modelo invalida sus listas
+LISTAS_POR_MODELO = {
+    models.Usuario: ("usuarios",),
+    models.MedioIngreso: ("medios_ingreso",),
+    models.Destino: ("destinos", "destinos_por_nombre", "alias_destinos"),
+    models.DestinoAlias: ("alias_destinos",),
+}
+
+_cache = {}  # lista -> (datos, expira_monotonic)
+_versiones = {}  # lista -> versión (aumenta con cada invalidación)
+_lock = threading.Lock()
+
+
+def _cargar(lista: str, db):
+    if lista == "usuarios":
+        U = models.Usuario
+        filas = db.query(U.id, U.username, U.email, U.tipo_usuario, U.activo).order_by(U.id).all()
+        return tuple(UsuarioRef(*fila) for fila in filas)
+    if lista == "medios_ingreso":
+        M = models.MedioIngreso
+        filas = db.query(M.id, M.nombre, M.activo).order_by(M.id).all()
+        return tuple(MedioIngresoRef(*fila) for fila in filas)
+    if lista == "destinos":
+        D = models.Destino
+        filas = db.query(D.id, D.nombre, D.pais, D.continente, D.activo).order_by(D.nombre).all()
+        return tuple(DestinoRef(*fila) for fila in filas)
+    if lista == "destinos_por_nombre":
+        from .autocompletado_destinos import normalizar_busqueda
+        # Ante nombres repetidos gana el activo (se inserta el último)
+        destinos = sorted(_obtener("destinos", db), key=lambda d: d.activo == 1)
+        return {normalizar_busqueda(d.nombre): d for d in destinos}
+    if lista == "alias_destinos":
+        A = models.DestinoAlias
+        D = models.Destino
+        filas = db.query(A.alias, D.id, D.nombre, A.origen).join(D, D.id == A.destino_id).all()
+        return {alias: (destino_id, nombre, origen) for alias, destino_id, nombre, origen in filas}
+    raise ValueError(f"Lista de referencia desconocida: {lista}")
+
+
+def _obtener(lista: str, db=None) -> tuple:
+    """Devuelve la lista desde memoria o la carga si no es válida"""
+    with _lock:
+        entrada = _cache.get(lista)
+        version = _versiones.get(lista, 0)
+    if entrada and time.monotonic() < entrada[1]:
+        registrar_acceso_cache(f"datos_referencia_{lista}", True)
+        return entrada[0]
+    registrar_acceso_cache(f"datos_referencia_{lista}", False)
+
+    # La caché se comparte entre peticiones: no cargarla de una réplica retrasada
+    sesion_propia = db is None or (
+        database.replica_engine is not None and db.get_bind() is database.replica_engine
+    )
+    if sesion_propia:
+        db = database.SessionLocal()
+    try:
+        datos = _cargar(lista, db)
+    finally:
+        if sesion_propia:
+            db.close()
+
+    with _lock:
+        # Si se invalidó mientras se cargaba, se devuelve el dato pero no se guarda
+        if _versiones.get(lista, 0) == version:
+            _cache[lista] = (datos, time.monotonic() + TTL_DATOS_REFERENCIA)
+    return datos
+
+
+def version_datos_referencia(lista: str) -> int:
+    """Versión actual de una lista (para ETags o índices derivados)"""
+    with _lock:
+        return _versiones.get(lista, 0)
+
+
+def invalidar_datos_referencia(listas=None):
+    """Invalida las listas dadas (None = todas) en este worker"""
+    with _lock:
+        for lista in (listas if listas is not None else list(_cache.keys()) + list(_versiones.keys())):
+            _cache.pop(lista, None)
+            _versiones[lista] = _versiones.get(lista, 0) + 1
+
+
+# ========== CONSULTAS ==========
+
+def obtener_usuarios(db=None) -> tuple:
+    """Todos los usuarios (activos e inactivos)"""
+    return _obtener("usuarios", db)
+
+
+def obtener_agentes(db=None, solo_activos: bool = True) -> list:
+    """Usuarios de tipo agente, por defecto solo los activos"""
+    return [
+        u for u in obtener_usuarios(db)
+        if u.tipo_usuario == TipoUsuario.AGENTE.value and (u.activo == 1 or not solo_activos)
+    ]
+
+
+def obtener_ids_admins(db=None) -> list:
+    """IDs de administradores y supervisores"""
+    return [
+        u.id for u in obtener_usuarios(db)
+        if u.tipo_usuario in (TipoUsuario.ADMINISTRADOR.value, TipoUsuario.SUPERVISOR.value)
+    ]
+
+
+def obtener_medios_ingreso(db=None) -> tuple:
+    return _obtener("medios_ingreso", db)
+
+
+def obtener_destinos(db=None, solo_activos: bool = True) -> list:
+    """Catálogo de destinos ordenado por nombre"""
+    return [d for d in _obtener("destinos", db) if d.activo == 1 or not solo_activos]
+
+
+def obtener_destinos_por_nombre(db=None) -> dict:
+    """Nombre normalizado -> DestinoRef de todo el catálogo (no modificar: es compartido)"""
+    return _obtener("destinos_por_nombre", db)
+
+
+def obtener_alias_destinos(db=None) -> dict:
+    """Alias normalizado -> (destino_id, nombre, origen) (no modificar: es compartido)"""
+    return _obtener("alias_destinos", db)
+
+
+# ========== INVALIDACIÓN AUTOMÁTICA DESDE LA SESIÓN ==========
+
+def _manejar_control(datos: dict):
+    if "datos_referencia" in datos:
+        invalidar_datos_referencia(datos["datos_referencia"])
+
+
+canal_notificaciones.registrar_control(_manejar_control)
+
+
+def _listas_de(mapper) -> tuple:
+    if mapper is None:
+        return ()
+    return LISTAS_POR_MODELO.get(mapper.class_, ())
+
+
+def _marcar(session, listas):
+    if listas:
+        session.info["datos_referencia_sucios"] = session.info.get("datos_referencia_sucios", set()) | set(listas)
+
+
+@event.listens_for(database.SessionLocal, "after_flush")
+def _registrar_cambios_referencia(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        _marcar(session, LISTAS_POR_MODELO.get(type(obj), ()))
+
+
+@event.listens_for(database.SessionLocal, "do_orm_execute")
+def _registrar_escrituras_masivas(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _marcar(orm_execute_state.session, _listas_de(orm_execute_state.bind_mapper))
+
+
+@event.listens_for(database.SessionLocal, "before_commit")
+def _avisar_antes_del_commit(session):
+    # El NOTIFY va en la misma transacción: los demás workers lo reciben al
+    # hacer commit, sin pedir otra conexión al pool
+    if session.in_nested_transaction():
+        return
+    session.flush()
+    listas = session.info.get("datos_referencia_sucios")
+    if listas:
+        canal_notificaciones.publicar_control({"datos_referencia": sorted(listas)}, local=False, db=session)
+
+
+@event.listens_for(database.SessionLocal, "after_commit")
+def _invalidar_tras_commit(session):
+    if session.in_nested_transaction():
+        return
+    listas = session.info.pop("datos_referencia_sucios", None)
+    if listas:
+        invalidar_datos_referencia(sorted(listas))
+
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop("datos_referencia_sucios", None)
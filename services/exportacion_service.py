@@ -0,0 +1,669 @@
+"""
+Servicio de exportación a Excel para el CRM ZARITA!
+
+Todas las hojas se escriben con EscritorExcel, que calcula el ancho de las
+columnas mientras se agregan las filas y aplica el estilo de encabezado una
+sola vez, evitando recorrer de nuevo cada celda de la hoja terminada.
+"""
+
+import io
+from datetime import datetime
+from typing import Iterable, List
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Session
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.utils import get_column_letter
+
+import models
+from models import TipoUsuario, EstadoProspecto
+from utils import normalizar_numero
+from .registro import obtener_logger
+
+log = obtener_logger("exportaciones.excel")
+
+
+ESTILO_ENCABEZADO = "zarita_encabezado"
+
+
+class HojaExcel:
+    """Hoja de un EscritorExcel que registra el ancho máximo por columna."""
+
+    def __init__(self, worksheet, columnas: List[str], ancho_maximo: int, auto_filtro: bool = False):
+        self.worksheet = worksheet
+        self.columnas = columnas
+        self.ancho_maximo = ancho_maximo
+        self.auto_filtro = auto_filtro
+        self.anchos = [len(str(c)) for c in columnas]
+        self.filas = 0
+
+        worksheet.append(columnas)
+        for cell in worksheet[1]:
+            cell.style = ESTILO_ENCABEZADO
+
+    def agregar_fila(self, valores: Iterable):
+        """Agrega una fila (lista de valores en el orden de las columnas)"""
+        valores = list(valores)
+        for i, valor in enumerate(valores):
+            if valor is None:
+                continue
+            largo = len(str(valor))
+            if largo > self.anchos[i]:
+                self.anchos[i] = largo
+        self.worksheet.append(valores)
+        self.filas += 1
+
+    def agregar_filas(self, filas: Iterable[Iterable]):
+        for valores in filas:
+            self.agregar_fila(valores)
+
+    def finalizar(self):
+        """Aplica los anchos calculados (y el filtro automático si se pidió)"""
+        for i, ancho in enumerate(self.anchos, start=1):
+            self.worksheet.column_dimensions[get_column_letter(i)].width = min(ancho + 2, self.ancho_maximo)
+
+        if self.auto_filtro:
+            ultima_columna = get_column_letter(len(self.columnas))
+            self.worksheet.auto_filter.ref = f"A1:{ultima_columna}{self.filas + 1}"
+
+
+class EscritorExcel:
+    """
+    Construye un libro Excel con formato uniforme para todas las exportaciones.
+
+    Uso:
+        escritor = EscritorExcel()
+        hoja = escritor.crear_hoja('Prospectos', ['ID', 'Nombre'], ancho_maximo=50)
+        hoja.agregar_fila([1, 'ANA'])
+        output = escritor.guardar()
+    """
+
+    def __init__(self):
+        self.workbook = Workbook()
+        self.workbook.remove(self.workbook.active)
+        self.hojas: List[HojaExcel] = []
+
+        estilo = NamedStyle(name=ESTILO_ENCABEZADO)
+        estilo.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        estilo.font = Font(color="FFFFFF", bold=True)
+        estilo.alignment = Alignment(horizontal="center", vertical="center")
+        self.workbook.add_named_style(estilo)
+
+    def crear_hoja(self, titulo: str, columnas: List[str], ancho_maximo: int = 50, auto_filtro: bool = False) -> HojaExcel:
+        hoja = HojaExcel(self.workbook.create_sheet(title=titulo), columnas, ancho_maximo, auto_filtro)
+        self.hojas.append(hoja)
+        return hoja
+
+    def guardar(self, destino=None):
+        """
+        Finaliza todas las hojas y guarda el libro.
+
+        Args:
+            destino: Ruta o archivo donde guardar. Si es None se usa un BytesIO.
+
+        Returns:
+            El BytesIO posicionado al inicio, o la ruta recibida.
+        """
+        for hoja in self.hojas:
+            hoja.finalizar()
+
+        if destino is None:
+            output = io.BytesIO()
+            self.workbook.save(output)
+            output.seek(0)
+            return output
+
+        self.workbook.save(destino)
+        return destino
+
+
+# ========== CONSULTAS DE EXPORTACIÓN ==========
+
+def _parsear_fecha_filtro(valor: str, fin_del_dia: bool = False):
+    """Convierte una fecha dd/mm/aaaa del filtro a datetime (None si no es válida)"""
+    if not valor:
+        return None
+    try:
+        fecha = datetime.strptime(valor, "%d/%m/%Y").date()
+    except ValueError:
+        return None
+    return datetime.combine(fecha, datetime.max.time() if fin_del_dia else datetime.min.time())
+
+
+def construir_query_prospectos_exportacion(db: Session, usuario: models.Usuario, filtros: dict):
+    """
+    Construye la consulta de prospectos a exportar a partir de los filtros
+    de la lista de prospectos.
+
+    Args:
+        db: Sesión de base de datos
+        usuario: Usuario que solicita la exportación (los agentes solo ven lo suyo)
+        filtros: Dict con destino, telefono, medio_ingreso_id, agente_asignado_id,
+                 estado, busqueda_global, fecha_inicio y fecha_fin (todos opcionales)
+
+    Returns:
+        Query de models.Prospecto sin orden ni límite
+    """
+    query = db.query(models.Prospecto).filter(
+        models.Prospecto.fecha_eliminacion.is_(None)
+    )
+
+    # Filtrar por agente si no es admin
+    if usuario.tipo_usuario not in [TipoUsuario.ADMINISTRADOR.value, TipoUsuario.SUPERVISOR.value]:
+        query = query.filter(models.Prospecto.agente_asignado_id == usuario.id)
+
+    destino = filtros.get('destino')
+    if destino:
+        query = query.filter(models.Prospecto.destino.ilike(f"%{destino}%"))
+
+    telefono = filtros.get('telefono')
+    if telefono:
+        telefono_normalizado = normalizar_numero(telefono)
+        query = query.filter(
+            or_(
+                func.replace(func.replace(models.Prospecto.telefono, ' ', ''), '-', '').ilike(f"%{telefono_normalizado}%"),
+                func.replace(func.replace(models.Prospecto.telefono_secundario, ' ', ''), '-', '').ilike(f"%{telefono_normalizado}%")
+            )
+        )
+
+    medio_ingreso_id = filtros.get('medio_ingreso_id')
+    if medio_ingreso_id and medio_ingreso_id != "todos":
+        query = query.filter(models.Prospecto.medio_ingreso_id == int(medio_ingreso_id))
+
+    agente_asignado_id = filtros.get('agente_asignado_id')
+    if agente_asignado_id and agente_asignado_id != "todos":
+        if agente_asignado_id == "sin_asignar":
+            query = query.filter(models.Prospecto.agente_asignado_id.is_(None))
+        else:
+            query = query.filter(models.Prospecto.agente_asignado_id == int(agente_asignado_id))
+
+    estado = filtros.get('estado')
+    if estado and estado != "todos":
+        query = query.filter(models.Prospecto.estado == estado)
+
+    busqueda_global = filtros.get('busqueda_global')
+    if busqueda_global:
+        busqueda = f"%{busqueda_global}%"
+        query = query.filter(
+            or_(
+                models.Prospecto.nombre.ilike(busqueda),
+                models.Prospecto.apellido.ilike(busqueda),
+                models.Prospecto.telefono.ilike(busqueda),
+                models.Prospecto.correo_electronico.ilike(busqueda),
+                models.Prospecto.id_cliente.ilike(busqueda)
+            )
+        )
+
+    # Filtros de fecha
+    fecha_inicio_dt = _parsear_fecha_filtro(filtros.get('fecha_inicio'))
+    if fecha_inicio_dt:
+        query = query.filter(models.Prospecto.fecha_registro >= fecha_inicio_dt)
+
+    fecha_fin_dt = _parsear_fecha_filtro(filtros.get('fecha_fin'), fin_del_dia=True)
+    if fecha_fin_dt:
+        query = query.filter(models.Prospecto.fecha_registro <= fecha_fin_dt)
+
+    return query
+
+
+def construir_query_clientes_ganados(db: Session, fecha_inicio: str = None, fecha_fin: str = None):
+    """
+    Construye la consulta de clientes ganados, filtrando por fecha de compra.
+
+    Returns:
+        Query de models.Prospecto sin orden ni límite
+    """
+    query = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.GANADO.value,
+        models.Prospecto.fecha_eliminacion.is_(None)
+    )
+
+    fecha_inicio_dt = _parsear_fecha_filtro(fecha_inicio)
+    if fecha_inicio_dt:
+        query = query.filter(models.Prospecto.fecha_compra >= fecha_inicio_dt)
+
+    fecha_fin_dt = _parsear_fecha_filtro(fecha_fin, fin_del_dia=True)
+    if fecha_fin_dt:
+        query = query.filter(models.Prospecto.fecha_compra <= fecha_fin_dt)
+
+    return query
+
+
+def recopilar_estadisticas_dashboard(db: Session, fecha_inicio_obj, fecha_fin_obj) -> dict:
+    """
+    Recopila las estadísticas del dashboard para el rango de fechas dado,
+    en el formato que espera generar_excel_estadisticas().
+    """
+    fecha_inicio_dt = datetime.combine(fecha_inicio_obj, datetime.min.time())
+    fecha_fin_dt = datetime.combine(fecha_fin_obj, datetime.max.time())
+
+    # Recopilar estadísticas (similar al dashboard)
+    stats = {}
+
+    # Total de prospectos
+    stats['total_prospectos'] = db.query(models.Prospecto).filter(
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    # Prospectos con/sin datos
+    stats['prospectos_con_datos'] = db.query(models.Prospecto).filter(
+        models.Prospecto.tiene_datos_completos == True,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    stats['prospectos_sin_datos'] = db.query(models.Prospecto).filter(
+        models.Prospecto.tiene_datos_completos == False,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    # Clientes sin asignar
+    stats['clientes_sin_asignar'] = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.NUEVO.value,
+        models.Prospecto.agente_asignado_id == None,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    # Clientes asignados
+    stats['clientes_asignados'] = db.query(models.Prospecto).filter(
+        models.Prospecto.agente_asignado_id != None,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    # Destinos
+    destinos_query = db.query(models.Prospecto.destino).filter(
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt,
+        models.Prospecto.destino.isnot(None),
+        models.Prospecto.destino != ''
+    ).distinct().all()
+    stats['destinos_count'] = len(destinos_query)
+
+    # Ventas
+    stats['ventas_count'] = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.GANADO.value,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    # Por estado
+    stats['prospectos_nuevos'] = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.NUEVO.value,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    stats['prospectos_seguimiento'] = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.EN_SEGUIMIENTO.value,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    stats['prospectos_cotizados'] = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.COTIZADO.value,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    stats['prospectos_ganados'] = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.GANADO.value,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    stats['prospectos_perdidos'] = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.CERRADO_PERDIDO.value,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    stats['ventas_canceladas'] = db.query(models.Prospecto).filter(
+        models.Prospecto.estado == EstadoProspecto.VENTA_CANCELADA.value,
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt
+    ).count()
+
+    # Destinos populares
+    stats['destinos_populares'] = db.query(
+        models.Prospecto.destino,
+        func.count(models.Prospecto.id).label('count')
+    ).filter(
+        models.Prospecto.fecha_registro >= fecha_inicio_dt,
+        models.Prospecto.fecha_registro <= fecha_fin_dt,
+        models.Prospecto.destino.isnot(None),
+        models.Prospecto.destino != ''
+    ).group_by(models.Prospecto.destino).order_by(func.count(models.Prospecto.id).desc()).limit(10).all()
+
+    # Conversión por agente
+    conversion_agentes = []
+    agentes = db.query(models.Usuario).filter(
+        models.Usuario.tipo_usuario == TipoUsuario.AGENTE.value,
+        models.Usuario.activo == 1
+    ).all()
+
+    for agente in agentes:
+        total_agente = db.query(models.Prospecto).filter(
+            models.Prospecto.agente_asignado_id == agente.id,
+            models.Prospecto.fecha_registro >= fecha_inicio_dt,
+            models.Prospecto.fecha_registro <= fecha_fin_dt
+        ).count()
+
+        ganados_agente = db.query(models.HistorialEstado).filter(
+            models.HistorialEstado.usuario_id == agente.id,
+            models.HistorialEstado.estado_nuevo == EstadoProspecto.GANADO.value,
+            models.HistorialEstado.fecha_cambio >= fecha_inicio_dt,
+            models.HistorialEstado.fecha_cambio <= fecha_fin_dt
+        ).count()
+
+        cotizados_agente = db.query(models.EstadisticaCotizacion).filter(
+            models.EstadisticaCotizacion.agente_id == agente.id,
+            models.EstadisticaCotizacion.fecha_cotizacion >= fecha_inicio_obj,
+            models.EstadisticaCotizacion.fecha_cotizacion <= fecha_fin_obj
+        ).count()
+
+        conversion_agentes.append({
+            'username': agente.username,
+            'total_prospectos': total_agente,
+            'cotizados': cotizados_agente,
+            'ganados': ganados_agente
+        })
+
+    stats['conversion_agentes'] = conversion_agentes
+
+    return stats
+
+
+def consultar_prospectos_exportacion(db: Session, query, orden, limite: int = None):
+    """
+    Obtiene los prospectos a exportar junto con los datos que muestra el Excel,
+    en una sola consulta (sin cargas perezosas por fila).
+
+    La fecha de la última interacción sale de un subquery agrupado restringido
+    a los prospectos filtrados; el medio de ingreso y el agente se unen por JOIN.
+
+    Args:
+        db: Sesión de base de datos
+        query: Query de models.Prospecto con los filtros ya aplicados (sin orden ni límite)
+        orden: Criterio de ordenamiento (ej: models.Prospecto.fecha_registro.desc())
+        limite: Máximo de filas a devolver (opcional)
+
+    Returns:
+        Lista de filas con atributos Prospecto, medio_ingreso_nombre,
+        agente_username y ultima_interaccion
+    """
+    ids_filtrados = query.with_entities(models.Prospecto.id).statement
+
+    ultima = db.query(
+        models.Interaccion.prospecto_id.label('prospecto_id'),
+        func.max(models.Interaccion.fecha_creacion).label('ultima_interaccion')
+    ).filter(
+        models.Interaccion.prospecto_id.in_(ids_filtrados)
+    ).group_by(models.Interaccion.prospecto_id).subquery()
+
+    query = query.outerjoin(
+        models.MedioIngreso, models.MedioIngreso.id == models.Prospecto.medio_ingreso_id
+    ).outerjoin(
+        models.Usuario, models.Usuario.id == models.Prospecto.agente_asignado_id
+    ).outerjoin(
+        ultima, ultima.c.prospecto_id == models.Prospecto.id
+    ).add_columns(
+        models.MedioIngreso.nombre.label('medio_ingreso_nombre'),
+        models.Usuario.username.label('agente_username'),
+        ultima.c.ultima_interaccion
+    ).order_by(orden)
+
+    if limite:
+        query = query.limit(limite)
+
+    return query.all()
+
+
+ESTADOS_ACTIVOS = [
+    EstadoProspecto.NUEVO.value,
+    EstadoProspecto.EN_SEGUIMIENTO.value,
+    EstadoProspecto.COTIZADO.value
+]
+ESTADOS_CERRADOS = [EstadoProspecto.CERRADO_PERDIDO.value, EstadoProspecto.VENTA_CANCELADA.value]
+
+
+def consultar_conteos_prospectos_por_agente(db: Session) -> dict:
+    """
+    Cuenta los prospectos asignados a cada agente con un único COUNT agrupado
+    (excluye prospectos eliminados).
+
+    Returns:
+        Dict {agente_id: {'total', 'activos', 'cerrados', 'ganados'}}
+    """
+    filas = db.query(
+        models.Prospecto.agente_asignado_id,
+        func.count(models.Prospecto.id),
+        func.count(case((models.Prospecto.estado.in_(ESTADOS_ACTIVOS), 1))),
+        func.count(case((models.Prospecto.estado.in_(ESTADOS_CERRADOS), 1))),
+        func.count(case((models.Prospecto.estado == EstadoProspecto.GANADO.value, 1)))
+    ).filter(
+        models.Prospecto.agente_asignado_id.isnot(None),
+        models.Prospecto.fecha_eliminacion.is_(None)
+    ).group_by(models.Prospecto.agente_asignado_id).all()
+
+    return {
+        agente_id: {'total': total, 'activos': activos, 'cerrados': cerrados, 'ganados': ganados}
+        for agente_id, total, activos, cerrados, ganados in filas
+    }
+
+
+# ========== GENERADORES DE ARCHIVOS ==========
+
+COLUMNAS_PROSPECTOS = [
+    'ID Cliente', 'Nombre', 'Apellido', 'Teléfono', 'Teléfono Secundario', 'Email',
+    'Ciudad Origen', 'Destino', 'Fecha Ida', 'Fecha Vuelta', 'Adultos', 'Niños', 'Infantes',
+    'Medio Ingreso', 'Agente Asignado', 'Estado', 'Fecha Registro', 'Última Interacción',
+    'Cliente Recurrente', 'Datos Completos', 'Observaciones'
+]
+
+
+def generar_excel_prospectos(filas, filename="prospectos_export.xlsx"):
+    """
+    Genera archivo Excel con lista de prospectos
+
+    Args:
+        filas: Resultado de consultar_prospectos_exportacion()
+    """
+    try:
+        escritor = EscritorExcel()
+        hoja = escritor.crear_hoja('Prospectos', COLUMNAS_PROSPECTOS, ancho_maximo=50, auto_filtro=True)
+
+        for fila in filas:
+            p = fila.Prospecto
+            ultima_interaccion = ""
+            if fila.ultima_interaccion:
+                ultima_interaccion = fila.ultima_interaccion.strftime("%d/%m/%Y %H:%M")
+
+            hoja.agregar_fila([
+                p.id_cliente or f"CL-{p.id:04d}",
+                p.nombre,
+                p.apellido,
+                p.telefono or "",
+                p.telefono_secundario or "",
+                p.correo_electronico or "",
+                p.ciudad_origen or "",
+                p.destino or "",
+                p.fecha_ida.strftime("%d/%m/%Y") if p.fecha_ida else "",
+                p.fecha_vuelta.strftime("%d/%m/%Y") if p.fecha_vuelta else "",
+                p.pasajeros_adultos or 0,
+                p.pasajeros_ninos or 0,
+                p.pasajeros_infantes or 0,
+                fila.medio_ingreso_nombre or "",
+                fila.agente_username or "Sin asignar",
+                p.estado.replace("_", " ").title(),
+                p.fecha_registro.strftime("%d/%m/%Y %H:%M"),
+                ultima_interaccion,
+                "Sí" if p.cliente_recurrente else "No",
+                "Sí" if p.tiene_datos_completos else "No",
+                p.observaciones or ""
+            ])
+
+        return escritor.guardar()
+
+    except Exception:
+        log.exception("Error generando Excel de prospectos")
+        return None
+
+
+def generar_excel_estadisticas(stats, periodo, fecha_inicio, fecha_fin, filename="dashboard_export.xlsx"):
+    """
+    Genera archivo Excel con estadísticas del dashboard
+    Múltiples hojas: Resumen, Por Estado, Por Agente, Destinos
+    """
+    try:
+        escritor = EscritorExcel()
+
+        # Hoja 1: Resumen General
+        resumen = escritor.crear_hoja('Resumen General', ['Métrica', 'Valor'], ancho_maximo=40)
+        resumen.agregar_filas([
+            ('Periodo', periodo.title()),
+            ('Fecha Inicio', fecha_inicio.strftime("%d/%m/%Y")),
+            ('Fecha Fin', fecha_fin.strftime("%d/%m/%Y")),
+            ('', ''),
+            ('Total Prospectos', stats.get('total_prospectos', 0)),
+            ('Prospectos con Datos Completos', stats.get('prospectos_con_datos', 0)),
+            ('Prospectos sin Datos', stats.get('prospectos_sin_datos', 0)),
+            ('Clientes Sin Asignar', stats.get('clientes_sin_asignar', 0)),
+            ('Clientes Asignados', stats.get('clientes_asignados', 0)),
+            ('Destinos Únicos', stats.get('destinos_count', 0)),
+            ('Ventas Cerradas', stats.get('ventas_count', 0)),
+            ('', ''),
+            ('Prospectos Nuevos', stats.get('prospectos_nuevos', 0)),
+            ('En Seguimiento', stats.get('prospectos_seguimiento', 0)),
+            ('Cotizados', stats.get('prospectos_cotizados', 0)),
+            ('Ganados', stats.get('prospectos_ganados', 0)),
+            ('Perdidos', stats.get('prospectos_perdidos', 0)),
+            ('Ventas Canceladas', stats.get('ventas_canceladas', 0))
+        ])
+
+        # Hoja 2: Por Estado
+        estados = escritor.crear_hoja('Por Estado', ['Estado', 'Cantidad'], ancho_maximo=40)
+        estados.agregar_filas([
+            ('Nuevo', stats.get('prospectos_nuevos', 0)),
+            ('En Seguimiento', stats.get('prospectos_seguimiento', 0)),
+            ('Cotizado', stats.get('prospectos_cotizados', 0)),
+            ('Ganado', stats.get('prospectos_ganados', 0)),
+            ('Perdido', stats.get('prospectos_perdidos', 0)),
+            ('Venta Cancelada', stats.get('ventas_canceladas', 0))
+        ])
+
+        # Hoja 3: Por Agente
+        if stats.get('conversion_agentes'):
+            agentes = escritor.crear_hoja(
+                'Por Agente',
+                ['Agente', 'Total Prospectos', 'Cotizados', 'Ganados', 'Tasa Conversión'],
+                ancho_maximo=40
+            )
+            for agente in stats['conversion_agentes']:
+                tasa = (agente['ganados'] / agente['total_prospectos'] * 100) if agente['total_prospectos'] > 0 else 0
+                agentes.agregar_fila([
+                    agente['username'],
+                    agente['total_prospectos'],
+                    agente['cotizados'],
+                    agente['ganados'],
+                    f"{tasa:.1f}%"
+                ])
+
+        # Hoja 4: Destinos Populares
+        if stats.get('destinos_populares'):
+            destinos = escritor.crear_hoja('Destinos Populares', ['Destino', 'Cantidad'], ancho_maximo=40)
+            for destino, count in stats['destinos_populares']:
+                destinos.agregar_fila([destino, count])
+
+        return escritor.guardar()
+
+    except Exception:
+        log.exception("Error generando Excel de estadísticas")
+        return None
+
+
+def generar_excel_interacciones(interacciones, prospecto, filename="interacciones_export.xlsx"):
+    """
+    Genera archivo Excel con historial de interacciones
+    """
+    try:
+        escritor = EscritorExcel()
+
+        # Información del prospecto
+        info = escritor.crear_hoja('Información', ['Campo', 'Valor'], ancho_maximo=60)
+        info.agregar_filas([
+            ('ID Cliente', prospecto.id_cliente or f"CL-{prospecto.id:04d}"),
+            ('Nombre', f"{prospecto.nombre} {prospecto.apellido}"),
+            ('Teléfono', prospecto.telefono or ""),
+            ('Email', prospecto.correo_electronico or ""),
+            ('Estado Actual', prospecto.estado.replace("_", " ").title())
+        ])
+
+        # Historial de interacciones
+        historial = escritor.crear_hoja(
+            'Historial',
+            ['Fecha', 'Usuario', 'Tipo', 'Descripción', 'Estado Anterior', 'Estado Nuevo'],
+            ancho_maximo=60
+        )
+        for interaccion in interacciones:
+            historial.agregar_fila([
+                interaccion.fecha_creacion.strftime("%d/%m/%Y %H:%M"),
+                interaccion.usuario.username if interaccion.usuario else "Sistema",
+                interaccion.tipo_interaccion.replace("_", " ").title() if interaccion.tipo_interaccion else "General",
+                interaccion.descripcion,
+                interaccion.estado_anterior.replace("_", " ").title() if interaccion.estado_anterior else "",
+                interaccion.estado_nuevo.replace("_", " ").title() if interaccion.estado_nuevo else ""
+            ])
+
+        return escritor.guardar()
+
+    except Exception:
+        log.exception("Error generando Excel de interacciones")
+        return None
+
+
+def generar_excel_usuarios(usuarios, conteos, filename="usuarios_export.xlsx"):
+    """
+    Genera archivo Excel con lista de usuarios del sistema
+
+    Args:
+        usuarios: Lista de models.Usuario
+        conteos: Resultado de consultar_conteos_prospectos_por_agente()
+    """
+    try:
+        escritor = EscritorExcel()
+        hoja = escritor.crear_hoja(
+            'Usuarios',
+            ['ID', 'Username', 'Email', 'Tipo Usuario', 'Estado', 'Fecha Creación',
+             'Prospectos Asignados', 'Activos', 'Cerrados', 'Ganados'],
+            ancho_maximo=40,
+            auto_filtro=True
+        )
+
+        sin_prospectos = {'total': 0, 'activos': 0, 'cerrados': 0, 'ganados': 0}
+
+        for u in usuarios:
+            conteo = conteos.get(u.id, sin_prospectos)
+
+            hoja.agregar_fila([
+                u.id,
+                u.username,
+                u.email,
+                u.tipo_usuario.title(),
+                'Activo' if u.activo else 'Inactivo',
+                u.fecha_creacion.strftime("%d/%m/%Y %H:%M"),
+                conteo['total'],
+                conteo['activos'],
+                conteo['cerrados'],
+                conteo['ganados']
+            ])
+
+        return escritor.guardar()
+
+    except Exception:
+        log.exception("Error generando Excel de usuarios")
+        return None
@@ -0,0 +1,194 @@
+"""
+Métricas de Prometheus para el CRM ZARITA!
+
+Se exponen en /metrics. Con varios workers de uvicorn (y los procesos del pool
+de exportaciones) hay que definir PROMETHEUS_MULTIPROC_DIR con un directorio
+compartido y vacío al arrancar: cada proceso escribe sus valores ahí y
+/metrics los combina. Sin esa variable se exportan solo los del proceso actual.
+
+Métricas:
+- crm_http_duracion_segundos: latencia por método, ruta y código
+- crm_sql_consultas_por_peticion: sentencias SQL por petición y ruta
+- crm_db_pool_*: conexiones del pool de SQLAlchemy (suma de los workers vivos)
+- crm_db_replica_retraso_segundos: último retraso medido de la réplica de lectura
+- crm_event_loop_retraso_segundos: retraso del event loop de cada worker
+- crm_exportacion_duracion_segundos / crm_importacion_duracion_segundos
+- crm_trabajos_exportacion / crm_correos_salientes: colas por estado (leídas de la BD)
+- crm_tarea_programada_*: ejecuciones y duración de las tareas del planificador
+- crm_cache_consultas_total: aciertos y fallos por caché
+"""
+
+import asyncio
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import func
+
+import database
+import models
+from .registro import obtener_logger
+
+log = obtener_logger("metricas")
+
+
+MULTIPROCESO = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+INTERVALO_EVENT_LOOP = 1.0  # segundos
+
+DURACION_HTTP = Histogram(
+    "crm_http_duracion_segundos", "Duración de las peticiones HTTP",
+    ["metodo", "ruta", "codigo"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+CONSULTAS_POR_PETICION = Histogram(
+    "crm_sql_consultas_por_peticion", "Sentencias SQL ejecutadas por petición",
+    ["ruta"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250)
+)
+
+POOL_TAMANO = Gauge("crm_db_pool_tamano", "Tamaño configurado del pool", multiprocess_mode="livesum")
+POOL_EN_USO = Gauge("crm_db_pool_en_uso", "Conexiones prestadas", multiprocess_mode="livesum")
+POOL_DESBORDE = Gauge("crm_db_pool_desborde", "Conexiones por encima del tamaño del pool", multiprocess_mode="livesum")
+REPLICA_RETRASO = Gauge(
+    "crm_db_replica_retraso_segundos", "Último retraso medido de la réplica de lectura",
+    multiprocess_mode="livemax"
+)
+
+RETRASO_EVENT_LOOP = Gauge(
+    "crm_event_loop_retraso_segundos", "Último retraso medido del event loop",
+    multiprocess_mode="livemax"
+)
+RETRASO_EVENT_LOOP_HISTOGRAMA = Histogram(
+    "crm_event_loop_retraso_distribucion_segundos", "Retraso del event loop",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+DURACION_EXPORTACION = Histogram(
+    "crm_exportacion_duracion_segundos", "Duración de los trabajos de exportación",
+    ["tipo", "resultado"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+DURACION_IMPORTACION = Histogram(
+    "crm_importacion_duracion_segundos", "Duración de las importaciones de Excel",
+    ["tipo"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+FILAS_IMPORTADAS = Counter("crm_importacion_filas_total", "Filas procesadas en importaciones", ["tipo", "resultado"])
+
+EJECUCIONES_TAREA = Counter(
+    "crm_tarea_programada_ejecuciones_total", "Ejecuciones de tareas programadas", ["tarea", "resultado"]
+)
+DURACION_TAREA = Histogram(
+    "crm_tarea_programada_duracion_segundos", "Duración de las tareas programadas", ["tarea"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+)
+
+CONSULTAS_CACHE = Counter("crm_cache_consultas_total", "Consultas a cachés en memoria y disco", ["cache", "resultado"])
+
+
+def registrar_acceso_cache(cache: str, acierto: bool):
+    CONSULTAS_CACHE.labels(cache, "acierto" if acierto else "fallo").inc()
+
+
+def registrar_peticion_http(metodo: str, ruta: str, codigo: int, duracion_ms: float, consultas: int):
+    DURACION_HTTP.labels(metodo, ruta, str(codigo)).observe(duracion_ms / 1000)
+    CONSULTAS_POR_PETICION.labels(ruta).observe(consultas)
+
+
+def registrar_importacion(tipo: str, duracion_segundos: float, resultado: dict):
+    DURACION_IMPORTACION.labels(tipo).observe(duracion_segundos)
+    FILAS_IMPORTADAS.labels(tipo, "exitosa").inc(resultado.get("exitosos", 0))
+    FILAS_IMPORTADAS.labels(tipo, "error").inc(len(resultado.get("errores", [])))
+
+
+def actualizar_metricas_pool():
+    """Gauges del pool y de la réplica de este proceso (cada worker los actualiza en su bucle)"""
+    if database.obtener_retraso_replica() is not None:
+        REPLICA_RETRASO.set(database.obtener_retraso_replica())
+    pool = database.engine.pool
+    if not hasattr(pool, "checkedout"):
+        return  # Pools sin tamaño (p. ej. SQLite en desarrollo)
+    POOL_TAMANO.set(pool.size())
+    POOL_EN_USO.set(pool.checkedout())
+    POOL_DESBORDE.set(max(pool.overflow(), 0))
+
+
+async def medir_retraso_event_loop():
+    """
+    Tarea de fondo de cada worker: mide cuánto tarda en despertar un sleep de
+    INTERVALO_EVENT_LOOP y actualiza los gauges del pool (con varios workers,
+    el que atiende /metrics no puede leer el pool de los demás)
+    """
+    while True:
+        inicio = time.perf_counter()
+        await asyncio.sleep(INTERVALO_EVENT_LOOP)
+        retraso = max(time.perf_counter() - inicio - INTERVALO_EVENT_LOOP, 0.0)
+        RETRASO_EVENT_LOOP.set(retraso)
+        RETRASO_EVENT_LOOP_HISTOGRAMA.observe(retraso)
+        try:
+            actualizar_metricas_pool()
+        except Exception:
+            log.exception("Error actualizando métricas del pool")
+
+
+class _ColectorColas:
+    """Profundidad de las colas persistentes, leída de la BD en cada scrape"""
+
+    def describe(self):
+        return []  # Evita que el registro consulte la BD al registrar el colector
+
+    def collect(self):
+        exportaciones = GaugeMetricFamily(
+            "crm_trabajos_exportacion", "Trabajos de exportación por estado", labels=["estado"]
+        )
+        correos = GaugeMetricFamily("crm_correos_salientes", "Correos salientes por estado", labels=["estado"])
+        db = database.SessionLocal()
+        try:
+            T = models.TrabajoExportacion
+            for estado, total in db.query(T.estado, func.count(T.id)).filter(
+                T.estado.in_(["pendiente", "procesando"])
+            ).group_by(T.estado):
+                exportaciones.add_metric([estado], total)
+            C = models.CorreoSaliente
+            for estado, total in db.query(C.estado, func.count(C.id)).filter(
+                C.estado == "pendiente"
+            ).group_by(C.estado):
+                correos.add_metric([estado], total)
+        except Exception as e:
+            log.warning("Error leyendo colas para /metrics", extra={"error": str(e)})
+        finally:
+            db.close()
+        yield exportaciones
+        yield correos
+
+
+if not MULTIPROCESO:
+    REGISTRY.register(_ColectorColas())
+
+
+def generar_metricas() -> tuple:
+    """Texto de exposición de Prometheus y su content-type"""
+    actualizar_metricas_pool()
+    if MULTIPROCESO:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        registro.register(_ColectorColas())
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
+
+
+def marcar_proceso_terminado():
+    """Al apagar un worker: descarta sus gauges 'live' del directorio compartido"""
+    if MULTIPROCESO:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,154 @@
+"""
+Normalización de destinos de prospectos con UPDATEs sobre conjuntos
+
+- normalizar_destinos_prospectos: renombra un destino y asigna su destino_id
+  en la misma sentencia, por lotes y con modo simulación (solo cuenta).
+- completar_destino_id: resuelve de una sola pasada todos los textos de
+  destino heredados sin destino_id contra el catálogo.
+"""
+
+from sqlalchemy import Integer, String, and_, column, func, or_, select, update, values
+from sqlalchemy.orm import Session
+
+import models
+from .alias_destinos import registrar_alias_destino
+from .autocompletado_destinos import normalizar_busqueda
+from .datos_referencia import obtener_destinos_por_nombre
+
+
+TAMANO_LOTE = 5000
+TEXTOS_POR_SENTENCIA = 1000
+
+
+def resolver_destinos(db: Session, textos, crear_faltantes: bool = False) -> dict:
+    """
+    Resuelve textos libres de destino a IDs del catálogo comparando sin
+    tildes, mayúsculas ni espacios extra. Ante nombres repetidos gana el activo.
+
+    Args:
+        crear_faltantes: Crear en el catálogo los textos sin coincidencia
+
+    Returns:
+        Dict texto -> (destino_id, nombre_catalogo) solo con los resueltos
+    """
+    catalogo = obtener_destinos_por_nombre(db)
+
+    resueltos = {}
+    nuevos = {}
+    for texto in textos:
+        clave = normalizar_busqueda(texto)
+        if not clave:
+            continue
+        if clave in catalogo:
+            resueltos[texto] = (catalogo[clave].id, catalogo[clave].nombre)
+        elif crear_faltantes:
+            if clave not in nuevos:
+                nuevo = models.Destino(nombre=" ".join(str(texto).upper().split()), activo=1)
+                db.add(nuevo)
+                nuevos[clave] = nuevo
+    if nuevos:
+        db.flush()
+        for texto in textos:
+            nuevo = nuevos.get(normalizar_busqueda(texto))
+            if nuevo is not None:
+                resueltos[texto] = (nuevo.id, nuevo.nombre)
+    return resueltos
+
+
+def normalizar_destinos_prospectos(db: Session, destino_original: str, destino_normalizado: str,
+                                   coincidencia_parcial: bool = False, simular: bool = False) -> dict:
+    """
+    Cambia el destino de los prospectos que coinciden con `destino_original`
+    al nombre normalizado y su destino_id, en lotes de TAMANO_LOTE.
+
+    Args:
+        coincidencia_parcial: Coincidir por contenido (ILIKE '%texto%') en lugar de igualdad
+        simular: Solo contar los prospectos afectados
+
+    Returns:
+        Dict con count, destino_id y nombre aplicado
+    """
+    P = models.Prospecto
+    nombre = " ".join(str(destino_normalizado).upper().split())
+    resuelto = resolver_destinos(db, [nombre], crear_faltantes=not simular).get(nombre)
+    destino_id, nombre = resuelto if resuelto else (None, nombre)
+
+    coincide = P.destino.ilike(f"%{destino_original}%") if coincidencia_parcial else P.destino == destino_original
+    # Excluir los que ya están normalizados (evita reprocesarlos en cada lote)
+    pendiente = and_(
+        coincide,
+        or_(P.destino != nombre, P.destino_id.is_distinct_from(destino_id))
+    )
+
+    if simular:
+        total = db.query(func.count(P.id)).filter(pendiente).scalar()
+        db.rollback()
+        return {"count": total, "destino_id": destino_id, "destino": nombre, "destino_nuevo": resuelto is None}
+
+    total = 0
+    while True:
+        ids = db.execute(select(P.id).where(pendiente).limit(TAMANO_LOTE)).scalars().all()
+        if not ids:
+            break
+        db.execute(
+            update(P).where(P.id.in_(ids)).values(destino=nombre, destino_id=destino_id),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        total += len(ids)
+        if len(ids) < TAMANO_LOTE:
+            break
+
+    return {"count": total, "destino_id": destino_id, "destino": nombre}
+
+
+def completar_destino_id(db: Session, simular: bool = False, crear_faltantes: bool = False) -> dict:
+    """
+    Backfill de destino_id: agrupa los textos de destino distintos sin
+    destino_id (una consulta), los resuelve contra el catálogo y los aplica
+    con UPDATE ... FROM (VALUES ...) en bloques de TEXTOS_POR_SENTENCIA textos.
+    También deja el texto igual al nombre del catálogo y registra cada texto
+    resuelto como alias.
+
+    Returns:
+        Dict con textos_distintos, textos_resueltos, prospectos (afectados)
+        y sin_resolver (lista de (texto, prospectos))
+    """
+    P = models.Prospecto
+    sin_id = and_(P.destino_id.is_(None), P.destino.isnot(None), P.destino != "")
+
+    conteos = db.query(P.destino, func.count(P.id)).filter(sin_id).group_by(P.destino).all()
+    textos = [texto for texto, _ in conteos]
+    resueltos = resolver_destinos(db, textos, crear_faltantes=crear_faltantes and not simular)
+
+    resumen = {
+        "textos_distintos": len(textos),
+        "textos_resueltos": len(resueltos),
+        "prospectos": sum(n for texto, n in conteos if texto in resueltos),
+        "sin_resolver": sorted(((t, n) for t, n in conteos if t not in resueltos), key=lambda x: -x[1])
+    }
+    if simular or not resueltos:
+        db.rollback()
+        return resumen
+
+    for texto, (destino_id, _) in resueltos.items():
+        registrar_alias_destino(db, texto, destino_id, "exacto")
+
+    filas = [(texto, destino_id, nombre) for texto, (destino_id, nombre) in resueltos.items()]
+    for inicio in range(0, len(filas), TEXTOS_POR_SENTENCIA):
+        mapa = values(
+            column("texto", String),
+            column("destino_id", Integer),
+            column("nombre", String),
+            name="mapa_destinos"
+        ).data(filas[inicio:inicio + TEXTOS_POR_SENTENCIA])
+        db.execute(
+            update(P).where(P.destino == mapa.c.texto, P.destino_id.is_(None)).values(
+                destino_id=mapa.c.destino_id,
+                destino=mapa.c.nombre
+            ),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+
+    return resumen
@@ -0,0 +1,170 @@
+"""
+Servicio de notificaciones para el CRM ZARITA!
+
+Genera las alertas automáticas con sentencias sobre conjuntos en lugar de
+recorrer los prospectos uno a uno desde Python.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, column, exists, func, insert, literal, select, values
+from sqlalchemy.orm import Session
+
+import models
+from models import EstadoProspecto
+from .canal_notificaciones import canal_notificaciones
+from .contador_notificaciones import marcar_contadores
+from .datos_referencia import obtener_ids_admins
+
+
+HORAS_INACTIVIDAD = 4
+HORAS_ENTRE_ALERTAS = 24
+
+
+def generar_alertas_inactividad(db: Session) -> int:
+    """
+    Crea alertas para prospectos NUEVO sin gestión por más de 4 horas con un
+    único INSERT ... SELECT.
+
+    - Prospectos con agente: se notifica al agente.
+    - Prospectos sin asignar: se notifica a cada administrador/supervisor
+      (cross join con el conjunto cacheado de admins).
+    - Se omiten prospectos con una alerta de inactividad en las últimas 24h
+      (anti-join con NOT EXISTS).
+
+    Returns:
+        Número de notificaciones creadas
+    """
+    ahora = datetime.now()
+    limite = ahora - timedelta(hours=HORAS_INACTIVIDAD)
+    P = models.Prospecto
+    N = models.Notificacion
+
+    alerta_reciente = exists().where(
+        N.prospecto_id == P.id,
+        N.tipo == "inactividad",
+        N.fecha_creacion >= ahora - timedelta(hours=HORAS_ENTRE_ALERTAS)
+    )
+
+    ids_admins = obtener_ids_admins(db)
+    if ids_admins:
+        admins = values(column("usuario_id", Integer), name="admins").data([(uid,) for uid in ids_admins])
+        destinatario = func.coalesce(P.agente_asignado_id, admins.c.usuario_id)
+        origen = select(P).outerjoin(admins, P.agente_asignado_id.is_(None))
+    else:
+        destinatario = P.agente_asignado_id
+        origen = select(P).where(P.agente_asignado_id.isnot(None))
+
+    mensaje = (
+        literal("⚠️ Prospecto inactivo > 4h: ")
+        + func.coalesce(P.nombre, "")
+        + literal(" ")
+        + func.coalesce(P.apellido, "")
+    )
+
+    seleccion = origen.with_only_columns(
+        destinatario,
+        P.id,
+        literal("inactividad"),
+        mensaje,
+        literal(ahora),
+        literal(False),
+        literal(False)
+    ).where(
+        P.estado == EstadoProspecto.NUEVO.value,
+        P.fecha_registro <= limite,
+        ~alerta_reciente
+    )
+
+    usuario_ids = db.execute(
+        insert(N).from_select(
+            ["usuario_id", "prospecto_id", "tipo", "mensaje", "fecha_creacion", "leida", "email_enviado"],
+            seleccion
+        ).returning(N.usuario_id).execution_options(usuarios_notificaciones=())
+    ).scalars().all()
+    marcar_contadores(db, usuario_ids)
+    db.commit()
+    return len(usuario_ids)
+
+
+# ========== RECORDATORIOS VENCIDOS ==========
+
+def consultar_recordatorios_vencidos(db: Session, usuario_id: int = None, desde: datetime = None, hasta: datetime = None,
+                                     ids: list = None) -> list:
+    """
+    Recordatorios programados ya vencidos y no leídos, con el nombre del
+    prospecto resuelto en la misma consulta.
+
+    Args:
+        usuario_id: Solo los de este usuario (None = todos)
+        desde: Solo los vencidos después de esta fecha (exclusivo)
+        hasta: Límite de vencimiento (por defecto, ahora)
+        ids: Solo estas notificaciones (None = todas)
+
+    Returns:
+        Lista de dicts con usuario_id y los campos que muestra el aviso
+    """
+    N = models.Notificacion
+    P = models.Prospecto
+    hasta = hasta or datetime.now()
+
+    query = db.query(
+        N.id, N.usuario_id, N.mensaje, N.tipo, N.prospecto_id, N.fecha_programada,
+        P.nombre, P.apellido
+    ).outerjoin(P, P.id == N.prospecto_id).filter(
+        N.leida == False,
+        N.fecha_programada.isnot(None),
+        N.fecha_programada <= hasta
+    )
+    if usuario_id is not None:
+        query = query.filter(N.usuario_id == usuario_id)
+    if desde is not None:
+        query = query.filter(N.fecha_programada > desde)
+    if ids is not None:
+        query = query.filter(N.id.in_(ids))
+
+    resultado = []
+    for fila in query.order_by(N.fecha_programada.asc()).all():
+        prospecto_nombre = "N/A"
+        if fila.prospecto_id and fila.nombre is not None:
+            prospecto_nombre = f"{fila.nombre} {fila.apellido or ''}".strip()
+
+        resultado.append({
+            "id": fila.id,
+            "usuario_id": fila.usuario_id,
+            "mensaje": fila.mensaje,
+            "tipo": fila.tipo,
+            "prospecto_id": fila.prospecto_id,
+            "fecha_programada": fila.fecha_programada.strftime("%d/%m/%Y %H:%M"),
+            "prospecto_nombre": prospecto_nombre
+        })
+    return resultado
+
+
+TAREA_DESPACHO = "recordatorios_vencidos"
+
+
+def despachar_recordatorios_vencidos(db: Session) -> int:
+    """
+    Tarea programada: publica por el canal en tiempo real los recordatorios
+    que vencieron desde la última ejecución. La marca de la última ejecución
+    se guarda en estado_tareas, en la misma transacción que los NOTIFY, para
+    que un nuevo líder no vuelva a publicar lo ya despachado.
+
+    Returns:
+        Número de recordatorios publicados
+    """
+    ahora = datetime.now()
+    estado = db.get(models.EstadoTarea, TAREA_DESPACHO, with_for_update=True)
+    if estado is None:
+        estado = models.EstadoTarea(tarea=TAREA_DESPACHO)
+        db.add(estado)
+    desde = estado.marca or ahora - timedelta(minutes=5)
+
+    recordatorios = consultar_recordatorios_vencidos(db, desde=desde, hasta=ahora)
+    for recordatorio in recordatorios:
+        canal_notificaciones.publicar(recordatorio["usuario_id"], recordatorio, db=db)
+
+    estado.marca = ahora
+    db.commit()  # Guarda la marca y entrega los NOTIFY del puente con PostgreSQL
+    return len(recordatorios)
@@ -0,0 +1,160 @@
+"""
+Particiones mensuales de interacciones e historial_estados (PostgreSQL)
+
+Las tablas declaradas con models.particion_mensual() están particionadas por
+rango de fechas, una partición por mes (p. ej. interacciones_p2026_10) más una
+DEFAULT que recoge cualquier fila fuera de rango. Las consultas acotadas por
+fecha (estadísticas del dashboard, filtro de fechas de cierre) solo leen las
+particiones de los meses pedidos.
+
+La tarea programada crea por adelantado las particiones de los próximos meses.
+Si la DEFAULT ya tiene filas de un mes, esas filas se mueven a la partición
+nueva al crearla.
+
+En bases de datos que no son PostgreSQL, o si aún no se ejecutó
+scripts/particionar_tablas.py, no hace nada.
+
+Configuración (variables de entorno):
+    PARTICIONES_MESES_ADELANTE  Meses futuros con partición creada (por defecto 3)
+"""
+
+import os
+from datetime import date
+
+from sqlalchemy import text
+
+import models
+from .registro import obtener_logger
+
+log = obtener_logger("particiones")
+
+
+MESES_ADELANTE = int(os.getenv("PARTICIONES_MESES_ADELANTE", "3"))
+
+
+def tablas_particionadas() -> dict:
+    """{tabla: columna de partición} según los modelos"""
+    return {
+        tabla.name: tabla.info["particion_mensual"]
+        for tabla in models.Base.metadata.sorted_tables
+        if "particion_mensual" in tabla.info
+    }
+
+
+def _inicio_mes(fecha) -> date:
+    return date(fecha.year, fecha.month, 1)
+
+
+def _mes_siguiente(mes: date) -> date:
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def nombre_particion(tabla: str, mes: date) -> str:
+    return f"{tabla}_p{mes:%Y_%m}"
+
+
+def _dialecto(conexion) -> str:
+    bind = conexion.get_bind() if hasattr(conexion, "get_bind") else conexion
+    return bind.dialect.name
+
+
+def esta_particionada(conexion, tabla: str) -> bool:
+    return bool(conexion.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :tabla AND pg_table_is_visible(c.oid))"
+    ), {"tabla": tabla}).scalar())
+
+
+def _particiones_existentes(conexion, tabla: str) -> set:
+    return set(conexion.execute(text(
+        "SELECT hija.relname FROM pg_inherits i "
+        "JOIN pg_class hija ON hija.oid = i.inhrelid "
+        "JOIN pg_class padre ON padre.oid = i.inhparent "
+        "WHERE padre.relname = :tabla AND pg_table_is_visible(padre.oid)"
+    ), {"tabla": tabla}).scalars())
+
+
+def _crear_particion(conexion, tabla: str, columna: str, mes: date, existentes: set):
+    nombre = nombre_particion(tabla, mes)
+    desde, hasta = mes.isoformat(), _mes_siguiente(mes).isoformat()
+    default = f"{tabla}_default"
+
+    filas_en_default = default in existentes and conexion.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {columna} >= :desde AND {columna} < :hasta)"
+    ), {"desde": desde, "hasta": hasta}).scalar()
+
+    if not filas_en_default:
+        conexion.execute(text(
+            f"CREATE TABLE {nombre} PARTITION OF {tabla} FOR VALUES FROM ('{desde}') TO ('{hasta}')"
+        ))
+        return
+
+    # PostgreSQL no permite crear la partición si la DEFAULT ya tiene filas de
+    # ese rango: se crea aparte, se mueven las filas y se adjunta
+    conexion.execute(text(f"CREATE TABLE {nombre} (LIKE {tabla} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    movidas = conexion.execute(text(
+        f"WITH movidas AS (DELETE FROM {default} WHERE {columna} >= :desde AND {columna} < :hasta RETURNING *) "
+        f"INSERT INTO {nombre} SELECT * FROM movidas"
+    ), {"desde": desde, "hasta": hasta}).rowcount
+    conexion.execute(text(
+        f"ALTER TABLE {tabla} ATTACH PARTITION {nombre} FOR VALUES FROM ('{desde}') TO ('{hasta}')"
+    ))
+    log.info("Filas movidas desde la partición DEFAULT", extra={"particion": nombre, "filas": movidas})
+
+
+def asegurar_particiones(conexion, tabla: str, desde, hasta) -> int:
+    """
+    Crea (sin hacer commit) la partición DEFAULT y las mensuales de `tabla`
+    entre los meses de `desde` y `hasta`, ambos incluidos, que aún no existan.
+
+    Returns:
+        Número de particiones mensuales creadas
+    """
+    columna = tablas_particionadas()[tabla]
+    existentes = _particiones_existentes(conexion, tabla)
+
+    if f"{tabla}_default" not in existentes:
+        conexion.execute(text(f"CREATE TABLE {tabla}_default PARTITION OF {tabla} DEFAULT"))
+        existentes.add(f"{tabla}_default")
+
+    creadas = 0
+    mes, ultimo = _inicio_mes(desde), _inicio_mes(hasta)
+    while mes <= ultimo:
+        if nombre_particion(tabla, mes) not in existentes:
+            _crear_particion(conexion, tabla, columna, mes, existentes)
+            creadas += 1
+        mes = _mes_siguiente(mes)
+    return creadas
+
+
+def crear_particiones_mensuales(db, meses_adelante: int = None) -> int:
+    """
+    Tarea programada: crea las particiones del mes actual y de los
+    `meses_adelante` siguientes (por defecto PARTICIONES_MESES_ADELANTE).
+    Un commit por tabla.
+
+    Returns:
+        Número de particiones creadas
+    """
+    if _dialecto(db) != "postgresql":
+        return 0
+
+    meses_adelante = MESES_ADELANTE if meses_adelante is None else meses_adelante
+    desde = _inicio_mes(date.today())
+    hasta = desde
+    for _ in range(meses_adelante):
+        hasta = _mes_siguiente(hasta)
+
+    total = 0
+    for tabla in tablas_particionadas():
+        if not esta_particionada(db, tabla):
+            continue  # Falta ejecutar scripts/particionar_tablas.py
+        try:
+            creadas = asegurar_particiones(db, tabla, desde, hasta)
+            db.commit()
+            total += creadas
+        except Exception:
+            db.rollback()
+            log.exception("Error creando particiones", extra={"tabla": tabla})
+    return total
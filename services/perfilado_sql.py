@@ -0,0 +1,169 @@
+"""
+Perfilado de SQL por petición
+
+Los eventos del Engine cuentan cada sentencia ejecutada y su duración y las
+acumulan en el perfil de la petición en curso (ContextVar, que también llega a
+los endpoints síncronos que corren en el threadpool). El middleware de main.py:
+- agrega la cabecera Server-Timing (db, app y número de consultas),
+- registra en el log las peticiones que superan los umbrales, con su SQL,
+- acumula estadísticas por ruta para el panel /admin/rendimiento.
+
+Umbrales configurables por variables de entorno:
+- PERFIL_SQL_SENTENCIA_LENTA_MS: sentencia individual lenta (defecto 200 ms)
+- PERFIL_SQL_PETICION_LENTA_MS: petición lenta (defecto 1000 ms)
+- PERFIL_SQL_MAX_CONSULTAS: consultas por petición antes de avisar de un
+  posible N+1 (defecto 50)
+"""
+
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .registro import obtener_logger
+
+log = obtener_logger("perfilado_sql")
+
+
+SENTENCIA_LENTA_MS = float(os.getenv("PERFIL_SQL_SENTENCIA_LENTA_MS", "200"))
+PETICION_LENTA_MS = float(os.getenv("PERFIL_SQL_PETICION_LENTA_MS", "1000"))
+MAX_CONSULTAS = int(os.getenv("PERFIL_SQL_MAX_CONSULTAS", "50"))
+
+SENTENCIAS_GUARDADAS = 30  # Sentencias por petición que se conservan para el log
+LONGITUD_SQL = 500
+
+
+class PerfilPeticion:
+    """Acumulado de SQL de una petición"""
+
+    __slots__ = ("consultas", "tiempo_db", "mas_lenta", "sentencias")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0  # ms
+        self.mas_lenta = (0.0, None)  # (ms, sql)
+        self.sentencias = []  # [(ms, sql)] de las primeras SENTENCIAS_GUARDADAS
+
+    def registrar(self, duracion_ms: float, sql: str):
+        self.consultas += 1
+        self.tiempo_db += duracion_ms
+        if duracion_ms > self.mas_lenta[0]:
+            self.mas_lenta = (duracion_ms, sql)
+        if len(self.sentencias) < SENTENCIAS_GUARDADAS:
+            self.sentencias.append((duracion_ms, sql))
+
+
+_perfil_actual: ContextVar = ContextVar("perfil_sql", default=None)
+
+
+def _recortar(sql: str) -> str:
+    sql = " ".join(str(sql).split())
+    return sql if len(sql) <= LONGITUD_SQL else sql[:LONGITUD_SQL] + "…"
+
+
+# ========== EVENTOS DEL ENGINE ==========
+# Se escuchan en la clase Engine para cubrir cualquier engine (principal, réplicas, scripts)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    if _perfil_actual.get() is not None:
+        conn.info.setdefault("perfil_sql_inicio", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    perfil = _perfil_actual.get()
+    inicios = conn.info.get("perfil_sql_inicio")
+    if perfil is None or not inicios:
+        return
+    duracion_ms = (time.perf_counter() - inicios.pop()) * 1000
+    perfil.registrar(duracion_ms, statement)
+    if duracion_ms >= SENTENCIA_LENTA_MS:
+        log.warning("SQL lenta", extra={"duracion_ms": round(duracion_ms, 1), "sql": _recortar(statement)})
+
+
+@event.listens_for(Engine, "handle_error")
+def _error_al_ejecutar(contexto_error):
+    conexion = contexto_error.connection
+    if conexion is not None and conexion.info.get("perfil_sql_inicio"):
+        conexion.info["perfil_sql_inicio"].pop()
+
+
+# ========== PERFIL DE LA PETICIÓN ==========
+
+def iniciar_perfil() -> tuple:
+    """Activa el perfilado para la petición actual. Devuelve (perfil, token)"""
+    perfil = PerfilPeticion()
+    return perfil, _perfil_actual.set(perfil)
+
+
+def terminar_perfil(token):
+    _perfil_actual.reset(token)
+
+
+def cabecera_server_timing(perfil: PerfilPeticion, duracion_ms: float) -> str:
+    return (
+        f'db;dur={perfil.tiempo_db:.1f};desc="{perfil.consultas} consultas", '
+        f"app;dur={duracion_ms:.1f}"
+    )
+
+
+# ========== ESTADÍSTICAS POR RUTA ==========
+
+_estadisticas = {}  # (metodo, ruta) -> dict
+_lock = threading.Lock()
+
+
+def registrar_peticion(metodo: str, ruta: str, estado: int, perfil: PerfilPeticion, duracion_ms: float):
+    """Acumula la petición en las estadísticas por ruta y la registra si superó algún umbral"""
+    with _lock:
+        datos = _estadisticas.get((metodo, ruta))
+        if datos is None:
+            datos = _estadisticas[(metodo, ruta)] = {
+                "metodo": metodo, "ruta": ruta, "peticiones": 0, "consultas": 0, "max_consultas": 0,
+                "tiempo_db": 0.0, "tiempo_total": 0.0, "max_tiempo": 0.0, "lentas": 0,
+                "sql_mas_lenta": None, "ms_sql_mas_lenta": 0.0
+            }
+        datos["peticiones"] += 1
+        datos["consultas"] += perfil.consultas
+        datos["max_consultas"] = max(datos["max_consultas"], perfil.consultas)
+        datos["tiempo_db"] += perfil.tiempo_db
+        datos["tiempo_total"] += duracion_ms
+        datos["max_tiempo"] = max(datos["max_tiempo"], duracion_ms)
+        if perfil.mas_lenta[0] > datos["ms_sql_mas_lenta"]:
+            datos["ms_sql_mas_lenta"], datos["sql_mas_lenta"] = perfil.mas_lenta[0], _recortar(perfil.mas_lenta[1])
+
+        lenta = duracion_ms >= PETICION_LENTA_MS
+        demasiadas = perfil.consultas > MAX_CONSULTAS
+        if lenta or demasiadas:
+            datos["lentas"] += 1
+
+    if lenta or demasiadas:
+        log.warning(
+            "Petición lenta" if lenta else "Petición con demasiadas consultas (¿N+1?)",
+            extra={
+                "metodo": metodo, "ruta": ruta, "estado": estado,
+                "duracion_ms": round(duracion_ms, 1), "consultas": perfil.consultas,
+                "tiempo_db_ms": round(perfil.tiempo_db, 1),
+                "sentencias": [f"{ms:.1f} ms  {_recortar(sql)}" for ms, sql in perfil.sentencias],
+            }
+        )
+
+
+def obtener_estadisticas_rutas() -> list:
+    """Estadísticas por ruta de este worker, las de más tiempo en BD primero"""
+    with _lock:
+        filas = [dict(datos) for datos in _estadisticas.values()]
+    for fila in filas:
+        fila["consultas_promedio"] = fila["consultas"] / fila["peticiones"]
+        fila["tiempo_db_promedio"] = fila["tiempo_db"] / fila["peticiones"]
+        fila["tiempo_promedio"] = fila["tiempo_total"] / fila["peticiones"]
+    return sorted(filas, key=lambda f: -f["tiempo_db"])
+
+
+def reiniciar_estadisticas_rutas():
+    with _lock:
+        _estadisticas.clear()
@@ -0,0 +1,178 @@
+"""
+Recordatorios de seguimiento de viaje para clientes ganados
+
+Los recordatorios de 45, 10 y 2 días antes de la fecha de ida no se guardan
+por adelantado: se derivan de prospectos (estado, fecha_ida) y una tarea
+programada materializa como notificación solo los que ya vencieron. Así no
+se acumulan filas dormidas ni se hace un commit por prospecto al importar.
+
+Como su fecha programada es la medianoche del día en que vencen, el
+despachador periódico ya no los vería: se publican en tiempo real al crearse.
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, DateTime, String, column, delete, exists, func, insert, literal, select, values
+from sqlalchemy.orm import Session
+
+import models
+from models import EstadoProspecto
+from .canal_notificaciones import canal_notificaciones
+from .contador_notificaciones import marcar_contadores
+from .notificaciones_service import consultar_recordatorios_vencidos
+
+
+TIPO_RECORDATORIO_VIAJE = "seguimiento_viaje"
+
+# (días antes de la ida, texto del recordatorio)
+ETAPAS_RECORDATORIO_VIAJE = [
+    (45, "Confirmar pagos y estado de reserva"),
+    (10, "Validar con cliente gestiones pre-viaje"),
+    (2, "Validar pre-viaje, formularios y gestiones finales"),
+]
+
+# Días hacia atrás que se recuperan si la tarea no corrió (reinicio, caída).
+# Un cliente ganado a pocos días del viaje no recibe recordatorios ya pasados.
+DIAS_RECUPERACION = 2
+
+
+def _mensaje_recordatorio(texto, destino):
+    return texto + literal(" - Viaje a ") + func.coalesce(func.nullif(destino, ""), "destino")
+
+
+def _etapas_vencidas(hoy: date):
+    """
+    Filas (fecha_ida, fecha_programada, texto) de las etapas que vencen entre
+    hoy - DIAS_RECUPERACION y hoy. Cada fila se cruza por igualdad con el
+    índice (estado, fecha_ida).
+    """
+    filas = []
+    for dias_antes, texto in ETAPAS_RECORDATORIO_VIAJE:
+        for atraso in range(DIAS_RECUPERACION + 1):
+            fecha_programada = hoy - timedelta(days=atraso)
+            filas.append((
+                fecha_programada + timedelta(days=dias_antes),
+                datetime.combine(fecha_programada, datetime.min.time()),
+                texto
+            ))
+    return values(
+        column("fecha_ida", Date),
+        column("fecha_programada", DateTime),
+        column("texto", String),
+        name="etapas"
+    ).data(filas)
+
+
+def materializar_recordatorios_viaje(db: Session, prospecto_ids: list = None) -> int:
+    """
+    Crea con un único INSERT ... SELECT las notificaciones de seguimiento de
+    viaje que ya vencieron y aún no existen, y las publica por el canal en
+    tiempo real.
+
+    Args:
+        prospecto_ids: Solo estos prospectos (None = todos los ganados)
+
+    Returns:
+        Número de notificaciones creadas
+    """
+    P = models.Prospecto
+    N = models.Notificacion
+    etapas = _etapas_vencidas(datetime.now().date())
+
+    ya_creada = exists().where(
+        N.prospecto_id == P.id,
+        N.tipo == TIPO_RECORDATORIO_VIAJE,
+        N.fecha_programada == etapas.c.fecha_programada
+    )
+
+    seleccion = select(
+        P.agente_asignado_id,
+        P.id,
+        literal(TIPO_RECORDATORIO_VIAJE),
+        _mensaje_recordatorio(etapas.c.texto, P.destino),
+        etapas.c.fecha_programada,
+        literal(datetime.now()),
+        literal(False),
+        literal(False)
+    ).select_from(P).join(etapas, P.fecha_ida == etapas.c.fecha_ida).where(
+        P.estado == EstadoProspecto.GANADO.value,
+        P.agente_asignado_id.isnot(None),
+        P.fecha_eliminacion.is_(None),
+        ~ya_creada
+    )
+    if prospecto_ids is not None:
+        seleccion = seleccion.where(P.id.in_(prospecto_ids))
+
+    creadas = db.execute(
+        insert(N).from_select(
+            ["usuario_id", "prospecto_id", "tipo", "mensaje", "fecha_programada", "fecha_creacion", "leida", "email_enviado"],
+            seleccion
+        ).returning(N.id, N.usuario_id).execution_options(usuarios_notificaciones=())
+    ).all()
+    ids = [fila.id for fila in creadas]
+    marcar_contadores(db, [fila.usuario_id for fila in creadas])
+
+    if ids:
+        for recordatorio in consultar_recordatorios_vencidos(db, ids=ids):
+            canal_notificaciones.publicar(recordatorio["usuario_id"], recordatorio, db=db)
+    db.commit()  # Confirma las filas y entrega los NOTIFY del puente con PostgreSQL
+    return len(ids)
+
+
+def descartar_recordatorios_viaje(db: Session, prospecto_id: int):
+    """
+    Elimina los recordatorios de viaje pendientes de un prospecto (cambió la
+    fecha de ida o dejó de estar ganado). Se confirma con el commit del llamador.
+    """
+    N = models.Notificacion
+    usuario_ids = db.execute(
+        delete(N).where(
+            N.prospecto_id == prospecto_id,
+            N.tipo == TIPO_RECORDATORIO_VIAJE,
+            N.leida == False
+        ).returning(N.usuario_id).execution_options(synchronize_session=False, usuarios_notificaciones=())
+    ).scalars().all()
+    marcar_contadores(db, usuario_ids)
+
+
+def consultar_proximos_recordatorios_viaje(db: Session, usuario_id: int = None, limite: int = 50) -> list:
+    """
+    Recordatorios de viaje que aún no vencen, calculados al vuelo desde los
+    prospectos ganados con viaje en los próximos 45 días.
+
+    Returns:
+        Lista de dicts ordenada por fecha_programada
+    """
+    P = models.Prospecto
+    hoy = datetime.now().date()
+    horizonte = max(dias for dias, _ in ETAPAS_RECORDATORIO_VIAJE)
+
+    query = db.query(
+        P.id, P.nombre, P.apellido, P.destino, P.fecha_ida, P.agente_asignado_id
+    ).filter(
+        P.estado == EstadoProspecto.GANADO.value,
+        P.fecha_ida > hoy,
+        P.fecha_ida <= hoy + timedelta(days=horizonte),
+        P.agente_asignado_id.isnot(None),
+        P.fecha_eliminacion.is_(None)
+    )
+    if usuario_id is not None:
+        query = query.filter(P.agente_asignado_id == usuario_id)
+
+    proximos = []
+    for fila in query.order_by(P.fecha_ida.asc()).all():
+        for dias_antes, texto in ETAPAS_RECORDATORIO_VIAJE:
+            fecha_programada = fila.fecha_ida - timedelta(days=dias_antes)
+            if fecha_programada > hoy:
+                proximos.append({
+                    "prospecto_id": fila.id,
+                    "prospecto_nombre": f"{fila.nombre or ''} {fila.apellido or ''}".strip() or "N/A",
+                    "usuario_id": fila.agente_asignado_id,
+                    "mensaje": f"{texto} - Viaje a {fila.destino or 'destino'}",
+                    "fecha_programada": datetime.combine(fecha_programada, datetime.min.time()),
+                    "fecha_ida": fila.fecha_ida
+                })
+                break  # Solo la siguiente etapa de cada viaje
+
+    proximos.sort(key=lambda r: r["fecha_programada"])
+    return proximos[:limite]
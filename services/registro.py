@@ -0,0 +1,194 @@
+"""
+Registro estructurado (logging) del CRM ZARITA!
+
+Todos los mensajes de la aplicación pasan por loggers "crm.*". El handler
+solo deja el registro en una cola en memoria; un hilo aparte (QueueListener)
+lo formatea y lo escribe en stdout, así una petición nunca espera por la E/S
+de consola.
+
+Cada línea lleva el id de la petición HTTP que la generó (cabecera
+X-Request-ID, o uno nuevo si el cliente no la envía), de modo que se pueden
+seguir todas las líneas de una petición entre workers.
+
+Variables de entorno:
+- LOG_NIVEL: DEBUG, INFO (defecto), WARNING, ERROR
+- LOG_FORMATO: json (defecto, una línea JSON por mensaje) o texto
+- LOG_MUESTREO_FILAS: en las importaciones, registrar 1 de cada N mensajes
+  por fila (defecto 100; los errores siempre se registran)
+
+Uso:
+    from services import obtener_logger
+    log = obtener_logger("exportaciones")
+    log.info("Exportación lista", extra={"trabajo_id": 12, "archivo": nombre})
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+
+
+NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+FORMATO = os.getenv("LOG_FORMATO", "json").lower()
+MUESTREO_FILAS = max(int(os.getenv("LOG_MUESTREO_FILAS", "100")), 1)
+TAMANO_COLA = 10000
+
+_id_peticion: ContextVar = ContextVar("id_peticion", default=None)
+
+# Atributos propios de LogRecord: el resto vienen de extra={...}
+_ATRIBUTOS_ESTANDAR = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "id_peticion"}
+
+
+# ========== ID DE PETICIÓN ==========
+
+def iniciar_id_peticion(valor: str = None) -> tuple:
+    """Fija el id de la petición actual (el recibido o uno nuevo). Devuelve (id, token)"""
+    valor = (valor or uuid.uuid4().hex[:16])[:64]
+    return valor, _id_peticion.set(valor)
+
+
+def terminar_id_peticion(token):
+    _id_peticion.reset(token)
+
+
+def obtener_id_peticion():
+    return _id_peticion.get()
+
+
+# ========== FILTROS Y FORMATO ==========
+
+class _FiltroIdPeticion(logging.Filter):
+    """Copia el id de la petición al registro (se ejecuta en el hilo que registra)"""
+
+    def filter(self, record):
+        record.id_peticion = _id_peticion.get()
+        return True
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar el primero y luego 1 de cada `cada` mensajes, con un contador
+    por nivel (los avisos no quedan ocultos tras los debug); los errores
+    siempre pasan
+    """
+
+    def __init__(self, cada: int):
+        super().__init__()
+        self.cada = cada
+        self._contadores = defaultdict(itertools.count)
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        if next(self._contadores[record.levelno]) % self.cada:
+            return False
+        record.muestreo = self.cada
+        return True
+
+
+class _FormateadorJSON(logging.Formatter):
+    def format(self, record):
+        datos = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "pid": record.process,
+        }
+        if getattr(record, "id_peticion", None):
+            datos["id_peticion"] = record.id_peticion
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR:
+                datos[clave] = valor
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class _FormateadorTexto(logging.Formatter):
+    def format(self, record):
+        linea = (
+            f"{datetime.fromtimestamp(record.created):%H:%M:%S} {record.levelname:<7} "
+            f"[{getattr(record, 'id_peticion', None) or '-'}] {record.name}: {record.getMessage()}"
+        )
+        extras = {c: v for c, v in vars(record).items() if c not in _ATRIBUTOS_ESTANDAR}
+        if extras:
+            linea += " " + " ".join(f"{c}={v}" for c, v in extras.items())
+        if record.exc_info:
+            linea += "\n" + self.formatException(record.exc_info)
+        return linea
+
+
+class _HandlerCola(logging.handlers.QueueHandler):
+    """No bloquea nunca: si la cola está llena el mensaje se descarta y se cuenta"""
+
+    descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _HandlerCola.descartados += 1
+
+    def prepare(self, record):
+        # Formatear el mensaje aquí (con los argumentos ya resueltos) y conservar
+        # los extras; la traza se formatea en el hilo escritor
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# ========== CONFIGURACIÓN ==========
+
+_listener = None
+
+
+def configurar_registro():
+    """Instala el handler en cola en el logger 'crm' (una vez por proceso)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(_FormateadorTexto() if FORMATO == "texto" else _FormateadorJSON())
+
+    cola = queue.Queue(maxsize=TAMANO_COLA)
+    handler = _HandlerCola(cola)
+    handler.addFilter(_FiltroIdPeticion())
+
+    raiz = logging.getLogger("crm")
+    raiz.setLevel(NIVEL)
+    raiz.handlers = [handler]
+    raiz.propagate = False
+
+    logging.getLogger("crm.importacion.filas").addFilter(FiltroMuestreo(MUESTREO_FILAS))
+
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=False)
+    _listener.start()
+    atexit.register(detener_registro)
+
+
+def detener_registro():
+    """Vacía la cola y detiene el hilo escritor (al apagar el proceso)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _HandlerCola.descartados:
+            print(f"{_HandlerCola.descartados} mensajes de log descartados por cola llena", file=sys.stderr)
+
+
+def obtener_logger(nombre: str) -> logging.Logger:
+    """Logger hijo de 'crm' (p. ej. obtener_logger("correo") → crm.correo)"""
+    return logging.getLogger(nombre if nombre.startswith("crm") else f"crm.{nombre}")
+
+
+configurar_registro()
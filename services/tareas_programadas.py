@@ -0,0 +1,134 @@
+"""
+Planificador de tareas periódicas para el CRM ZARITA!
+
+Ejecuta tareas de mantenimiento (alertas, limpiezas) en segundo plano dentro
+del event loop de la aplicación, fuera de las peticiones de los usuarios.
+
+Con varios workers de uvicorn solo uno ejecuta las tareas: el que obtiene un
+advisory lock de PostgreSQL sobre una conexión dedicada. Si ese worker muere,
+la conexión se cierra, el lock se libera y otro worker toma el relevo.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+import database
+from .metricas import DURACION_TAREA, EJECUCIONES_TAREA
+from .registro import obtener_logger
+
+log = obtener_logger("planificador")
+
+
+PLANIFICADOR_ACTIVO = os.getenv("PLANIFICADOR_ACTIVO", "1") == "1"
+CLAVE_LOCK_PLANIFICADOR = 7261001  # Identificador del advisory lock
+
+
+class Planificador:
+    """Registro de tareas periódicas y su ejecución en segundo plano"""
+
+    def __init__(self):
+        self.tareas = []
+        self._tasks = []
+        self._conexion_lider = None
+        self._lock_lider = threading.Lock()
+
+    def agregar_tarea(self, nombre: str, intervalo_segundos: int, funcion):
+        """
+        Registra una tarea periódica.
+
+        Args:
+            nombre: Nombre para los logs
+            intervalo_segundos: Segundos entre ejecuciones
+            funcion: Función síncrona que recibe una sesión de base de datos
+        """
+        self.tareas.append((nombre, intervalo_segundos, funcion))
+
+    def iniciar(self):
+        """Lanza las tareas registradas en el event loop actual"""
+        if not PLANIFICADOR_ACTIVO:
+            log.info("Planificador desactivado (PLANIFICADOR_ACTIVO=0)")
+            return
+        loop = asyncio.get_running_loop()
+        for nombre, intervalo, funcion in self.tareas:
+            self._tasks.append(loop.create_task(self._bucle(nombre, intervalo, funcion)))
+        log.info("Planificador iniciado", extra={"tareas": len(self.tareas)})
+
+    async def detener(self):
+        """Cancela las tareas y libera el liderazgo"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._soltar_liderazgo)
+
+    async def _bucle(self, nombre: str, intervalo: int, funcion):
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                await asyncio.to_thread(self._ejecutar, nombre, funcion)
+            except Exception:
+                log.exception("Error en tarea programada", extra={"tarea": nombre})
+
+    def _ejecutar(self, nombre: str, funcion):
+        if not self._es_lider():
+            return
+        db = database.SessionLocal()
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(db)
+            EJECUCIONES_TAREA.labels(nombre, "ok").inc()
+            if resultado:
+                log.info("Tarea programada ejecutada", extra={"tarea": nombre, "resultado": resultado})
+        except Exception:
+            EJECUCIONES_TAREA.labels(nombre, "error").inc()
+            db.rollback()
+            raise
+        finally:
+            DURACION_TAREA.labels(nombre).observe(time.perf_counter() - inicio)
+            db.close()
+
+    def _es_lider(self) -> bool:
+        """Comprueba (u obtiene) el advisory lock que designa al worker líder"""
+        with self._lock_lider:
+            if self._conexion_lider is not None:
+                try:
+                    self._conexion_lider.execute(text("SELECT 1"))
+                    return True
+                except Exception:
+                    # Conexión perdida: el lock ya no es nuestro
+                    self._soltar_liderazgo()
+
+            conexion = database.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+            try:
+                obtenido = conexion.execute(
+                    text("SELECT pg_try_advisory_lock(:clave)"), {"clave": CLAVE_LOCK_PLANIFICADOR}
+                ).scalar()
+            except Exception:
+                conexion.close()
+                raise
+
+            if obtenido:
+                self._conexion_lider = conexion
+                log.info("Este worker ejecutará las tareas programadas")
+                return True
+
+            conexion.close()
+            return False
+
+    def _soltar_liderazgo(self):
+        if self._conexion_lider is not None:
+            try:
+                # invalidate() cierra la conexión real en lugar de devolverla al
+                # pool, así PostgreSQL libera el advisory lock
+                self._conexion_lider.invalidate()
+                self._conexion_lider.close()
+            except Exception:
+                pass
+            self._conexion_lider = None
+
+
+planificador = Planificador()
@@ -0,0 +1,287 @@
+"""
+Trabajos de exportación en segundo plano para el CRM ZARITA!
+
+Las exportaciones pesadas no se generan dentro de la petición: se registra un
+TrabajoExportacion, un pool de procesos construye el archivo en disco y el
+usuario lo descarga desde "Mis descargas" mientras no haya expirado.
+Las consultas del informe usan la réplica de lectura si está configurada
+(esos archivos no se guardan en la caché de exportaciones); el estado del
+trabajo se guarda siempre en el primario.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+import database
+import models
+from utils import calcular_rango_fechas
+from .metricas import DURACION_EXPORTACION
+from .registro import obtener_logger
+from .cache_exportaciones import calcular_clave_cache, obtener_de_cache, guardar_en_cache
+from .exportacion_service import (
+    construir_query_prospectos_exportacion,
+    construir_query_clientes_ganados,
+    consultar_prospectos_exportacion,
+    recopilar_estadisticas_dashboard,
+    generar_excel_prospectos,
+    generar_excel_estadisticas
+)
+
+log = obtener_logger("exportaciones")
+
+
+EXPORT_DIR = os.path.abspath(os.getenv("EXPORT_DIR", "exportaciones"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_EXPIRACION_HORAS = int(os.getenv("EXPORT_EXPIRACION_HORAS", "24"))
+
+TIPOS_EXPORTACION = {
+    'prospectos': 'Prospectos',
+    'dashboard': 'Estadísticas del dashboard',
+    'clientes_ganados': 'Clientes ganados'
+}
+
+_pool = None
+
+
+def obtener_pool() -> ProcessPoolExecutor:
+    """
+    Devuelve el pool de procesos de exportación, creándolo la primera vez.
+    Se usa 'spawn' para que los procesos hijos no hereden las conexiones
+    abiertas del proceso web.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=EXPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def cerrar_pool():
+    """Cierra el pool de procesos (al apagar la aplicación)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def encolar_trabajo_exportacion(db: Session, usuario: models.Usuario, tipo: str, parametros: dict) -> models.TrabajoExportacion:
+    """
+    Registra un trabajo de exportación y lo envía al pool de procesos.
+
+    Args:
+        db: Sesión de base de datos
+        usuario: Usuario que solicita la exportación
+        tipo: Una de las claves de TIPOS_EXPORTACION
+        parametros: Filtros de la exportación (serializables a JSON)
+
+    Returns:
+        El TrabajoExportacion creado
+    """
+    if tipo not in TIPOS_EXPORTACION:
+        raise ValueError(f"Tipo de exportación no soportado: {tipo}")
+
+    try:
+        clave_cache = calcular_clave_cache(tipo, parametros, usuario, database.obtener_version_datos(db))
+    except Exception as e:
+        log.warning("Exportación sin caché", extra={"error": str(e)})
+        db.rollback()
+        clave_cache = None
+
+    trabajo = models.TrabajoExportacion(
+        usuario_id=usuario.id,
+        tipo=tipo,
+        parametros=json.dumps(parametros),
+        estado="pendiente",
+        clave_cache=clave_cache
+    )
+    db.add(trabajo)
+    db.commit()
+    db.refresh(trabajo)
+
+    # ✅ Misma exportación con los mismos datos: se reutiliza el archivo ya generado
+    if clave_cache:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        nombre_archivo, ruta_archivo = _ruta_archivo_trabajo(trabajo)
+        if obtener_de_cache(clave_cache, ruta_archivo):
+            _marcar_completado(trabajo, nombre_archivo, ruta_archivo)
+            db.commit()
+            return trabajo
+
+    try:
+        obtener_pool().submit(ejecutar_trabajo_exportacion, trabajo.id)
+    except Exception as e:
+        # Pool roto (p. ej. un proceso hijo murió): se recrea en el próximo intento
+        log.error("Error encolando exportación", extra={"trabajo_id": trabajo.id, "error": str(e)})
+        cerrar_pool()
+        trabajo.estado = "error"
+        trabajo.mensaje_error = "No se pudo iniciar la exportación"
+        db.commit()
+
+    return trabajo
+
+
+def _ruta_archivo_trabajo(trabajo: models.TrabajoExportacion):
+    """Nombre de descarga y ruta en disco del archivo de un trabajo"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    nombre_archivo = f"{trabajo.tipo}_{timestamp}.xlsx"
+    return nombre_archivo, os.path.join(EXPORT_DIR, f"{trabajo.id}_{nombre_archivo}")
+
+
+def _marcar_completado(trabajo: models.TrabajoExportacion, nombre_archivo: str, ruta_archivo: str):
+    ahora = datetime.now()
+    trabajo.estado = "completado"
+    trabajo.nombre_archivo = nombre_archivo
+    trabajo.ruta_archivo = ruta_archivo
+    trabajo.tamano_bytes = os.path.getsize(ruta_archivo)
+    trabajo.fecha_completado = ahora
+    trabajo.fecha_expiracion = ahora + timedelta(hours=EXPORT_EXPIRACION_HORAS)
+
+
+def _generar_archivo(db: Session, trabajo: models.TrabajoExportacion):
+    """Genera el Excel de un trabajo en memoria"""
+    parametros = json.loads(trabajo.parametros or "{}")
+
+    if trabajo.tipo == 'prospectos':
+        query = construir_query_prospectos_exportacion(db, trabajo.usuario, parametros)
+        filas = consultar_prospectos_exportacion(
+            db, query, models.Prospecto.fecha_registro.desc(), limite=10000
+        )
+        return generar_excel_prospectos(filas)
+
+    if trabajo.tipo == 'clientes_ganados':
+        query = construir_query_clientes_ganados(
+            db, parametros.get('fecha_inicio'), parametros.get('fecha_fin')
+        )
+        filas = consultar_prospectos_exportacion(db, query, models.Prospecto.fecha_compra.desc())
+        return generar_excel_prospectos(filas)
+
+    if trabajo.tipo == 'dashboard':
+        periodo = parametros.get('periodo') or "mes"
+        fecha_inicio_obj, fecha_fin_obj = calcular_rango_fechas(
+            periodo, parametros.get('fecha_inicio'), parametros.get('fecha_fin')
+        )
+        stats = recopilar_estadisticas_dashboard(db, fecha_inicio_obj, fecha_fin_obj)
+        return generar_excel_estadisticas(stats, periodo, fecha_inicio_obj, fecha_fin_obj)
+
+    raise ValueError(f"Tipo de exportación no soportado: {trabajo.tipo}")
+
+
+def ejecutar_trabajo_exportacion(trabajo_id: int):
+    """
+    Punto de entrada del proceso hijo: genera el archivo del trabajo en
+    EXPORT_DIR y actualiza su estado.
+    """
+    db = database.SessionLocal()
+    try:
+        trabajo = db.query(models.TrabajoExportacion).filter(
+            models.TrabajoExportacion.id == trabajo_id
+        ).first()
+        if not trabajo or trabajo.estado != "pendiente":
+            return
+
+        trabajo.estado = "procesando"
+        trabajo.fecha_inicio = datetime.now()
+        db.commit()
+        inicio = time.perf_counter()
+
+        try:
+            lectura = database.crear_sesion_lectura()
+            # La clave de caché lleva la versión del primario: un archivo leído
+            # de la réplica puede no incluir aún esa versión y no se cachea
+            desde_replica = database.replica_engine is not None and lectura.get_bind() is database.replica_engine
+            try:
+                excel_file = _generar_archivo(lectura, trabajo)
+            finally:
+                lectura.close()
+            if not excel_file:
+                raise RuntimeError("Error generando archivo Excel")
+
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            nombre_archivo, ruta_archivo = _ruta_archivo_trabajo(trabajo)
+
+            # Escribir a un temporal y renombrar para no servir archivos a medias
+            ruta_temporal = ruta_archivo + ".tmp"
+            with open(ruta_temporal, "wb") as f:
+                f.write(excel_file.getbuffer())
+            os.replace(ruta_temporal, ruta_archivo)
+
+            if trabajo.clave_cache and not desde_replica:
+                guardar_en_cache(trabajo.clave_cache, ruta_archivo)
+
+            _marcar_completado(trabajo, nombre_archivo, ruta_archivo)
+            db.commit()
+            log.info("Exportación lista", extra={"trabajo_id": trabajo.id, "tipo": trabajo.tipo, "archivo": nombre_archivo})
+            DURACION_EXPORTACION.labels(trabajo.tipo, "completado").observe(time.perf_counter() - inicio)
+
+        except Exception as e:
+            db.rollback()
+            log.exception("Error en exportación", extra={"trabajo_id": trabajo_id})
+            trabajo.estado = "error"
+            trabajo.mensaje_error = str(e)[:500]
+            trabajo.fecha_completado = datetime.now()
+            db.commit()
+            DURACION_EXPORTACION.labels(trabajo.tipo, "error").observe(time.perf_counter() - inicio)
+    finally:
+        db.close()
+
+
+def listar_trabajos_usuario(db: Session, usuario_id: int, limite: int = 50):
+    """Trabajos de exportación del usuario, más recientes primero"""
+    return db.query(models.TrabajoExportacion).filter(
+        models.TrabajoExportacion.usuario_id == usuario_id
+    ).order_by(models.TrabajoExportacion.fecha_creacion.desc()).limit(limite).all()
+
+
+def limpiar_exportaciones_expiradas(db: Session) -> int:
+    """
+    Elimina los archivos expirados y sus trabajos.
+
+    Returns:
+        Número de trabajos eliminados
+    """
+    expirados = db.query(models.TrabajoExportacion).filter(
+        models.TrabajoExportacion.fecha_expiracion.isnot(None),
+        models.TrabajoExportacion.fecha_expiracion < datetime.now()
+    ).all()
+
+    for trabajo in expirados:
+        if trabajo.ruta_archivo and os.path.exists(trabajo.ruta_archivo):
+            try:
+                os.remove(trabajo.ruta_archivo)
+            except OSError as e:
+                log.warning("No se pudo eliminar archivo de exportación", extra={"ruta": trabajo.ruta_archivo, "error": str(e)})
+        db.delete(trabajo)
+
+    if expirados:
+        db.commit()
+        log.info("Exportaciones expiradas eliminadas", extra={"cantidad": len(expirados)})
+
+    return len(expirados)
+
+
+def marcar_trabajos_interrumpidos(db: Session) -> int:
+    """
+    Al arrancar, marca como error los trabajos que quedaron pendientes o en
+    proceso cuando se detuvo la aplicación (su pool ya no existe).
+    Solo toca trabajos de más de una hora para no afectar a los que esté
+    procesando otro worker que sigue vivo.
+    """
+    limite = datetime.now() - timedelta(hours=1)
+    interrumpidos = db.query(models.TrabajoExportacion).filter(
+        models.TrabajoExportacion.estado.in_(["pendiente", "procesando"]),
+        models.TrabajoExportacion.fecha_creacion < limite
+    ).update({
+        models.TrabajoExportacion.estado: "error",
+        models.TrabajoExportacion.mensaje_error: "Exportación interrumpida por reinicio del servidor",
+        models.TrabajoExportacion.fecha_completado: datetime.now()
+    }, synchronize_session=False)
+    db.commit()
+    return interrumpidos
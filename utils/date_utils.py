@@ -2,9 +2,13 @@
 Utilidades para manejo de fechas en el CRM ZARITA!
 """
 
+import logging
 from datetime import datetime, date, timedelta
 from typing import Optional
 
+# Sin importar services (que importa utils): mismo árbol de loggers "crm"
+log = logging.getLogger("crm.fechas")
+
 
 def parsear_fecha(fecha_str: str) -> Optional[date]:
     """Helper para parsear fechas en formatos DD/MM/YYYY o YYYY-MM-DD"""
@@ -16,7 +20,7 @@ def parsear_fecha(fecha_str: str) -> Optional[date]:
         try:
             return datetime.strptime(fecha_str, "%Y-%m-%d").date()
         except ValueError:
-            print(f"⚠️ Error parseando fecha: {fecha_str}")
+            log.warning("Error parseando fecha", extra={"fecha": fecha_str})
             return None
 
 
@@ -31,7 +35,7 @@ def normalizar_fecha_input(fecha_str: str) -> Optional[date]:
         try:
             return datetime.strptime(fecha_str, "%d/%m/%Y").date()
         except ValueError:
-            print(f"⚠️ Error parseando fecha: {fecha_str}")
+            log.warning("Error parseando fecha", extra={"fecha": fecha_str})
             return None
 
 
@@ -49,8 +53,7 @@ def calcular_rango_fechas(periodo: str, fecha_inicio: str = None, fecha_fin: str
             fecha_fin_obj = datetime.strptime(fecha_fin, "%d/%m/%Y").date()
         except ValueError:
             # Si hay error en el formato, usar mes actual por defecto
-            print("⚠️ Error en formato de fecha personalizada, usando mes actual")
-            pass
+            log.warning("Error en formato de fecha personalizada, usando mes actual")
     
     elif periodo == "dia":
         # Hoy
@@ -2,9 +2,12 @@
 Utilidades para envío de emails en el CRM ZARITA!
 """
 
+import logging
 import smtplib
 from email.mime.text import MIMEText
 
+log = logging.getLogger("crm.correo")
+
 
 def enviar_notificacion_email(destinatario: str, asunto: str, cuerpo: str):
     """Envía una notificación por correo electrónico (Simulado por ahora)"""
@@ -19,8 +22,8 @@ def enviar_notificacion_email(destinatario: str, asunto: str, cuerpo: str):
         # msg['To'] = destinatario
         # server.send_message(msg)
         # server.quit()
-        print(f"📧 [EMAIL SIMULADO] A: {destinatario} | Asunto: {asunto}")
+        log.info("Email simulado", extra={"destinatario": destinatario, "asunto": asunto})
         return True
     except Exception as e:
-        print(f"❌ Error enviando email: {e}")
+        log.error("Error enviando email", extra={"destinatario": destinatario, "error": str(e)})
         return False